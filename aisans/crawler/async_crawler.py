@@ -0,0 +1,244 @@
+"""
+Concurrent crawling on asyncio.
+
+AsyncFetcher is the asyncio counterpart of crawler.Fetcher: the same robots.txt
+handling (and the same robot_parsers_cache, with one robots.txt request per host
+in flight), over one aiohttp ClientSession.
+Every request, robots.txt included, first takes a slot of its host (per_host
+semaphore) and then one of the global max_concurrency slots, so a slow host
+never holds more than per_host of the global slots and never sees more than
+per_host requests at once. With the default per_host of 1 each host is crawled
+one request at a time, as by the sequential crawler, while hundreds of hosts are
+fetched in parallel.
+
+AsyncCrawlEngine runs an AsyncFetcher on an event loop in a background thread,
+for synchronous callers such as scripts/run_intelligent_crawler.py: pages()
+keeps up to max_concurrency URLs of a scheduler.HostScheduler in flight, taking
+each as soon as its host is ready, and yields them as they complete, so parsing
+and indexing on the caller's thread overlap with the fetches.
+
+Requires aiohttp; without it crawling stays sequential (crawler.Fetcher).
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import threading
+import time
+import urllib.robotparser
+
+from .crawler import (CRAWLER_USER_AGENT, PAGE_TIMEOUT, ROBOTS_TIMEOUT, AsyncSingleFlight, allowed_by_robots,
+                      cached_robots_parser, robot_parsers_cache, robots_fetch_failed, robots_parser_from_response,
+                      split_url)
+from .scheduler import HostScheduler
+
+try:
+    import aiohttp
+except ImportError: # Optional dependency; the crawler then fetches sequentially.
+    aiohttp = None
+
+DEFAULT_MAX_CONCURRENCY = 200
+DEFAULT_PER_HOST = 1
+
+
+class AsyncFetcher:
+    """Fetches pages respecting robots.txt, concurrently; create and use it inside one event loop."""
+
+    def __init__(self, user_agent: str = CRAWLER_USER_AGENT, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 per_host: int = DEFAULT_PER_HOST, robots_timeout: float = ROBOTS_TIMEOUT,
+                 page_timeout: float = PAGE_TIMEOUT):
+        """
+        Args:
+            user_agent: Sent with every request and matched against robots.txt rules.
+            max_concurrency: Requests in flight at once, over all hosts.
+            per_host: Requests in flight at once to any one host (netloc).
+            robots_timeout, page_timeout: Request timeouts in seconds.
+        """
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is not installed; use crawler.Fetcher instead.")
+        self.user_agent = user_agent
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.robots_timeout = aiohttp.ClientTimeout(total=robots_timeout)
+        self.page_timeout = aiohttp.ClientTimeout(total=page_timeout)
+        self._session = None
+        self._slots = asyncio.Semaphore(max_concurrency)
+        # netloc -> [semaphore, coroutines holding or waiting for it]; dropped when unused.
+        self._host_slots = {}
+        self._robots_fetches = AsyncSingleFlight()
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        if self._session is None:
+            # Connections are kept alive per host; aiohttp negotiates gzip/deflate (and br with brotli installed).
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.per_host)
+            self._session = aiohttp.ClientSession(connector=connector, headers={"User-Agent": self.user_agent})
+        return self._session
+
+    @contextlib.asynccontextmanager
+    async def _host_slot(self, netloc: str):
+        entry = self._host_slots.get(netloc)
+        if entry is None:
+            entry = self._host_slots[netloc] = [asyncio.Semaphore(self.per_host), 0]
+        entry[1] += 1
+        try:
+            # Host first: waiting for a busy host must not hold one of the global slots.
+            async with entry[0]:
+                async with self._slots:
+                    yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._host_slots[netloc]
+
+    async def robots_parser(self, scheme: str, netloc: str) -> urllib.robotparser.RobotFileParser | None:
+        """As crawler.Fetcher.robots_parser; call while holding the host's slot."""
+        found, parser = cached_robots_parser(netloc)
+        if found:
+            return parser
+
+        # With per_host > 1, the first requests to a new host would otherwise each fetch robots.txt.
+        return await self._robots_fetches.do(netloc, lambda: self._fetch_robots(scheme, netloc))
+
+    async def _fetch_robots(self, scheme: str, netloc: str) -> urllib.robotparser.RobotFileParser | None:
+        found, parser = robot_parsers_cache.lookup(netloc) # Fetched since the caller's miss (e.g. by a Fetcher thread)
+        if found:
+            return parser
+
+        robots_url = f"{scheme}://{netloc}/robots.txt"
+        print(f"No robots.txt parser in cache for {netloc}. Fetching {robots_url}")
+        try:
+            async with self._get_session().get(robots_url, timeout=self.robots_timeout) as response:
+                text = await response.text(errors='replace') if response.status == 200 else ""
+                return robots_parser_from_response(netloc, robots_url, response.status, text)
+        except asyncio.TimeoutError:
+            return robots_fetch_failed(netloc, f"Timeout fetching robots.txt for {netloc}")
+        except aiohttp.ClientError as e:
+            return robots_fetch_failed(netloc, f"Error fetching robots.txt for {netloc}: {e}")
+
+    async def fetch(self, url: str) -> str | None:
+        """
+        Fetches the content of a given URL, respecting robots.txt.
+
+        Args:
+            url: The URL to fetch.
+
+        Returns:
+            The text content of the URL if successful and allowed by robots.txt, None otherwise.
+        """
+        try:
+            parts = split_url(url)
+            if parts is None:
+                return None
+            scheme, netloc = parts
+
+            async with self._host_slot(netloc):
+                if not allowed_by_robots(await self.robots_parser(scheme, netloc), self.user_agent, url, netloc):
+                    return None
+                async with self._get_session().get(url, timeout=self.page_timeout) as response:
+                    if response.status == 200:
+                        return await response.text(errors='replace')
+                    print(f"Failed to fetch {url}. Status code: {response.status}")
+                    return None
+
+        except asyncio.TimeoutError:
+            print(f"Error fetching {url}: timed out")
+            return None
+        except aiohttp.ClientError as e:
+            print(f"Error fetching {url}: {e}")
+            return None
+        except Exception as e: # Catch any other unexpected errors (e.g., in urlparse)
+            print(f"An unexpected error occurred while trying to fetch {url}: {e}")
+            return None
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+
+class AsyncCrawlEngine:
+    """An AsyncFetcher on its own event loop thread, driven from synchronous code. close() when done."""
+
+    def __init__(self, **fetcher_options):
+        """fetcher_options are passed to AsyncFetcher."""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-crawl-engine", daemon=True)
+        self._thread.start()
+        self.fetcher = self._call(self._create_fetcher(fetcher_options))
+
+    async def _create_fetcher(self, fetcher_options) -> AsyncFetcher:
+        return AsyncFetcher(**fetcher_options)
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def submit(self, url: str) -> concurrent.futures.Future:
+        """Starts fetching url; the future's result is as for AsyncFetcher.fetch."""
+        return asyncio.run_coroutine_threadsafe(self.fetcher.fetch(url), self._loop)
+
+    def fetch(self, url: str) -> str | None:
+        return self.submit(url).result()
+
+    def pages(self, frontier: HostScheduler, visited_urls: set, max_pages: int):
+        """
+        Yields (url, depth, content or None) for up to max_pages unvisited URLs taken from
+        frontier as their hosts become ready, in completion order, keeping up to
+        max_concurrency fetches in flight. URLs added to frontier meanwhile (e.g. the links
+        of a yielded page) are picked up; taken URLs are added to visited_urls.
+        """
+        in_flight = {}
+        submitted = 0
+        while True:
+            while submitted < max_pages and len(in_flight) < self.fetcher.max_concurrency:
+                entry = frontier.next_ready()
+                if entry is None:
+                    break
+                url, depth = entry
+                if url in visited_urls:
+                    frontier.release(url)
+                    continue
+                visited_urls.add(url)
+                submitted += 1
+                in_flight[self.submit(url)] = (url, depth)
+            # Wake up for the next host becoming ready, unless no more URLs will be taken or every slot
+            # is busy (a ready host would give a zero timeout and spin until a fetch completes).
+            timeout = None
+            if submitted < max_pages and len(in_flight) < self.fetcher.max_concurrency:
+                timeout = frontier.wait_time()
+            if not in_flight:
+                if timeout is None:
+                    return
+                time.sleep(timeout)
+                continue
+            done, _ = concurrent.futures.wait(in_flight, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                url, depth = in_flight.pop(future)
+                frontier.release(url)
+                yield url, depth, future.result()
+
+    async def _shutdown(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.fetcher.close()
+
+    def close(self):
+        """Cancels fetches still in flight, closes the session and stops the loop thread."""
+        if self._loop.is_closed():
+            return
+        self._call(self._shutdown())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
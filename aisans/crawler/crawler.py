@@ -1,93 +1,291 @@
+import asyncio
+import threading
 import requests
 import urllib.robotparser
 from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+# "gzip,deflate", plus "br"/"zstd" when urllib3 can decode them (brotli/zstandard installed).
+from urllib3.util.request import ACCEPT_ENCODING
 
-# Global cache for RobotFileParser instances
-robot_parsers_cache = {}
+from .robots_cache import RobotsCache
+
+# Global cache for RobotFileParser instances: LRU-bounded and expiring, persistent once configure(path=...) is called.
+robot_parsers_cache = RobotsCache()
 CRAWLER_USER_AGENT = "AISANS-Crawler/0.1" # Define user agent globally
+# Connection pools kept (one per host, least recently used dropped first) and open
+# connections kept per host, for Fetcher sessions.
+DEFAULT_POOL_HOSTS = 100
+DEFAULT_POOL_PER_HOST = 10
+ROBOTS_TIMEOUT = 5
+PAGE_TIMEOUT = 10
 
-def fetch_url_content(url: str) -> str | None:
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls by key across threads: while do(key, function) runs, other
+    do() calls with the same key wait for it and get its result (or exception) instead of
+    calling their own function.
     """
-    Fetches the content of a given URL, respecting robots.txt.
 
-    Args:
-        url: The URL to fetch.
+    class _Call:
+        __slots__ = ('done', 'result', 'error')
 
-    Returns:
-        The text content of the URL if successful and allowed by robots.txt, None otherwise.
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines of one event loop: do(key, coroutine_function) is awaited once per key at a time."""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, coroutine_function):
+        while (future := self._calls.get(key)) is not None:
+            # wait() neither cancels the shared call when this waiter is cancelled nor raises if the leader was.
+            await asyncio.wait([future])
+            if not future.cancelled():
+                return future.result()
+            # The leader was cancelled: its waiters retry, the first becoming the new leader.
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting: mark the exception retrieved so asyncio does not log it.
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        try:
+            result = await coroutine_function()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+
+# One robots.txt request per host in flight across the threads of all Fetchers.
+_robots_fetches = SingleFlight()
+
+
+def split_url(url: str) -> tuple[str, str] | None:
+    """(scheme, netloc) of url, or None (with a printed error) if it has neither."""
+    parsed_url = urlparse(url)
+    if not parsed_url.scheme or not parsed_url.netloc:
+        print(f"Invalid URL structure: {url}. Cannot determine robots.txt path.")
+        return None
+    return parsed_url.scheme, parsed_url.netloc
+
+
+def cached_robots_parser(netloc: str) -> tuple[bool, urllib.robotparser.RobotFileParser | None]:
+    """(found, parser) from robot_parsers_cache for netloc (the domain is the cache key); parser None allows all."""
+    found, parser = robot_parsers_cache.lookup(netloc)
+    if found:
+        print(f"Found robots.txt parser in cache for {netloc}.")
+    return found, parser
+
+
+def robots_parser_from_response(netloc: str, robots_url: str, status_code: int, text: str) -> urllib.robotparser.RobotFileParser | None:
     """
-    try:
-        parsed_url = urlparse(url)
-        scheme = parsed_url.scheme
-        netloc = parsed_url.netloc
-        if not scheme or not netloc:
-            print(f"Invalid URL structure: {url}. Cannot determine robots.txt path.")
-            return None
+    The parser for a fetched robots.txt, or None (pages are then allowed). Either is cached:
+    a parsed file or a client error (no robots.txt) for the cache's ttl, a server error only
+    for its error_ttl. Shared by the threaded and asyncio fetchers.
+    """
+    if status_code == 200:
+        current_parser = urllib.robotparser.RobotFileParser()
+        current_parser.set_url(robots_url)
+        current_parser.parse(text.splitlines())
+        robot_parsers_cache.store(netloc, current_parser, text=text) # Cache successfully parsed robots.txt
+        print(f"Successfully fetched, parsed, and cached robots.txt for {netloc}")
+        return current_parser
+    elif status_code >= 400 and status_code < 500:
+        print(f"Client error ({status_code}) for robots.txt at {netloc}. Assuming allow (cached).")
+        robot_parsers_cache.store(netloc, None)
+    else:
+        print(f"Failed to fetch robots.txt for {netloc} (Status: {status_code}). Assuming allow for a short while.")
+        robot_parsers_cache.store(netloc, None, error=True)
+    return None
+
+
+def robots_fetch_failed(netloc: str, reason: str) -> None:
+    """Records a robots.txt request that got no response (timeout, connection error); returns None: allow."""
+    print(f"{reason}. Assuming allow for a short while.")
+    robot_parsers_cache.store(netloc, None, error=True)
+    return None
+
+
+def allowed_by_robots(parser: urllib.robotparser.RobotFileParser | None, user_agent: str, url: str, netloc: str) -> bool:
+    """Whether url may be fetched under parser (None: robots.txt unavailable, so allowed)."""
+    if parser: # If we have a parser (either from cache or newly parsed)
+        if not parser.can_fetch(user_agent, url):
+            print(f"Fetching DISALLOWED for {url} by robots.txt on {netloc}")
+            return False
+        print(f"Fetching ALLOWED for {url} by robots.txt on {netloc} (using parsed rules).")
+    else: # No parser available (e.g. robots.txt fetch failed): assume allow
+        print(f"Proceeding to fetch {url} (robots.txt not available or failed to parse, assuming allow).")
+    return True
+
+
+class Fetcher:
+    """
+    Fetches pages respecting robots.txt over one pooled, keep-alive requests.Session.
+
+    Connections stay open between requests, so consecutive fetches from the same host
+    (robots.txt, then its pages) skip the TCP and TLS handshakes. Responses are requested
+    compressed (see ACCEPT_ENCODING). Safe to share between threads; close() when done.
+    See async_crawler.AsyncFetcher for the asyncio counterpart.
+    """
+
+    def __init__(self, user_agent: str = CRAWLER_USER_AGENT, pool_hosts: int = DEFAULT_POOL_HOSTS,
+                 pool_per_host: int = DEFAULT_POOL_PER_HOST, robots_timeout: float = ROBOTS_TIMEOUT,
+                 page_timeout: float = PAGE_TIMEOUT):
+        """
+        Args:
+            user_agent: Sent with every request and matched against robots.txt rules.
+            pool_hosts: Number of hosts whose connection pools are kept.
+            pool_per_host: Connections kept open per host; more concurrent requests to one
+                host still work but their extra connections are closed afterwards.
+            robots_timeout, page_timeout: Request timeouts in seconds.
+        """
+        self.user_agent = user_agent
+        self.robots_timeout = robots_timeout
+        self.page_timeout = page_timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_per_host)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+
+    def robots_parser(self, scheme: str, netloc: str) -> urllib.robotparser.RobotFileParser | None:
+        """
+        The parsed robots.txt of a host, from robot_parsers_cache or fetched now, or None if
+        there is none or it could not be fetched (pages are then allowed).
+        """
+        found, parser = cached_robots_parser(netloc)
+        if found:
+            return parser
+
+        # Threads wanting the same host's robots.txt share one request.
+        return _robots_fetches.do(netloc, lambda: self._fetch_robots(scheme, netloc))
+
+    def _fetch_robots(self, scheme: str, netloc: str) -> urllib.robotparser.RobotFileParser | None:
+        found, parser = robot_parsers_cache.lookup(netloc) # Fetched by another thread since the caller's miss
+        if found:
+            return parser
 
         robots_url = f"{scheme}://{netloc}/robots.txt"
-        cache_key = netloc # Use netloc (domain) as the cache key
+        print(f"No robots.txt parser in cache for {netloc}. Fetching {robots_url}")
+        try:
+            robots_headers = {"User-Agent": self.user_agent}
+            response_robots = self.session.get(robots_url, headers=robots_headers, timeout=self.robots_timeout)
+            return robots_parser_from_response(netloc, robots_url, response_robots.status_code, response_robots.text)
+        except requests.exceptions.Timeout:
+            return robots_fetch_failed(netloc, f"Timeout fetching robots.txt for {netloc}")
+        except requests.exceptions.RequestException as e:
+            return robots_fetch_failed(netloc, f"Error fetching robots.txt for {netloc}: {e}")
 
-        parser = None
-        attempt_page_fetch = True # Assume allow by default, disallow if robots.txt says so
+    def fetch(self, url: str) -> str | None:
+        """
+        Fetches the content of a given URL, respecting robots.txt.
 
-        if cache_key in robot_parsers_cache:
-            print(f"Found robots.txt parser in cache for {netloc}.")
-            parser = robot_parsers_cache[cache_key]
-        else:
-            print(f"No robots.txt parser in cache for {netloc}. Fetching {robots_url}")
-            current_parser = urllib.robotparser.RobotFileParser()
-            current_parser.set_url(robots_url)
-            try:
-                robots_headers = {"User-Agent": CRAWLER_USER_AGENT}
-                response_robots = requests.get(robots_url, headers=robots_headers, timeout=5)
-                if response_robots.status_code == 200:
-                    current_parser.parse(response_robots.text.splitlines())
-                    robot_parsers_cache[cache_key] = current_parser # Cache successfully parsed robots.txt
-                    parser = current_parser
-                    print(f"Successfully fetched, parsed, and cached robots.txt for {netloc}")
-                elif response_robots.status_code >= 400 and response_robots.status_code < 500:
-                    print(f"Client error ({response_robots.status_code}) for robots.txt at {netloc}. Assuming allow for this request.")
-                    # Do not cache this error state; attempt_page_fetch remains True
-                else:
-                    print(f"Failed to fetch robots.txt for {netloc} (Status: {response_robots.status_code}). Assuming allow for this request.")
-            except requests.exceptions.Timeout:
-                print(f"Timeout fetching robots.txt for {netloc}. Assuming allow for this request.")
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching robots.txt for {netloc}: {e}. Assuming allow for this request.")
-            # If fetching/parsing robots.txt failed, parser is None or an empty current_parser,
-            # and we default to attempt_page_fetch = True for this single request.
-            # Only successfully parsed robots.txt are cached.
-
-        if parser: # If we have a parser (either from cache or newly parsed)
-            if not parser.can_fetch(CRAWLER_USER_AGENT, url):
-                print(f"Fetching DISALLOWED for {url} by robots.txt on {netloc}")
-                attempt_page_fetch = False
-            else:
-                print(f"Fetching ALLOWED for {url} by robots.txt on {netloc} (using parsed rules).")
-        else: # No parser available (e.g. initial fetch failed), rely on default attempt_page_fetch = True
-             print(f"Proceeding to fetch {url} (robots.txt not available or failed to parse, assuming allow).")
+        Args:
+            url: The URL to fetch.
 
+        Returns:
+            The text content of the URL if successful and allowed by robots.txt, None otherwise.
+        """
+        try:
+            parts = split_url(url)
+            if parts is None:
+                return None
+            scheme, netloc = parts
 
-        if not attempt_page_fetch:
-            return None
+            if not allowed_by_robots(self.robots_parser(scheme, netloc), self.user_agent, url, netloc):
+                return None
 
-        # Proceed to fetch the actual URL content
-        headers = {
-            "User-Agent": CRAWLER_USER_AGENT
-        }
-        response_url = requests.get(url, headers=headers, timeout=10)
-        if response_url.status_code == 200:
-            return response_url.text
-        else:
-            print(f"Failed to fetch {url}. Status code: {response_url.status_code}")
+            # Proceed to fetch the actual URL content
+            headers = {
+                "User-Agent": self.user_agent
+            }
+            response_url = self.session.get(url, headers=headers, timeout=self.page_timeout)
+            if response_url.status_code == 200:
+                return response_url.text
+            else:
+                print(f"Failed to fetch {url}. Status code: {response_url.status_code}")
+                return None
+
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching {url}: {e}")
+            return None
+        except Exception as e: # Catch any other unexpected errors (e.g., in urlparse)
+            print(f"An unexpected error occurred while trying to fetch {url}: {e}")
             return None
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching {url}: {e}")
-        return None
-    except Exception as e: # Catch any other unexpected errors (e.g., in urlparse)
-        print(f"An unexpected error occurred while trying to fetch {url}: {e}")
-        return None
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+_default_fetcher = None
+_default_fetcher_lock = threading.Lock()
+
+
+def default_fetcher() -> Fetcher:
+    """The process-wide Fetcher behind fetch_url_content, created on first use."""
+    global _default_fetcher
+    with _default_fetcher_lock:
+        if _default_fetcher is None:
+            _default_fetcher = Fetcher()
+        return _default_fetcher
+
+
+def fetch_url_content(url: str) -> str | None:
+    """
+    Fetches the content of a given URL, respecting robots.txt.
+
+    Uses the shared default_fetcher(), so connections are reused across calls.
+
+    Args:
+        url: The URL to fetch.
+
+    Returns:
+        The text content of the URL if successful and allowed by robots.txt, None otherwise.
+    """
+    return default_fetcher().fetch(url)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,172 @@
+"""
+Bounded, expiring and optionally persistent cache of parsed robots.txt files.
+
+Entries are keyed by netloc and hold either a RobotFileParser or None, which
+means "no usable robots.txt, allow everything". Fetched robots.txt files (200)
+and client errors (4xx, typically 404: the host has no robots.txt) are kept
+for ttl seconds; server errors, timeouts and connection errors for the much
+shorter error_ttl, so a host that is briefly down is neither asked again before
+every page nor treated as unrestricted for a whole day.
+
+At most max_entries hosts are kept in memory, the least recently used dropped
+first. With a path, every entry is also written to a small SQLite database
+(its robots.txt text, not the parser) and hosts missing from memory are looked
+up there, so a restarted crawler does not fetch thousands of robots.txt files
+again. Expired rows are deleted when the database is opened.
+"""
+import sqlite3
+import threading
+import time
+import urllib.robotparser
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_ERROR_TTL = 5 * 60
+
+
+class RobotsCache:
+    """netloc -> RobotFileParser (or None: allow all). Supports in, [], get, len and clear() like a dict."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL,
+                 error_ttl: float = DEFAULT_ERROR_TTL, path: str | None = None, clock=time.time):
+        """
+        Args:
+            max_entries: Hosts kept in memory.
+            ttl: Seconds a fetched robots.txt, or a 4xx answer, stays valid.
+            error_ttl: Seconds a 5xx answer, timeout or connection error stays valid.
+            path: SQLite file to persist entries to; None keeps them in memory only.
+            clock: Wall-clock time source (entries outlive the process when persisted).
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.clock = clock
+        self._entries = OrderedDict() # netloc -> (parser or None, expiry time)
+        self._lock = threading.Lock()
+        self.conn = None
+        if path:
+            self.open(path)
+
+    def open(self, path: str):
+        """Persists entries to the SQLite file path (created if needed), replacing any file opened before."""
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            # One small commit per new host: WAL without fsync per commit keeps that cheap. A crash may lose
+            # the last few entries, which are just fetched again.
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS robots (
+                    netloc TEXT PRIMARY KEY,
+                    url TEXT,
+                    body TEXT,
+                    expires REAL NOT NULL
+                )
+            """)
+            self.conn.execute("DELETE FROM robots WHERE expires <= ?", (self.clock(),))
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def configure(self, max_entries: int | None = None, ttl: float | None = None,
+                  error_ttl: float | None = None, path: str | None = None):
+        """Changes the given settings in place (the module-level cache is shared by reference)."""
+        if max_entries is not None:
+            self.max_entries = max_entries
+        if ttl is not None:
+            self.ttl = ttl
+        if error_ttl is not None:
+            self.error_ttl = error_ttl
+        if path is not None:
+            self.open(path)
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, netloc: str) -> tuple[bool, urllib.robotparser.RobotFileParser | None]:
+        """(found, parser) for netloc; found is False if there is no unexpired entry."""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(netloc)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(netloc)
+                    return True, entry[0]
+                del self._entries[netloc]
+            if self.conn is None:
+                return False, None
+            row = self.conn.execute("SELECT url, body, expires FROM robots WHERE netloc = ? AND expires > ?",
+                                    (netloc, now)).fetchone()
+            if row is None:
+                return False, None
+            url, body, expires = row
+            parser = None
+            if body is not None:
+                parser = urllib.robotparser.RobotFileParser(url or "")
+                parser.parse(body.splitlines())
+            self._entries[netloc] = (parser, expires)
+            self._evict()
+            return True, parser
+
+    def store(self, netloc: str, parser: urllib.robotparser.RobotFileParser | None, text: str | None = None,
+              error: bool = False):
+        """
+        Caches parser (None: allow all) for netloc, for error_ttl if error else ttl. text is
+        the robots.txt it was parsed from; without it a parser is kept in memory only.
+        """
+        expires = self.clock() + (self.error_ttl if error else self.ttl)
+        with self._lock:
+            self._entries[netloc] = (parser, expires)
+            self._entries.move_to_end(netloc)
+            self._evict()
+            if self.conn is not None and (parser is None or text is not None):
+                self.conn.execute("INSERT OR REPLACE INTO robots (netloc, url, body, expires) VALUES (?, ?, ?, ?)",
+                                  (netloc, parser.url if parser is not None else None, text, expires))
+                self.conn.commit()
+
+    def __contains__(self, netloc: str) -> bool:
+        return self.lookup(netloc)[0]
+
+    def __getitem__(self, netloc: str) -> urllib.robotparser.RobotFileParser | None:
+        found, parser = self.lookup(netloc)
+        if not found:
+            raise KeyError(netloc)
+        return parser
+
+    def get(self, netloc: str, default=None):
+        found, parser = self.lookup(netloc)
+        return parser if found else default
+
+    def __setitem__(self, netloc: str, parser: urllib.robotparser.RobotFileParser | None):
+        self.store(netloc, parser)
+
+    def __delitem__(self, netloc: str):
+        with self._lock:
+            found = self._entries.pop(netloc, None) is not None
+            if self.conn is not None:
+                found = self.conn.execute("DELETE FROM robots WHERE netloc = ?", (netloc,)).rowcount > 0 or found
+                self.conn.commit()
+        if not found:
+            raise KeyError(netloc)
+
+    def __len__(self):
+        """Hosts held in memory (expired entries included until they are looked up or evicted)."""
+        return len(self._entries)
+
+    def clear(self):
+        """Drops every entry, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM robots")
+                self.conn.commit()
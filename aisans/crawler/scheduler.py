@@ -0,0 +1,152 @@
+"""
+Polite, host-aware crawl frontier.
+
+HostScheduler queues URLs per host (netloc) and hands them out host by host
+in order of each host's ready time, so a crawl over many hosts interleaves
+them instead of working through one host's links while the others wait.
+After a request starts, its host is not ready again until `delay` seconds
+later and, with max_in_flight_per_host requests out, not before one of them
+is released; the delay is the longest of the host's robots.txt Crawl-delay,
+its Request-rate (seconds per request) and default_delay. robots.txt is read
+from robot_parsers_cache, so it applies once the host's first request has
+fetched it.
+
+Each host queues at most max_queue_per_host URLs; further URLs are dropped
+(and counted), which bounds the frontier of a host that links to itself
+without end. Idle hosts are forgotten once their delay has passed.
+"""
+import heapq
+import itertools
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+from .crawler import CRAWLER_USER_AGENT, robot_parsers_cache
+
+DEFAULT_DELAY = 1.0
+DEFAULT_MAX_QUEUE_PER_HOST = 1000
+
+
+class _Host:
+    __slots__ = ('queue', 'ready', 'started', 'in_flight', 'scheduled')
+
+    def __init__(self):
+        self.queue = deque() # (url, depth)
+        self.ready = 0.0
+        self.started = 0.0
+        self.in_flight = 0
+        self.scheduled = False # In the ready heap
+
+
+class HostScheduler:
+    """
+    Frontier of (url, depth) entries: add() them, take them with next_ready() and release()
+    each once its fetch has finished. Not thread-safe; drive it from one thread.
+    """
+
+    def __init__(self, default_delay: float = DEFAULT_DELAY, max_queue_per_host: int = DEFAULT_MAX_QUEUE_PER_HOST,
+                 max_in_flight_per_host: int = 1, user_agent: str = CRAWLER_USER_AGENT, clock=time.monotonic):
+        """
+        Args:
+            default_delay: Seconds between requests to a host whose robots.txt asks for less (or nothing).
+            max_queue_per_host: URLs queued per host before further ones are dropped.
+            max_in_flight_per_host: URLs of one host handed out and not yet released.
+            user_agent: Matched against robots.txt Crawl-delay / Request-rate rules.
+            clock: Monotonic time source, in seconds.
+        """
+        self.default_delay = default_delay
+        self.max_queue_per_host = max_queue_per_host
+        self.max_in_flight_per_host = max_in_flight_per_host
+        self.user_agent = user_agent
+        self.clock = clock
+        self.dropped = 0 # URLs refused because their host's queue was full
+        self._hosts = {}
+        self._ready = [] # (ready time, sequence, netloc) of hosts with a URL that may be handed out
+        self._sequence = itertools.count() # Equal ready times go first come, first served
+        self._queued = set()
+        self._prune_at = 1024
+
+    def __len__(self):
+        """Number of queued URLs (not counting those handed out)."""
+        return len(self._queued)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._queued
+
+    def delay(self, netloc: str) -> float:
+        """Seconds between consecutive requests to netloc."""
+        delay = self.default_delay
+        parser = robot_parsers_cache.get(netloc)
+        if parser is not None:
+            crawl_delay = parser.crawl_delay(self.user_agent)
+            if crawl_delay:
+                delay = max(delay, float(crawl_delay))
+            request_rate = parser.request_rate(self.user_agent)
+            if request_rate and request_rate.requests:
+                delay = max(delay, request_rate.seconds / request_rate.requests)
+        return delay
+
+    def _schedule(self, netloc: str, host: _Host):
+        if host.queue and not host.scheduled and host.in_flight < self.max_in_flight_per_host:
+            host.scheduled = True
+            heapq.heappush(self._ready, (host.ready, next(self._sequence), netloc))
+
+    def add(self, url: str, depth: int) -> bool:
+        """Queues url; False if it is already queued or its host's queue is full."""
+        if url in self._queued:
+            return False
+        netloc = urlparse(url).netloc
+        host = self._hosts.get(netloc)
+        if host is None:
+            if len(self._hosts) >= self._prune_at:
+                self._prune()
+            host = self._hosts[netloc] = _Host()
+        elif len(host.queue) >= self.max_queue_per_host:
+            self.dropped += 1
+            return False
+        host.queue.append((url, depth))
+        self._queued.add(url)
+        self._schedule(netloc, host)
+        return True
+
+    def next_ready(self) -> tuple[str, int] | None:
+        """The next (url, depth) whose host is ready now, or None (see wait_time)."""
+        now = self.clock()
+        while self._ready and self._ready[0][0] <= now:
+            _, _, netloc = heapq.heappop(self._ready)
+            host = self._hosts[netloc]
+            host.scheduled = False
+            if host.ready > now: # Pushed back by a release() since it was scheduled
+                self._schedule(netloc, host)
+                continue
+            url, depth = host.queue.popleft()
+            self._queued.discard(url)
+            host.in_flight += 1
+            host.started = now
+            host.ready = now + self.delay(netloc)
+            self._schedule(netloc, host)
+            return url, depth
+        return None
+
+    def release(self, url: str):
+        """Marks the fetch of a URL from next_ready() finished."""
+        netloc = urlparse(url).netloc
+        host = self._hosts[netloc]
+        host.in_flight -= 1
+        # robots.txt may have been fetched with this request: recompute the delay with it.
+        host.ready = max(host.ready, host.started + self.delay(netloc), self.clock())
+        self._schedule(netloc, host)
+
+    def wait_time(self) -> float | None:
+        """Seconds until next_ready() has a URL, or None if none will be until a release() or add()."""
+        if not self._ready:
+            return None
+        return max(0.0, self._ready[0][0] - self.clock())
+
+    def _prune(self):
+        """Forgets idle hosts whose delay has passed, so the host table does not grow with the crawl."""
+        now = self.clock()
+        for netloc in [netloc for netloc, host in self._hosts.items()
+                       if not host.queue and not host.in_flight and host.ready <= now]:
+            del self._hosts[netloc]
+        self._prune_at = max(1024, 2 * len(self._hosts))
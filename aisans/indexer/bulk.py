@@ -0,0 +1,178 @@
+"""
+Offline bulk build of a complete index, swapped over the live file when done.
+
+Rebuilding through add_batch on the live index pays for crash safety and
+incremental FTS5 merges on every commit. bulk_build() instead writes into a
+fresh file next to the live one with no rollback journal and no fsyncs, with
+the secondary B-tree indexes created after the load and FTS5 automerge
+deferred, then optimizes once and renames the finished file over the live one.
+A crash midway only loses the build file.
+"""
+import os
+import sqlite3
+import time
+from typing import Iterable
+
+from .indexer import Indexer
+from .vectors import vectors_path
+
+# FTS5's default automerge threshold, restored once the build is done.
+DEFAULT_AUTOMERGE = 4
+
+
+def build_path_for(db_path: str) -> str:
+    """The temporary file a build of db_path is written to (same directory, so the final rename is atomic)."""
+    return db_path + '.building'
+
+
+def bulk_build(documents: Iterable[dict], db_path: str, chunk_size: int = 5000, page_cache_mib: int = 256,
+               wal: bool = False, near_duplicates: str = 'cluster', semantic: bool = False) -> dict:
+    """
+    Builds a new index from documents and atomically replaces db_path with it.
+
+    Readers that already have db_path open keep reading the old file until they reopen
+    it (Indexer.close() and a new Indexer); new readers get the new file. Nothing else
+    may write to db_path while the build runs: writes to the old file are lost at the swap.
+
+    Args:
+        documents: Iterable of document dicts (same fields as Indexer.add_document).
+        db_path: The live index file to replace. It need not exist yet.
+        chunk_size: Documents per transaction.
+        page_cache_mib: SQLite page cache of the build connection, in MiB.
+        wal: Leave the new file in WAL mode (for an index the crawler keeps writing to).
+        near_duplicates: As for Indexer; near-duplicates are detected during the build.
+        semantic: Also build the semantic vectors file (see Indexer). Without it, a vectors
+            file of the old index is removed at the swap, since its rows would not match.
+
+    Returns:
+        Stats with 'documents' written, 'skipped' (missing fields), 'near_duplicates',
+        'seconds' per phase ('load', 'indexes', 'optimize', 'swap'), 'docs_per_sec' of the
+        whole build, the new file's 'size_bytes', and 'error' (None on success). On error
+        the build file is removed and db_path is left untouched.
+    """
+    stats = {'documents': 0, 'skipped': 0, 'near_duplicates': 0, 'seconds': {}, 'docs_per_sec': 0.0,
+             'size_bytes': None, 'error': None}
+    db_path = os.path.abspath(db_path)
+    build_path = build_path_for(db_path)
+    _remove_database(build_path) # Left over from an interrupted build
+    started = time.perf_counter()
+
+    indexer = Indexer(db_path=build_path, cache_size=0, near_duplicates=near_duplicates,
+                      page_cache_mib=page_cache_mib, semantic=semantic)
+    finished = False
+    try:
+        if not indexer.conn:
+            raise sqlite3.Error(f"could not create {build_path}")
+        conn = indexer.conn
+        # No journal and no fsyncs: a failed build is simply thrown away.
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA locking_mode = EXCLUSIVE")
+        # Secondary indexes are cheaper to build once, sorted, than to maintain row by row.
+        # Automatically created (UNIQUE/PRIMARY KEY) indexes have no sql and are kept.
+        secondary_indexes = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        ).fetchall()
+        for name, _ in secondary_indexes:
+            conn.execute(f"DROP INDEX {name}")
+        # Only FTS5's crisis merges run during the load; everything is merged once at the end.
+        _check_step(indexer.maintain(merge_pages=0, automerge=0))
+
+        phase = time.perf_counter()
+        for chunk in indexer.ingest(documents, chunk_size=chunk_size, max_chunk_seconds=float('inf')):
+            if chunk['error']:
+                raise sqlite3.Error(chunk['error'])
+            stats['documents'] += chunk['documents']
+            stats['skipped'] += chunk['skipped']
+            stats['near_duplicates'] += chunk['near_duplicates']
+        stats['seconds']['load'] = time.perf_counter() - phase
+
+        phase = time.perf_counter()
+        for _, sql in secondary_indexes:
+            conn.execute(sql)
+        conn.commit()
+        stats['seconds']['indexes'] = time.perf_counter() - phase
+
+        phase = time.perf_counter()
+        _check_step(indexer.maintain(merge_pages=0, optimize=True, automerge=DEFAULT_AUTOMERGE))
+        stats['seconds']['optimize'] = time.perf_counter() - phase
+
+        conn.execute("PRAGMA locking_mode = NORMAL")
+        conn.execute(f"PRAGMA journal_mode = {'WAL' if wal else 'DELETE'}")
+        finished = True
+    except sqlite3.Error as e:
+        print(f"Error building index {build_path}: {e}")
+        stats['error'] = str(e)
+    finally:
+        indexer.close()
+        if not finished: # Also when documents raised
+            _remove_database(build_path)
+    if not finished:
+        return stats
+
+    phase = time.perf_counter()
+    try:
+        swap_into_place(build_path, db_path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error replacing {db_path} with {build_path}: {e}")
+        stats['error'] = str(e)
+        return stats
+    stats['seconds']['swap'] = time.perf_counter() - phase
+
+    total = time.perf_counter() - started
+    stats['docs_per_sec'] = stats['documents'] / total if total > 0 else 0.0
+    stats['size_bytes'] = os.path.getsize(db_path)
+    return stats
+
+
+def swap_into_place(build_path: str, db_path: str):
+    """
+    Atomically renames a finished build (and its vectors file, if any) over db_path.
+
+    The build is fsynced first, since it was written with synchronous=OFF. If the live
+    file is in WAL mode, its WAL is checkpointed and truncated beforehand: the -wal file
+    belongs to the path, not the file, and frames left in it would otherwise be applied
+    to the new database by the next connection. The vectors file is replaced just before
+    the database; readers still on the old database see the new vectors until they reopen.
+    """
+    for path in (build_path, vectors_path(build_path)):
+        if not os.path.exists(path):
+            continue
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            if conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal':
+                busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+                if busy:
+                    raise sqlite3.OperationalError("the live index is being written; stop writers before swapping")
+        finally:
+            conn.close()
+
+    if os.path.exists(vectors_path(build_path)):
+        os.replace(vectors_path(build_path), vectors_path(db_path))
+    elif os.path.exists(vectors_path(db_path)):
+        os.remove(vectors_path(db_path))
+    os.replace(build_path, db_path)
+    if hasattr(os, 'O_DIRECTORY'): # Persist the rename itself (POSIX)
+        fd = os.open(os.path.dirname(db_path) or '.', os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _check_step(stats: dict):
+    if stats['error'] is not None:
+        raise sqlite3.Error(stats['error'])
+
+
+def _remove_database(path: str):
+    for suffix in ('', '-journal', '-wal', '-shm', '.vectors'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """
+    A bounded, thread-safe LRU cache for search results with a TTL.
+
+    Every entry is stored together with the write generation it was computed at.
+    A lookup with a different generation is a miss, so a single counter bump
+    invalidates the whole cache without walking it.
+    """
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 60.0):
+        """
+        Args:
+            max_entries: Maximum number of cached queries; the least recently used is evicted first.
+            ttl_seconds: Maximum age of an entry, as a safety net for writes the generation
+                         counter cannot see. None disables expiry.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (generation, stored_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, generation):
+        """Returns the cached value for key, or None on a miss (absent, expired or stale)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_generation, stored_at, value = entry
+                expired = self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds
+                if entry_generation == generation and not expired:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, generation, value):
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -1,33 +1,262 @@
+import contextlib
 import sqlite3
+import math
 import os
+import queue
+import threading
+import time
+from typing import Iterable, Iterator
+from urllib.request import pathname2url
+
+from .cache import QueryCache
+from .results import SearchResult
+from . import query as queries
+from . import simhash
+from . import spelling
+from . import suggest as suggestions
+from . import vectors
+from .storage import (SCHEMA_VERSION, content_hash, ensure_schema, find_near_duplicate, fts_structure, lookup_pages, read_fields,
+                      read_page, remove_pages, set_fingerprint, to_epoch, touch_pages, url_host, write_meta,
+                      write_pages)
+
+# Queue sentinel telling the write-behind thread to drain and exit.
+_STOP_WRITER = object()
+
+
+class _ReadConnection(sqlite3.Connection):
+    """A read-only connection that remembers the PRAGMA data_version it last reported (see _cache_generation)."""
+    _seen_data_version = None
 
 class Indexer:
-    def __init__(self, db_path=None):
+    # llm_summary is optional and therefore not listed.
+    REQUIRED_FIELDS = ('url', 'title', 'body', 'snippet', 'source_engine', 'crawled_timestamp')
+    UNCHANGED_MODES = ('touch', 'skip', 'rewrite')
+    NEAR_DUPLICATE_MODES = ('cluster', 'drop', 'off')
+    # search() ranks this many candidates per requested result before collapsing near-duplicates.
+    COLLAPSE_OVERFETCH = 4
+    # Filters estimated to pass less than this share of pages rank only the pages that pass.
+    SELECTIVE_FILTER_FRACTION = 0.3
+    # suggest() and correct_query() ignore terms found in fewer pages than this.
+    SUGGEST_MIN_DOCS = 2
+    # suggest() and correct_query() reload the whole vocabulary when the index changed and the
+    # loaded copy is this many seconds old. Local writes are applied incrementally before that; writes by other
+    # processes (and deletions) only show up with the reload.
+    SUGGEST_MAX_AGE = 300.0
+    # Document counts used by plan_query() and hybrid_search() are memoized: fts5vocab counts
+    # a term's pages by walking its whole doclist, which costs milliseconds for common words.
+    # A positive count is reused for this many seconds; a zero count only until the next write.
+    DOC_FREQ_MAX_AGE = 300.0
+    DOC_FREQ_MAX_TERMS = 100000
+    # Idle read-only connections kept for reuse (WAL and read-only modes). Reads borrow one per call,
+    # so threads that come and go (e.g. one per request) share them instead of each opening its own.
+    READER_POOL_SIZE = 8
+
+    def __init__(self, db_path=None, write_behind: bool = False, write_queue_size: int = 1000,
+                 write_batch_size: int = 500, wal: bool = False, busy_timeout_ms: int = 5000,
+                 cache_size: int = 1024, cache_ttl: float | None = 60.0, on_unchanged: str = 'touch',
+                 near_duplicates: str = 'cluster', read_only: bool = False, mmap_size: int = 0,
+                 page_cache_mib: int = 0, semantic: bool = False):
+        """
+        Opens (and if needed creates or migrates) the index database.
+
+        Args:
+            db_path: Path to the SQLite file. Defaults to AISANS_DB_PATH or 'aisans_index.db'.
+            write_behind: If True, add_document/add_batch only validate and enqueue documents;
+                a dedicated writer thread coalesces them into transactions. Call flush() to
+                wait for queued documents, and close() to drain the queue before exiting.
+            write_queue_size: Maximum number of queued documents. Enqueueing blocks while the
+                queue is full, which applies backpressure to the producer.
+            write_batch_size: Maximum number of queued documents committed per transaction.
+            wal: If True, switch the database to WAL journaling with synchronous=NORMAL and
+                serve search() from a pool of read-only connections, so queries
+                keep running while this (single) writer connection commits.
+            busy_timeout_ms: How long a connection waits on a locked database before failing.
+            cache_size: Number of search() results kept in an LRU query cache; 0 disables it.
+                Entries are invalidated by every write (see _bump_generation).
+            cache_ttl: Maximum age in seconds of a cached result, or None for no expiry.
+            on_unchanged: What a write does with a page whose content hash matches the stored
+                one: 'touch' only updates crawled_timestamp, 'skip' leaves the row alone, and
+                'rewrite' re-indexes it anyway (e.g. after a tokenizer change).
+            near_duplicates: What a write does with a page whose body is a near-duplicate
+                (SimHash) of a stored page at another URL: 'cluster' stores it in the same
+                cluster, so search() shows only the best-ranked page of each cluster; 'drop'
+                does not store new near-duplicates at all; 'off' skips fingerprinting.
+            read_only, mmap_size, page_cache_mib: Serving mode; see open_readonly().
+            semantic: Also store a local semantic vector per page (see vectors.py), for
+                hybrid_search(). Enabled automatically once the index has a vectors file.
+                Requires numpy.
+        """
+        if on_unchanged not in self.UNCHANGED_MODES:
+            raise ValueError(f"on_unchanged must be one of {self.UNCHANGED_MODES}, not {on_unchanged!r}")
+        if near_duplicates not in self.NEAR_DUPLICATE_MODES:
+            raise ValueError(f"near_duplicates must be one of {self.NEAR_DUPLICATE_MODES}, not {near_duplicates!r}")
         db_path_to_use = db_path if db_path is not None else os.getenv('AISANS_DB_PATH', 'aisans_index.db')
         self.db_path = db_path_to_use
+        self.read_only = read_only
         # Ensure the directory for the db_path exists
         # Use os.path.abspath to handle relative paths correctly before dirname
         abs_db_path = os.path.abspath(self.db_path)
         db_dir = os.path.dirname(abs_db_path)
-        if db_dir: # Only create if db_dir is not empty (e.g. db is in current dir)
+        if db_dir and not read_only: # Only create if db_dir is not empty (e.g. db is in current dir)
             os.makedirs(db_dir, exist_ok=True)
 
+        self.wal = wal
+        self.mmap_size = mmap_size
+        self.page_cache_mib = page_cache_mib
+        # Reads go through pooled read-only connections instead of the shared one.
+        self._use_readers = wal or read_only
+        self.busy_timeout_ms = busy_timeout_ms
+        self.on_unchanged = on_unchanged
+        self.near_duplicates = near_duplicates
+        # Committed writes that found identical content and skipped re-indexing.
+        self.writes_avoided = 0
+        # Committed writes whose body was a near-duplicate of another page (clustered or dropped).
+        self.near_duplicates_found = 0
+        self._counter_lock = threading.Lock()
+        # Serializes use of the shared writer connection across threads.
+        self._lock = threading.RLock()
+        self._idle_readers = [] # Most recently returned last
+        self._reader_lock = threading.Lock()
+        self._reader_epoch = 0 # Bumped by close(); connections borrowed before are closed when returned
+        self._cache = QueryCache(cache_size, cache_ttl) if cache_size > 0 else None
+        self._write_generation = 0
+        self._generation_lock = threading.Lock()
+        self._seen_data_version = None # Writer connection's PRAGMA data_version (non-WAL)
+        # 'suggest' / 'spelling' -> (model, write generation, monotonic load time); built on first use.
+        self._vocabulary_models = {}
+        self._vocabulary_lock = threading.Lock()
+        self._doc_freqs = {} # term -> (document count, write generation, monotonic time)
+        self._vectors = self._open_vectors(semantic)
+
         self.conn = None
         self._connect() # Initial connection attempt
-        if self.conn: # Only create table if connection was successful
+        if self.conn and read_only:
+            self._check_schema_version()
+        elif self.conn: # Only create table if connection was successful
             self._create_table()
 
+        self._write_queue = None
+        self._writer_thread = None
+        self._writer_errors = 0
+        self._writer_failed = False # Set if the writer thread could not open its connection
+        if write_behind and self.conn and not read_only:
+            self._write_batch_size = max(1, write_batch_size)
+            self._write_queue = queue.Queue(maxsize=write_queue_size)
+            self._writer_thread = threading.Thread(target=self._writer_loop, name="aisans-index-writer", daemon=True)
+            self._writer_thread.start()
+
+    @classmethod
+    def open_readonly(cls, db_path=None, mmap_size: int = 1 << 30, page_cache_mib: int = 64,
+                      cache_size: int = 1024, cache_ttl: float | None = 60.0) -> 'Indexer':
+        """
+        Opens an existing index for serving searches only.
+
+        The file is opened through a mode=ro URI with PRAGMA query_only, and no DDL,
+        migration or makedirs is run, so this also works on a read-only file or directory.
+        Pages are read through a memory map of up to mmap_size bytes, which is served from
+        the OS page cache and therefore shared by every process mapping the same file; each
+        connection additionally keeps up to page_cache_mib of SQLite's own page cache.
+        Concurrent searches each borrow a pooled connection (see READER_POOL_SIZE).
+
+        Writes fail with a printed error, as for a closed database. A file with an older
+        schema is opened with a warning; migrate it with scripts/migrate_index.py first.
+        """
+        return cls(db_path=db_path, cache_size=cache_size, cache_ttl=cache_ttl, read_only=True,
+                   mmap_size=mmap_size, page_cache_mib=page_cache_mib)
+
+    def _open_vectors(self, semantic: bool):
+        """Returns the VectorStore if semantic vectors are enabled (or already exist), else None."""
+        path = vectors.vectors_path(os.path.abspath(self.db_path))
+        if not (semantic or os.path.exists(path)):
+            return None
+        if vectors.numpy is None:
+            print(f"Warning: numpy is not installed; semantic vectors ({path}) are disabled"
+                  f"{' and will not be updated' if os.path.exists(path) else ''}.")
+            return None
+        if self.read_only and not os.path.exists(path):
+            return None
+        return vectors.VectorStore(path, read_only=self.read_only)
+
+    @staticmethod
+    def _vector_text(title, body, snippet, llm_summary) -> str:
+        """The text a page's semantic vector is computed from."""
+        return ' '.join(text for text in (title, llm_summary, body or snippet) if text)
+
     def _connect(self):
         if self.conn is not None: # Already connected
             return
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            if self.read_only:
+                self.conn = self._open_readonly_connection()
+            else:
+                self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._configure_connection(self.conn)
+            if self.wal and not self.read_only:
+                self.conn.execute("PRAGMA journal_mode=WAL")
             # print(f"Successfully connected to database: {self.db_path}")
         except sqlite3.Error as e:
             print(f"Error connecting to database {self.db_path}: {e}")
             self.conn = None # Ensure conn is None on error
             # raise # Optionally re-raise if connection is critical for instantiation
 
+    def _configure_connection(self, conn):
+        """Applies the per-connection pragmas shared by the writer, write-behind and reader connections."""
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        if self.wal:
+            # In WAL mode NORMAL only syncs at checkpoints; a commit is durable against
+            # application crashes and the database cannot be corrupted by power loss.
+            conn.execute("PRAGMA synchronous = NORMAL")
+        if self.read_only:
+            conn.execute("PRAGMA query_only = ON")
+        if self.mmap_size:
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        if self.page_cache_mib:
+            conn.execute(f"PRAGMA cache_size = {-1024 * int(self.page_cache_mib)}") # Negative: KiB
+
+    def _open_readonly_connection(self):
+        uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+        return sqlite3.connect(uri, uri=True, check_same_thread=False, factory=_ReadConnection)
+
+    def _check_schema_version(self):
+        """Warns if a read-only index predates SCHEMA_VERSION (it cannot be migrated in place)."""
+        try:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error reading schema version of {self.db_path}: {e}")
+            return
+        if version < SCHEMA_VERSION:
+            print(f"Warning: index {self.db_path} has schema version {version} (current: {SCHEMA_VERSION}); "
+                  f"some queries may fail until it is migrated with scripts/migrate_index.py.")
+
+    @contextlib.contextmanager
+    def _reader(self):
+        """
+        Borrows an idle read-only connection, or opens one if none is idle (WAL and read-only
+        modes). It goes back to the pool afterwards unless READER_POOL_SIZE are idle already.
+        """
+        with self._reader_lock:
+            conn = self._idle_readers.pop() if self._idle_readers else None
+            epoch = self._reader_epoch
+        if conn is None:
+            conn = self._open_readonly_connection()
+            self._configure_connection(conn)
+        try:
+            yield conn
+        finally:
+            with self._reader_lock:
+                if epoch == self._reader_epoch and len(self._idle_readers) < self.READER_POOL_SIZE:
+                    self._idle_readers.append(conn)
+                    conn = None
+            if conn is not None:
+                self._close_reader(conn)
+
+    @staticmethod
+    def _close_reader(conn):
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Error closing reader connection: {e}")
+
     def _create_table(self):
         if not self.conn:
             # print("Cannot create table, no database connection.")
@@ -39,32 +268,122 @@ class Indexer:
 
         try:
             cursor = self.conn.cursor()
-            # Schema: url, title, body, snippet, source_engine, crawled_timestamp
-            # Tokenizer: unicode61 remove_diacritics 2 (removes diacritics for better matching)
-            # remove_diacritics 0=off, 1=on (default, some issues), 2=on (better for all latin chars)
-            create_table_sql = """
-            CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(
-                url UNINDEXED, -- URLs are usually not searched for full-text but used as IDs
-                title,
-                body,
-                snippet,
-                llm_summary, -- Added llm_summary field
-                source_engine,
-                crawled_timestamp,
-                tokenize = "unicode61 remove_diacritics 2"
-            );
-            """
-            # Add an index on URL for faster lookups if needed, though FTS5 rowid might be sufficient for primary key ops
-            # cursor.execute("CREATE INDEX IF NOT EXISTS idx_url ON pages(url);")
-            cursor.execute(create_table_sql)
-            # The following line was removed as it caused warnings:
-            # cursor.execute("CREATE INDEX IF NOT EXISTS idx_pages_url ON pages(url);")
+            # Table definitions and migrations of older files live in storage.py.
+            # One transaction, so an interrupted migration leaves the old layout intact.
+            cursor.execute("BEGIN")
+            ensure_schema(cursor)
             self.conn.commit()
             # print("FTS5 'pages' table created or already exists.")
         except sqlite3.Error as e:
             print(f"Error creating FTS5 table 'pages': {e}")
+            try:
+                self.conn.rollback()
+            except sqlite3.Error as re:
+                print(f"Error during rollback: {re}")
             # Not raising here, as connection might still be valid or table exists.
 
+    def _write_rows(self, cursor, documents: list[dict]) -> tuple[int, int, tuple[list[int], object] | None]:
+        """
+        Upserts already-validated documents inside the caller's transaction.
+
+        Each URL keeps its page_meta id across updates, and that id is the rowid of its
+        entry in pages, so replacing a page is a B-tree lookup plus a rowid delete/insert.
+        Pages whose content hash is unchanged are handled per on_unchanged, and rewritten
+        pages are fingerprinted per near_duplicates.
+        If a URL appears more than once, the last occurrence wins.
+
+        Returns:
+            (unchanged, near_duplicates, page_vectors): documents not re-indexed because their
+            content was unchanged, documents found to be near-duplicates of another page, and
+            (page ids, vectors.encode_pages() matrix) of the rewritten pages to store once
+            committed (None if semantic vectors are off or no page was rewritten). Pass the
+            whole tuple to _finish_writes() after the commit.
+        """
+        latest = {doc['url']: doc for doc in documents}
+        urls = list(latest)
+        # Ids above this one are allocated by the INSERT below, i.e. belong to new URLs.
+        last_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM page_meta").fetchone()[0]
+        cursor.executemany("INSERT OR IGNORE INTO page_meta (url, host) VALUES (?, ?)", [(url, url_host(url)) for url in urls])
+        pages = lookup_pages(cursor, urls)
+
+        rows, meta_rows, touched = [], [], []
+        for url, doc in latest.items():
+            page_id, stored_hash = pages[url]
+            # The columns have TEXT affinity, so e.g. a numeric body is stored as its text anyway; converting
+            # up front lets fingerprinting, vocabulary and vectors rely on str.
+            fields = tuple(None if value is None else str(value) for value in (
+                doc.get('title'), doc.get('body'), doc.get('snippet'), doc.get('llm_summary'), doc.get('source_engine')))
+            digest = content_hash(*fields)
+            if digest == stored_hash and self.on_unchanged != 'rewrite':
+                if self.on_unchanged == 'touch':
+                    touched.append((doc.get('crawled_timestamp'), page_id))
+                continue
+            title, body, snippet, llm_summary, source_engine = fields
+            rows.append((page_id, title, body, snippet, llm_summary, source_engine, doc.get('crawled_timestamp')))
+            meta_rows.append((digest, doc.get('crawled_timestamp'), source_engine, page_id))
+
+        unchanged = len(latest) - len(rows)
+        near_duplicates = 0
+        if self.near_duplicates != 'off':
+            kept = []
+            for row in rows:
+                page_id, body = row[0], row[2]
+                value = simhash.fingerprint(body)
+                match = None if value is None else find_near_duplicate(cursor, value, exclude_id=page_id)
+                if match is not None:
+                    near_duplicates += 1
+                    if self.near_duplicates == 'drop' and page_id > last_id:
+                        # Never stored; only its page_meta row exists so far.
+                        cursor.execute("DELETE FROM page_meta WHERE id = ?", (page_id,))
+                        continue
+                # Written before the next row is checked, so near-duplicates within one batch are found too.
+                set_fingerprint(cursor, page_id, value, None if match is None else match[1])
+                kept.append(row)
+            if len(kept) != len(rows):
+                kept_ids = {row[0] for row in kept}
+                meta_rows = [meta for meta in meta_rows if meta[-1] in kept_ids]
+                rows = kept
+
+        models = [model for model, _, _ in list(self._vocabulary_models.values())]
+        if models and rows:
+            written_terms = set()
+            for row in rows:
+                for text in (row[1], row[2], row[4], row[5]): # The FTS_COLUMNS
+                    written_terms |= suggestions.terms(text)
+            for model in models:
+                model.note_terms(written_terms)
+
+        # Pages with new ids have nothing indexed yet, so only existing ones need unindexing.
+        write_pages(cursor, [row for row in rows if row[0] <= last_id])
+        write_pages(cursor, [row for row in rows if row[0] > last_id], replace=False)
+        write_meta(cursor, meta_rows)
+        touch_pages(cursor, touched)
+        page_vectors = None
+        if self._vectors is not None and rows:
+            page_vectors = ([row[0] for row in rows], vectors.encode_pages([self._vector_text(*row[1:5]) for row in rows]))
+        return unchanged, near_duplicates, page_vectors
+
+    def _finish_writes(self, written: tuple):
+        """
+        Applies what a committed _write_rows call returned: the (unchanged, near_duplicates)
+        counters, and the vectors of the rewritten pages.
+        """
+        unchanged, near_duplicates, page_vectors = written
+        if page_vectors is not None:
+            try:
+                self._vectors.write(*page_vectors)
+            except OSError as e:
+                print(f"Error writing page vectors to {self._vectors.path}: {e}")
+        if unchanged or near_duplicates:
+            with self._counter_lock:
+                self.writes_avoided += unchanged
+                self.near_duplicates_found += near_duplicates
+
+    @classmethod
+    def _is_valid_document(cls, doc: dict) -> bool:
+        """Every REQUIRED_FIELD present and a str url; checked before any SQL runs."""
+        return all(field in doc for field in cls.REQUIRED_FIELDS) and isinstance(doc['url'], str)
+
     def add_document(self, doc_data: dict):
         if not self.conn:
             print("Database connection is not available. Attempting to reconnect...")
@@ -73,40 +392,37 @@ class Indexer:
                 print("Reconnect failed. Cannot add document.")
                 return False
 
-        required_fields = ['url', 'title', 'body', 'snippet', 'source_engine', 'crawled_timestamp']
-        # llm_summary is optional, so not in required_fields
-        if not all(field in doc_data for field in required_fields):
-            print(f"Document data is missing one or more required fields ({required_fields}): {doc_data.get('url', 'N/A')}")
+        # llm_summary is optional, so not in REQUIRED_FIELDS
+        if not self._is_valid_document(doc_data):
+            print(f"Document data is missing one or more required fields ({self.REQUIRED_FIELDS}) "
+                  f"or has no string url: {doc_data.get('url', 'N/A')}")
             return False
 
-        try:
-            cursor = self.conn.cursor()
-            # Delete-then-insert strategy for URL uniqueness.
-            cursor.execute("DELETE FROM pages WHERE url = ?", (doc_data['url'],))
-
-            insert_sql = """
-            INSERT INTO pages (url, title, body, snippet, llm_summary, source_engine, crawled_timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """
-            cursor.execute(insert_sql, (
-                doc_data.get('url'),
-                doc_data.get('title'),
-                doc_data.get('body'),
-                doc_data.get('snippet'),
-                doc_data.get('llm_summary'), # Add llm_summary
-                doc_data.get('source_engine'),
-                doc_data.get('crawled_timestamp')
-            ))
-            self.conn.commit()
-            # print(f"Document added/updated: {doc_data.get('url')}")
+        if self._write_queue is not None:
+            if self._writer_failed:
+                print(f"Write-behind writer is not available. Cannot add document: {doc_data.get('url')}")
+                return False
+            # Accepted for writing; the writer thread reports any write errors.
+            self._write_queue.put(dict(doc_data))
             return True
-        except sqlite3.Error as e:
-            print(f"Error adding document (URL: {doc_data.get('url')}): {e}")
+
+        with self._lock:
             try:
-                self.conn.rollback()
-            except sqlite3.Error as re:
-                print(f"Error during rollback: {re}")
-            return False
+                cursor = self.conn.cursor()
+                # Delete-then-insert strategy for URL uniqueness, keyed through page_meta.
+                written = self._write_rows(cursor, [doc_data])
+                self.conn.commit()
+                self._bump_generation()
+                self._finish_writes(written)
+                # print(f"Document added/updated: {doc_data.get('url')}")
+                return True
+            except Exception as e: # Not only sqlite3.Error: the transaction must never stay open
+                print(f"Error adding document (URL: {doc_data.get('url')}): {e}")
+                try:
+                    self.conn.rollback()
+                except sqlite3.Error as re:
+                    print(f"Error during rollback: {re}")
+                return False
 
     def add_batch(self, documents: list[dict]):
         if not self.conn:
@@ -116,48 +432,234 @@ class Indexer:
                 print("Reconnect failed. Cannot add batch.")
                 return 0
 
-        successful_adds = 0
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute("BEGIN TRANSACTION;")
+        valid_docs = []
+        for doc in documents:
+            # llm_summary is optional
+            if not self._is_valid_document(doc):
+                print(f"Skipping document in batch due to missing fields or no string url (URL: {doc.get('url', 'N/A')})")
+                continue
+            valid_docs.append(doc)
 
-            delete_sql = "DELETE FROM pages WHERE url = ?"
-            insert_sql = """
-            INSERT INTO pages (url, title, body, snippet, llm_summary, source_engine, crawled_timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """
+        if self._write_queue is not None:
+            if self._writer_failed:
+                print(f"Write-behind writer is not available. Cannot add batch of {len(valid_docs)} documents.")
+                return 0
+            for doc in valid_docs:
+                self._write_queue.put(dict(doc))
+            return len(valid_docs)
 
-            for doc in documents:
-                required_fields = ['url', 'title', 'body', 'snippet', 'source_engine', 'crawled_timestamp']
-                # llm_summary is optional
-                if not all(field in doc for field in required_fields):
-                    print(f"Skipping document in batch due to missing fields (URL: {doc.get('url', 'N/A')})")
-                    continue
-
-                cursor.execute(delete_sql, (doc['url'],))
-                cursor.execute(insert_sql, (
-                    doc.get('url'),
-                    doc.get('title'),
-                    doc.get('body'),
-                    doc.get('snippet'),
-                    doc.get('llm_summary'), # Add llm_summary
-                    doc.get('source_engine'),
-                    doc.get('crawled_timestamp')
-                ))
-                successful_adds += 1
+        with self._lock:
+            try:
+                cursor = self.conn.cursor()
+                cursor.execute("BEGIN TRANSACTION;")
+                written = self._write_rows(cursor, valid_docs)
+                self.conn.commit()
+                self._bump_generation()
+                self._finish_writes(written)
+                # print(f"Batch add completed. {len(valid_docs)} documents processed for insertion.")
+                return len(valid_docs)
+            except Exception as e:
+                print(f"Error adding batch of documents: {e}")
+                try:
+                    self.conn.rollback()
+                except sqlite3.Error as re:
+                    print(f"Error during rollback: {re}")
+                return 0
 
-            self.conn.commit()
-            # print(f"Batch add completed. {successful_adds} documents processed for insertion.")
-            return successful_adds
-        except sqlite3.Error as e:
-            print(f"Error adding batch of documents: {e}")
+    def ingest(self, documents: Iterable[dict], chunk_size: int = 500, max_chunk_seconds: float = 1.0) -> list[dict]:
+        """
+        Streams documents from any iterable into the index in group-committed chunks.
+
+        Documents are pulled lazily, so memory use is bounded by one chunk regardless of
+        how many documents the iterable yields. A chunk is written (one transaction,
+        executemany per statement) once it holds chunk_size documents or, checked as each
+        document arrives, once max_chunk_seconds have passed since its first document arrived.
+        A chunk is never committed while waiting for the iterable, so a slow iterable can
+        keep one open longer.
+
+        Args:
+            documents: Any iterable or generator of document dicts (same fields as add_document).
+            chunk_size: Maximum number of documents per transaction.
+            max_chunk_seconds: Age after which a chunk is committed, checked as each document arrives.
+
+        Returns:
+            A list with one stats dict per chunk: 'documents' written, 'skipped' (missing
+            fields or no string url), 'unchanged' (written without re-indexing, see on_unchanged),
+            'near_duplicates' (see near_duplicates), 'seconds' spent writing, 'docs_per_sec',
+            and 'error' (None on success).
+            Documents of a failed chunk are rolled back; later chunks are still attempted.
+        """
+        if not self.conn:
+            print("Database connection is not available. Attempting to reconnect...")
+            self._connect()
+            if not self.conn:
+                print("Reconnect failed. Cannot ingest documents.")
+                return []
+
+        chunk_stats = []
+        chunk = []
+        skipped = 0
+        chunk_started = None
+
+        for doc in documents:
+            if not self._is_valid_document(doc):
+                skipped += 1
+            else:
+                chunk.append(doc)
+            if chunk_started is None:
+                chunk_started = time.monotonic()
+            if len(chunk) >= chunk_size or time.monotonic() - chunk_started >= max_chunk_seconds:
+                chunk_stats.append(self._commit_chunk(chunk, skipped))
+                chunk, skipped, chunk_started = [], 0, None
+
+        if chunk or skipped:
+            chunk_stats.append(self._commit_chunk(chunk, skipped))
+        return chunk_stats
+
+    def _commit_chunk(self, chunk: list[dict], skipped: int) -> dict:
+        """Writes one ingest chunk in its own transaction and returns its stats."""
+        stats = {'documents': 0, 'skipped': skipped, 'unchanged': 0, 'near_duplicates': 0,
+                 'seconds': 0.0, 'docs_per_sec': 0.0, 'error': None}
+        if not chunk:
+            return stats
+        started = time.perf_counter()
+        with self._lock:
             try:
-                self.conn.rollback()
-            except sqlite3.Error as re:
-                print(f"Error during rollback: {re}")
-            return 0
+                cursor = self.conn.cursor()
+                cursor.execute("BEGIN TRANSACTION;")
+                written = self._write_rows(cursor, chunk)
+                self.conn.commit()
+                self._bump_generation()
+                self._finish_writes(written)
+                stats['documents'] = len(chunk)
+                stats['unchanged'], stats['near_duplicates'] = written[:2]
+            except Exception as e:
+                print(f"Error ingesting chunk of {len(chunk)} documents: {e}")
+                stats['error'] = str(e)
+                try:
+                    self.conn.rollback()
+                except sqlite3.Error as re:
+                    print(f"Error during rollback: {re}")
+        stats['seconds'] = time.perf_counter() - started
+        if stats['seconds'] > 0:
+            stats['docs_per_sec'] = stats['documents'] / stats['seconds']
+        return stats
+
+    def delete_document(self, url: str) -> bool:
+        """Removes the page stored for url. Returns True if a page was deleted."""
+        if not self.conn:
+            print("Database connection is not available. Attempting to reconnect...")
+            self._connect()
+            if not self.conn:
+                print("Reconnect failed. Cannot delete document.")
+                return False
+
+        with self._lock:
+            try:
+                cursor = self.conn.cursor()
+                row = cursor.execute("SELECT id FROM page_meta WHERE url = ?", (url,)).fetchone()
+                if row is None:
+                    return False
+                remove_pages(cursor, [row[0]])
+                self.conn.commit()
+                self._bump_generation()
+                if self._vectors is not None:
+                    try:
+                        self._vectors.delete([row[0]])
+                    except OSError as e:
+                        print(f"Error removing page vector from {self._vectors.path}: {e}")
+                return True
+            except sqlite3.Error as e:
+                print(f"Error deleting document (URL: {url}): {e}")
+                try:
+                    self.conn.rollback()
+                except sqlite3.Error as re:
+                    print(f"Error during rollback: {re}")
+                return False
+
+    def get_document(self, url: str) -> dict | None:
+        """Returns every stored field of the page for url, including its full body, or None."""
+        if not self.conn:
+            self._connect()
+            if not self.conn:
+                print("Reconnect failed. Cannot read document.")
+                return None
+        try:
+            return self._read_with(lambda cursor: read_page(cursor, url))
+        except sqlite3.Error as e:
+            print(f"Error reading document (URL: {url}): {e}")
+            return None
+
+    def _bump_generation(self):
+        """Marks every cached search result as stale; called after each committed write."""
+        with self._generation_lock:
+            self._write_generation += 1
+
+    def _cache_generation(self) -> int:
+        """
+        Returns the write generation that cached search results must match.
+
+        Commits made through this Indexer bump it directly. Commits made by any other
+        connection (another process, or a connection this object does not track) are
+        detected through PRAGMA data_version, which changes on a connection whenever
+        someone else commits. A pooled reader's first check only records its version, so
+        opening readers under load does not empty the cache; the idle readers that were
+        already tracking report such commits, and cache_ttl bounds any miss. The writer
+        connection's first check bumps (once per connection, before anything is cached).
+        """
+        data_version_sql = "PRAGMA data_version"
+        if self._use_readers:
+            with self._reader() as conn:
+                data_version = conn.execute(data_version_sql).fetchone()[0]
+                # Borrowed exclusively, so its remembered version can be updated without a lock.
+                seen, conn._seen_data_version = conn._seen_data_version, data_version
+                if seen is not None and seen != data_version:
+                    self._bump_generation()
+        else:
+            with self._lock:
+                data_version = self.conn.execute(data_version_sql).fetchone()[0]
+            if self._seen_data_version != data_version:
+                self._seen_data_version = data_version
+                self._bump_generation()
+        return self._write_generation
+
+    def cache_stats(self) -> dict:
+        """Returns hit/miss/eviction counters of the query cache (all zero if it is disabled)."""
+        if self._cache is None:
+            return {'entries': 0, 'hits': 0, 'misses': 0, 'evictions': 0, 'hit_rate': 0.0}
+        return self._cache.stats()
+
+    def search(self, query_string: str, limit: int = 10, columns: tuple[str, ...] = (),
+               collapse: bool = True, since=None, until=None,
+               sources: Iterable[str] | None = None, hosts: Iterable[str] | None = None,
+               raw: bool = False, autocorrect: bool = False) -> list[SearchResult]:
+        """
+        Full-text search over the index, best match first.
+
+        Args:
+            query_string: User query, parsed and planned by plan_query() (see query.py for
+                the syntax). With raw=True it is passed to FTS5 MATCH unchanged.
+            limit: Maximum number of results.
+            columns: Lazy columns ('llm_summary', 'body') to fetch for all hits up front, in
+                one query. Otherwise each is fetched on first access, per hit.
+            collapse: Return only the best-ranked page of each near-duplicate cluster. Up to
+                limit * COLLAPSE_OVERFETCH candidates are considered, so a query dominated by
+                copies of one page can still return fewer than limit results.
+            since, until: Only pages crawled at or after since, and before until. Epoch
+                seconds, datetimes (naive = UTC) or ISO 8601 strings.
+            sources: Only pages whose source_engine is one of these.
+            hosts: Only pages on one of these host names (exact match, case-insensitive).
+            raw: Treat query_string as an FTS5 query expression (trusted callers only).
+            autocorrect: Search for correct_query(query_string) instead, if it corrected
+                anything (ignored with raw).
 
-    def search(self, query_string: str, limit: int = 10) -> list[dict]:
+        Returns:
+            SearchResult objects; they support res['field'] / res.get() like the dicts
+            search() used to return.
+
+        Raises:
+            ValueError: If since or until is not a recognizable timestamp.
+        """
         if not self.conn:
             # Attempt to reconnect if called on a closed or failed indexer
             # print("Database connection is not available for search. Attempting to reconnect...")
@@ -166,42 +668,683 @@ class Indexer:
                 print("Reconnect failed. Cannot perform search.")
                 return []
 
-        original_row_factory = None # Define outside try to ensure it's in scope for finally
-        try:
-            original_row_factory = self.conn.row_factory # Store original
-            self.conn.row_factory = sqlite3.Row # Access columns by name
-
-            cursor = self.conn.cursor()
+        if autocorrect and not raw:
+            query_string = self.correct_query(query_string) or query_string
+        since, until = self._epoch_arg(since), self._epoch_arg(until)
+        filter_sql, filter_params = self._filter_sql(since, until, sources, hosts)
+        collapse = collapse and self.near_duplicates != 'off'
+        candidate_limit = limit * self.COLLAPSE_OVERFETCH if collapse else limit
 
-            # Search across all FTS5 indexed columns by default.
-            # Selecting rank to see relevance, and other stored columns.
-            # Added llm_summary to the SELECT statement.
-            search_sql = """
-            SELECT url, title, snippet, llm_summary, source_engine, crawled_timestamp, rank
-            FROM pages
+        # Search across all FTS5 indexed columns by default. The contentless FTS5 table
+        # only yields rowid and rank; the small stored columns are joined in for the top
+        # hits only, and llm_summary/body are left for load_columns().
+        # "WHERE pages MATCH ?" (table name on the left) makes FTS5 search all indexed columns.
+        candidates_sql = """
+            SELECT rowid, rank FROM pages
             WHERE pages MATCH ?
             ORDER BY rank -- BM25 relevance score, lower is better (default for FTS5)
             LIMIT ?
+        """
+        if filter_sql:
+            # Filters are checked against page_meta by primary key for each match; CROSS JOIN
+            # keeps FTS5 as the outer loop. For broad filters FTS5 still sorts by rank itself
+            # and the scan stops once LIMIT matches passed. For selective ones that would rank
+            # (bm25) nearly every match only to discard it, so "+" hides the ORDER BY from
+            # FTS5 and SQLite's sorter computes rank only for matches that pass the filters.
+            order_by = "+pages.rank" if self._filters_are_selective(since, until, hosts) else "pages.rank"
+            candidates_sql = f"""
+            SELECT pages.rowid AS rowid, pages.rank AS rank FROM pages
+            CROSS JOIN page_meta fm ON fm.id = pages.rowid
+            WHERE pages MATCH ? {filter_sql}
+            ORDER BY {order_by}
+            LIMIT ?
+            """
+        params = (*filter_params, candidate_limit)
+        if not collapse:
+            search_sql = f"""
+            SELECT f.rowid, m.url, c.title, c.snippet, c.source_engine, c.crawled_timestamp, f.rank
+            FROM ({candidates_sql}) AS f
+            JOIN page_meta m ON m.id = f.rowid
+            JOIN page_content c ON c.id = f.rowid
+            ORDER BY f.rank
+            """
+        else:
+            # With MIN(), SQLite takes the other (bare) columns from the row holding the
+            # minimum, i.e. each group yields its best-ranked page.
+            search_sql = f"""
+            SELECT f.rowid, m.url, c.title, c.snippet, c.source_engine, c.crawled_timestamp, MIN(f.rank) AS rank
+            FROM ({candidates_sql}) AS f
+            LEFT JOIN page_simhash s ON s.id = f.rowid
+            JOIN page_meta m ON m.id = f.rowid
+            JOIN page_content c ON c.id = f.rowid
+            GROUP BY COALESCE(s.cluster_id, f.rowid)
+            ORDER BY rank
+            LIMIT ?
             """
-            # Using "pages" as the first argument to MATCH is not standard SQL for FTS5.
-            # Usually, you specify column names or the table name itself if all columns are indexed and searched by default.
-            # FTS5 by default searches all columns unless specific columns are mentioned (e.g., "pages(title, body) MATCH ?").
-            # So, "WHERE pages MATCH ?" is correct for FTS5 to search all indexed columns.
+            params += (limit,)
+
+        def run_search() -> list[tuple]:
+            expression = self._match_expression(query_string, raw)
+            if expression is None: # Planned away: nothing can match
+                return []
+            return self._read_rows(search_sql, (expression, *params))
+
+        try:
+            if self._cache is None:
+                rows = run_search()
+            else:
+                # Whitespace is normalized; case is not, since operators (AND/OR/NOT) are case-sensitive.
+                cache_key = (' '.join(query_string.split()), raw, limit, collapse, filter_sql, tuple(filter_params))
+                # Taken before the query runs: a write that races with it leaves a stale generation behind.
+                generation = self._cache_generation()
+                rows = self._cache.get(cache_key, generation)
+                if rows is None:
+                    rows = run_search()
+                    self._cache.put(cache_key, generation, rows)
+        except sqlite3.Error as e:
+            print(f"Error searching index for query '{query_string}': {e}")
+            return []
+
+        # The cache holds immutable tuples; every call gets its own result objects.
+        results = [SearchResult(self, row) for row in rows]
+        if columns:
+            self.load_columns(results, columns)
+        return results
+
+    def _epoch_arg(self, value) -> int | None:
+        if value is None:
+            return None
+        epoch = to_epoch(value)
+        if epoch is None:
+            raise ValueError(f"Not a timestamp: {value!r}")
+        return epoch
+
+    def _filters_are_selective(self, since: int | None, until: int | None, hosts) -> bool:
+        """
+        Guesses whether search() filters pass only a small share of the pages.
+
+        A host is assumed to be a small part of the index. Time ranges are compared with
+        the crawled_at span of the index (two index probes), assuming pages are spread
+        evenly over it. Source filters alone are treated as broad.
+        """
+        if hosts is not None:
+            return True
+        if since is None and until is None:
+            return False
+        oldest, newest = self._read_rows(
+            "SELECT (SELECT MIN(crawled_at) FROM page_meta), (SELECT MAX(crawled_at) FROM page_meta)", ()
+        )[0]
+        if oldest is None or newest <= oldest:
+            return False
+        start = oldest if since is None else max(since, oldest)
+        end = newest if until is None else min(until, newest)
+        return (end - start) / (newest - oldest) < self.SELECTIVE_FILTER_FRACTION
+
+    def _filter_sql(self, since: int | None, until: int | None, sources, hosts) -> tuple[str, list]:
+        """Builds the 'AND ...' conditions on page_meta (aliased fm) for search() filters."""
+        clauses, params = [], []
+        for epoch, condition in ((since, "fm.crawled_at >= ?"), (until, "fm.crawled_at < ?")):
+            if epoch is not None:
+                clauses.append(condition)
+                params.append(epoch)
+        for values, column in ((sources, "fm.source"), (hosts, "fm.host")):
+            if values is None:
+                continue
+            values = [values] if isinstance(values, str) else list(values)
+            if column == "fm.host":
+                values = [host.lower() for host in values]
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        return ''.join(f" AND {clause}" for clause in clauses), params
+
+    def load_columns(self, results: list[SearchResult], columns: tuple[str, ...] = ('llm_summary',)) -> None:
+        """
+        Fetches lazy columns for a list of search results in a single query.
+
+        Call it with the hits that are actually going to be displayed; results that
+        already have a column loaded are skipped.
+        """
+        unknown = set(columns) - set(SearchResult.LAZY_FIELDS)
+        if unknown:
+            raise ValueError(f"Not a lazy search result column: {sorted(unknown)}")
+        for column in columns:
+            pending = [res for res in results if not res.is_loaded(column)]
+            if not pending:
+                continue
+            if not self.conn:
+                self._connect()
+                if not self.conn:
+                    print("Reconnect failed. Cannot load result columns.")
+                    return
+            ids = [res.id for res in pending]
+            try:
+                found = self._read_with(lambda cursor: read_fields(cursor, ids, (column,)))
+            except sqlite3.Error as e:
+                print(f"Error loading column '{column}' for search results: {e}")
+                return
+            for res in pending:
+                # A page deleted since the search ran reads as None.
+                setattr(res, column, found.get(res.id, {}).get(column))
 
-            cursor.execute(search_sql, (query_string, limit))
-            results = cursor.fetchall()
+    def search_page(self, query_string: str, limit: int = 10, cursor: str | None = None,
+                    raw: bool = False, autocorrect: bool = False, collapse: bool = True, since=None,
+                    until=None, sources: Iterable[str] | None = None,
+                    hosts: Iterable[str] | None = None) -> tuple[list[SearchResult], str | None]:
+        """
+        Returns one page of results plus an opaque cursor for the next page.
 
-            results_as_dict = [dict(row) for row in results]
+        Pages are keyed on (rank, rowid) instead of LIMIT/OFFSET, so SQLite never has to
+        materialize and skip the rows of earlier pages: page 50 costs about the same as page 1.
 
-            return results_as_dict
+        Args:
+            query_string: Query, as for search().
+            limit: Page size.
+            cursor: The cursor returned with the previous page, or None for the first page.
+                Pass the same query and filters for every page.
+            raw, autocorrect, since, until, sources, hosts: As for search().
+            collapse: Return only the best-ranked page of each near-duplicate cluster. Unlike
+                search(), every match is considered, so no cluster shows up on two pages and
+                a page 1 can only differ from search() where search()'s candidate window
+                (limit * COLLAPSE_OVERFETCH) missed a cluster's best page.
+
+        Returns:
+            A (results, next_cursor) tuple. next_cursor is None once there are no more results.
+
+        Raises:
+            ValueError: If cursor is not a value previously returned by search_page, or since
+                or until is not a recognizable timestamp.
+        """
+        if not self.conn:
+            self._connect()
+            if not self.conn:
+                print("Reconnect failed. Cannot perform search.")
+                return [], None
+
+        if autocorrect and not raw:
+            query_string = self.correct_query(query_string) or query_string
+        since, until = self._epoch_arg(since), self._epoch_arg(until)
+        filter_sql, params = self._filter_sql(since, until, sources, hosts)
+        collapse = collapse and self.near_duplicates != 'off'
+        keyset_sql = ""
+        if cursor is not None:
+            try:
+                last_rank, last_rowid = cursor.rsplit(':', 1)
+                last_rank, last_rowid = float(last_rank), int(last_rowid)
+            except (AttributeError, ValueError):
+                raise ValueError(f"Invalid search cursor: {cursor!r}")
+            keyset_sql = "AND (rank > ? OR (rank = ? AND rowid > ?))"
+            params += [last_rank, last_rank, last_rowid]
+
+        if filter_sql:
+            matches_sql = f"""
+            SELECT pages.rowid AS rowid, pages.rank AS rank FROM pages
+            CROSS JOIN page_meta fm ON fm.id = pages.rowid
+            WHERE pages MATCH ? {filter_sql}
+            """
+        else:
+            matches_sql = "SELECT rowid, rank FROM pages WHERE pages MATCH ?"
+        if collapse:
+            # Keeps each cluster's best match among all (filtered) matches, so which page of a
+            # cluster is shown does not depend on where the page boundaries fall.
+            matches_sql = f"""
+            SELECT rowid, rank FROM (
+                SELECT f.rowid AS rowid, f.rank AS rank, ROW_NUMBER() OVER (
+                    PARTITION BY COALESCE(s.cluster_id, f.rowid) ORDER BY f.rank, f.rowid) AS nth
+                FROM ({matches_sql}) AS f
+                LEFT JOIN page_simhash s ON s.id = f.rowid
+            ) WHERE nth = 1
+            """
+        page_sql = f"""
+        SELECT f.rowid, m.url, c.title, c.snippet, c.source_engine, c.crawled_timestamp, f.rank
+        FROM (
+            SELECT rowid, rank FROM ({matches_sql})
+            WHERE 1 {keyset_sql}
+            ORDER BY rank, rowid -- rowid breaks rank ties so the order is total
+            LIMIT ?
+        ) AS f
+        JOIN page_meta m ON m.id = f.rowid
+        JOIN page_content c ON c.id = f.rowid
+        ORDER BY f.rank, f.rowid
+        """
+        params.append(limit)
+
+        try:
+            expression = self._match_expression(query_string, raw)
+            rows = [] if expression is None else self._read_rows(page_sql, (expression, *params))
         except sqlite3.Error as e:
             print(f"Error searching index for query '{query_string}': {e}")
+            return [], None
+
+        results = [SearchResult(self, row) for row in rows]
+        next_cursor = None
+        if len(results) == limit and results:
+            next_cursor = f"{results[-1].rank!r}:{results[-1].id}"
+        return results, next_cursor
+
+    def search_iter(self, query_string: str, page_size: int = 100, raw: bool = False,
+                    autocorrect: bool = False, collapse: bool = True, since=None, until=None,
+                    sources: Iterable[str] | None = None,
+                    hosts: Iterable[str] | None = None) -> Iterator[SearchResult]:
+        """
+        Lazily yields every result for query_string in rank order, one keyset page at a time,
+        collapsed and filtered as by search_page().
+
+        Only one page is held in memory, which makes this suitable for export jobs.
+        """
+        if autocorrect and not raw: # Once, so every page answers the same query
+            query_string = self.correct_query(query_string) or query_string
+        cursor = None
+        while True:
+            rows, cursor = self.search_page(query_string, limit=page_size, cursor=cursor, raw=raw, collapse=collapse,
+                                            since=since, until=until, sources=sources, hosts=hosts)
+            yield from rows
+            if cursor is None:
+                return
+
+    def estimate_hits(self, query_string: str, cap: int = 10000, raw: bool = False) -> int:
+        """
+        Cheaply counts matching documents, stopping at cap.
+
+        No bm25 ranking is computed, so this only walks the term doclists. A return value
+        equal to cap means "cap or more".
+        """
+        if not self.conn:
+            self._connect()
+            if not self.conn:
+                print("Reconnect failed. Cannot count results.")
+                return 0
+
+        count_sql = "SELECT COUNT(*) FROM (SELECT 1 FROM pages WHERE pages MATCH ? LIMIT ?)"
+        try:
+            expression = self._match_expression(query_string, raw)
+            if expression is None:
+                return 0
+            return self._read_rows(count_sql, (expression, cap))[0][0]
+        except sqlite3.Error as e:
+            print(f"Error counting results for query '{query_string}': {e}")
+            return 0
+
+    def plan_query(self, query_string: str) -> queries.Query:
+        """
+        Parses a user query and plans it against the index vocabulary (see query.py).
+
+        Returns the planned Query: to_fts() is the MATCH expression the search methods run
+        (None if no page can match), notes lists what was dropped or capped.
+
+        Raises:
+            sqlite3.Error: If the vocabulary cannot be read.
+        """
+        parsed = queries.parse_query(query_string)
+        if not parsed.required:
+            return parsed
+
+        def plan(cursor) -> queries.Query:
+            total = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM page_meta").fetchone()[0] # ~ page count, O(1)
+            return queries.plan_query(parsed, self._doc_freq_function(cursor), total)
+        return self._read_with(plan)
+
+    def _doc_freq_function(self, cursor):
+        """Returns doc_freq(term), the number of pages containing term, memoized as described at DOC_FREQ_MAX_AGE."""
+        generation = self._cache_generation()
+        now = time.monotonic()
+        memo = self._doc_freqs
+
+        def doc_freq(term: str) -> int:
+            entry = memo.get(term)
+            if entry is not None and (entry[1] == generation or (entry[0] > 0 and now - entry[2] < self.DOC_FREQ_MAX_AGE)):
+                return entry[0]
+            row = cursor.execute("SELECT doc FROM pages_vocab WHERE term = ?", (term,)).fetchone()
+            docs = row[0] if row else 0
+            if len(memo) >= self.DOC_FREQ_MAX_TERMS:
+                memo.clear()
+            memo[term] = (docs, generation, now)
+            return docs
+        return doc_freq
+
+    def _match_expression(self, query_string: str, raw: bool) -> str | None:
+        """The FTS5 MATCH argument for query_string, or None if no page can match."""
+        if raw:
+            return query_string
+        return self.plan_query(query_string).to_fts()
+
+    def suggest(self, prefix: str, k: int = 10) -> list[str]:
+        """
+        Type-ahead completions for what a user has typed so far, most common first.
+
+        The last word of prefix is completed from the indexed terms, ranked by the number of
+        pages containing them; any words before it are kept as typed ('machine lea' ->
+        'machine learning'). Returns [] if prefix ends in whitespace.
+
+        The vocabulary is loaded into memory on the first call (see suggestions.Suggester)
+        and kept current as described at SUGGEST_MAX_AGE.
+        """
+        head, _, last_word = prefix.rpartition(' ')
+        if not last_word:
             return []
-        finally:
-            if self.conn and original_row_factory is not None: # Ensure connection and original_row_factory exist
-                self.conn.row_factory = original_row_factory # Reset row_factory
+        return [head + ' ' + term if head else term for term, _ in self._suggest_terms(last_word, k)]
+
+    def _suggest_terms(self, term_prefix: str, k: int) -> list[tuple[str, int]]:
+        """(term, document count) pairs for the k most common terms starting with term_prefix."""
+        if not self.conn:
+            self._connect()
+            if not self.conn:
+                print("Reconnect failed. Cannot suggest terms.")
+                return []
+        with self._vocabulary_lock:
+            try:
+                suggester = self._vocabulary_model(
+                    'suggest', lambda: suggestions.Suggester(min_docs=self.SUGGEST_MIN_DOCS))
+            except sqlite3.Error as e:
+                print(f"Error loading suggestions for '{term_prefix}': {e}")
+                return []
+            return suggester.suggest(term_prefix, k)
+
+    def _vocabulary_model(self, name: str, create):
+        """
+        Returns the in-memory vocabulary model stored under name (a suggestions.Suggester or
+        spelling.SpellChecker), building it with create() on first use and keeping it current
+        as described at SUGGEST_MAX_AGE. Call with _vocabulary_lock held; raises sqlite3.Error.
+        """
+        generation = self._cache_generation()
+        model, loaded_generation, loaded_at = self._vocabulary_models.get(name, (None, None, 0.0))
+        if model is None or (generation != loaded_generation and
+                             time.monotonic() - loaded_at >= self.SUGGEST_MAX_AGE):
+            model = create()
+            self._read_with(model.load)
+            self._vocabulary_models[name] = (model, generation, time.monotonic())
+        elif model.has_pending():
+            self._read_with(model.apply_pending)
+        return model
+
+    def correct_query(self, query_string: str) -> str | None:
+        """
+        "Did you mean": query_string with each word no page contains replaced by the closest
+        indexed term (at most spelling.MAX_DISTANCE edits away; the term in most pages wins
+        ties), or None if no word was corrected. Operators, column names, prefixes and words
+        shorter than spelling.MIN_WORD_LENGTH are left alone.
+
+        The vocabulary is loaded into memory on the first call (see spelling.SpellChecker)
+        and kept current as described at SUGGEST_MAX_AGE.
+        """
+        corrections = {word: found[0][0] for word, found in self._spelling_candidates(query_string).items() if found}
+        return spelling.rewrite_query(query_string, corrections) if corrections else None
+
+    def _spelling_candidates(self, query_string: str) -> dict[str, list[tuple[str, int, int]]]:
+        """The words of query_string no page contains, each with its SpellChecker.candidates()."""
+        words = spelling.query_words(query_string)
+        if not words:
+            return {}
+        if not self.conn:
+            self._connect()
+            if not self.conn:
+                print("Reconnect failed. Cannot correct queries.")
+                return {}
+        with self._vocabulary_lock:
+            try:
+                checker = self._vocabulary_model(
+                    'spelling', lambda: spelling.SpellChecker(min_docs=self.SUGGEST_MIN_DOCS))
+                unknown = [word for word in words if not checker.known(word)]
+                if unknown:
+                    # Words in fewer than SUGGEST_MIN_DOCS pages are not in the checker but are not typos either.
+                    unknown = self._read_with(
+                        lambda cursor: [word for word in unknown if self._doc_freq_function(cursor)(word) == 0])
+            except sqlite3.Error as e:
+                print(f"Error loading spelling corrections for '{query_string}': {e}")
+                return {}
+            return {word: checker.candidates(word) for word in unknown}
+
+    def hybrid_search(self, query_string: str, limit: int = 10, columns: tuple[str, ...] = (),
+                      candidates: int = 100, rrf_k: int = 60, autocorrect: bool = False) -> list[SearchResult]:
+        """
+        Combines bm25 and semantic-vector retrieval with reciprocal rank fusion.
+
+        The top candidates of search() and of a brute-force vector search over the
+        memory-mapped page vectors are fused by sum(1 / (rrf_k + position)), so pages found
+        by both rank first and pages sharing no word with the query can still be returned.
+        A result's 'rank' is the negated fused score (lower is better, as in search()).
+        Near-duplicates are not collapsed.
+
+        Without semantic vectors (or numpy) this is search(query_string, limit, columns).
+        autocorrect is as for search().
+        """
+        if autocorrect:
+            query_string = self.correct_query(query_string) or query_string
+        if self._vectors is None:
+            return self.search(query_string, limit, columns)
+        lexical = self.search(query_string, limit=candidates, collapse=False)
+        try:
+            query_vector = vectors.encode_query(query_string, self._read_with(self._idf_function))
+            semantic = self._vectors.top_k(query_vector, candidates)
+        except (sqlite3.Error, OSError, ValueError) as e:
+            print(f"Error in vector search for query '{query_string}': {e}")
+            semantic = []
+
+        scores = {}
+        for ranked_ids in ([res.id for res in lexical], [page_id for page_id, _ in semantic]):
+            for position, page_id in enumerate(ranked_ids):
+                scores[page_id] = scores.get(page_id, 0.0) + 1.0 / (rrf_k + position + 1)
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        if not best:
+            return []
+
+        placeholders = ', '.join('?' * len(best))
+        rows_sql = f"""
+        SELECT m.id, m.url, c.title, c.snippet, c.source_engine, c.crawled_timestamp
+        FROM page_meta m JOIN page_content c ON c.id = m.id
+        WHERE m.id IN ({placeholders})
+        """
+        try:
+            rows = {row[0]: row for row in self._read_rows(rows_sql, tuple(page_id for page_id, _ in best))}
+        except sqlite3.Error as e:
+            print(f"Error reading hybrid results for query '{query_string}': {e}")
+            return []
+        # Ids missing from the index (a stale vector row) are skipped.
+        results = [SearchResult(self, rows[page_id] + (-score,)) for page_id, score in best if page_id in rows]
+        if columns:
+            self.load_columns(results, columns)
+        return results
+
+    def _idf_function(self, cursor):
+        """Returns idf(term) from the FTS5 vocabulary, for vectors.encode_query."""
+        total = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM page_meta").fetchone()[0] # ~ page count, O(1)
+        doc_freq = self._doc_freq_function(cursor)
+
+        def idf(term: str) -> float:
+            docs = doc_freq(term)
+            if docs == 0 or docs >= total: # A word no page contains cannot match, only add noise
+                return 0.0
+            return math.log(1.0 + (total - docs + 0.5) / (docs + 0.5))
+        return idf
+
+    def rebuild_vectors(self, batch_size: int = 1000) -> int:
+        """
+        (Re)computes the semantic vector of every stored page, e.g. after enabling semantic
+        vectors on an existing index. Returns the number of pages encoded, or -1 on error.
+        """
+        if self._vectors is None or self.read_only:
+            print("Semantic vectors are not enabled (or the index is read-only); nothing to rebuild.")
+            return -1
+        if not self.conn:
+            self._connect()
+            if not self.conn:
+                print("Reconnect failed. Cannot rebuild vectors.")
+                return -1
+        encoded = 0
+        last_id = 0
+        try:
+            while True:
+                fields = ('title', 'body', 'snippet', 'llm_summary') # _vector_text() arguments
+                with self._lock:
+                    cursor = self.conn.cursor()
+                    ids = [row[0] for row in cursor.execute(
+                        "SELECT id FROM page_content WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size))]
+                    pages = read_fields(cursor, ids, fields)
+                if not ids:
+                    return encoded
+                texts = [self._vector_text(*(pages[page_id][field] for field in fields)) for page_id in ids]
+                self._vectors.write(ids, vectors.encode_pages(texts))
+                encoded += len(ids)
+                last_id = ids[-1]
+        except (sqlite3.Error, OSError) as e:
+            print(f"Error rebuilding page vectors: {e}")
+            return -1
+
+    def _read_with(self, read):
+        """Calls read(cursor) on the connection reads should use; raises sqlite3.Error."""
+        if self._use_readers:
+            # Pooled read-only connection: does not wait on the writer lock.
+            with self._reader() as conn:
+                return read(conn.cursor())
+        with self._lock:
+            return read(self.conn.cursor())
+
+    def _read_rows(self, sql: str, params: tuple) -> list[tuple]:
+        """Runs a read query and returns its rows as plain tuples."""
+        return self._read_with(lambda cursor: cursor.execute(sql, params).fetchall())
+
+    def maintain(self, merge_pages: int = 500, optimize: bool = False, vacuum: bool = False,
+                 automerge: int | None = None) -> dict:
+        """
+        Defragments the FTS5 index so query latency does not drift upward during long crawls.
+
+        Every commit adds a b-tree segment to the index; FTS5 only merges them lazily.
+        Incremental merges are cheap enough to run from the crawl loop; optimize and
+        vacuum rewrite the whole index/file and are meant for off-hours.
+
+        Args:
+            merge_pages: Work budget for one incremental 'merge' step, in leaf pages written.
+                0 skips the incremental merge.
+            optimize: Merge every segment into one ('optimize'). Cost is proportional to index size.
+            vacuum: Run VACUUM afterwards to return free pages to the filesystem.
+            automerge: If given, persistently set FTS5's 'automerge' threshold (0 disables
+                automatic merging, the FTS5 default is 4).
+
+        Returns:
+            Stats with 'segments_before'/'segments_after', 'levels_after', file
+            'pages_before'/'pages_after', 'seconds' per step that ran, and 'error'
+            (None on success).
+        """
+        stats = {'segments_before': None, 'segments_after': None, 'levels_after': None,
+                 'pages_before': None, 'pages_after': None, 'seconds': {}, 'error': None}
+        if not self.conn:
+            self._connect()
+            if not self.conn:
+                print("Reconnect failed. Cannot maintain index.")
+                stats['error'] = "no database connection"
+                return stats
+
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                stats['segments_before'] = fts_structure(cursor)['segments']
+                stats['pages_before'] = cursor.execute("PRAGMA page_count").fetchone()[0]
+
+                steps = []
+                if automerge is not None:
+                    steps.append(('automerge', "INSERT INTO pages (pages, rank) VALUES ('automerge', ?)", (automerge,)))
+                if merge_pages > 0:
+                    steps.append(('merge', "INSERT INTO pages (pages, rank) VALUES ('merge', ?)", (merge_pages,)))
+                if optimize:
+                    steps.append(('optimize', "INSERT INTO pages (pages) VALUES ('optimize')", ()))
+                for name, sql, params in steps:
+                    started = time.perf_counter()
+                    cursor.execute(sql, params)
+                    self.conn.commit()
+                    stats['seconds'][name] = time.perf_counter() - started
+
+                if vacuum:
+                    started = time.perf_counter()
+                    cursor.execute("VACUUM")
+                    stats['seconds']['vacuum'] = time.perf_counter() - started
+
+                structure = fts_structure(cursor)
+                stats['segments_after'] = structure['segments']
+                stats['levels_after'] = structure['levels']
+                stats['pages_after'] = cursor.execute("PRAGMA page_count").fetchone()[0]
+            except sqlite3.Error as e:
+                print(f"Error maintaining index: {e}")
+                stats['error'] = str(e)
+                try:
+                    self.conn.rollback()
+                except sqlite3.Error as re:
+                    print(f"Error during rollback: {re}")
+        return stats
+
+    def _writer_loop(self):
+        """Write-behind thread: commits whatever has queued up since the last transaction."""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            self._configure_connection(conn)
+        except sqlite3.Error as e:
+            # Refuse further enqueues, but keep draining the queue so flush() and close() return.
+            print(f"Error opening the write-behind connection to {self.db_path}: {e}. Queued documents will not be written.")
+            conn = None
+            self._writer_failed = True
+        stopping = False
+        while not stopping:
+            batch = [self._write_queue.get()]
+            try:
+                while len(batch) < self._write_batch_size:
+                    try:
+                        batch.append(self._write_queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                docs = [doc for doc in batch if doc is not _STOP_WRITER]
+                stopping = len(docs) != len(batch)
+                if docs and conn is None:
+                    self._writer_errors += len(docs)
+                elif docs:
+                    try:
+                        cursor = conn.cursor()
+                        cursor.execute("BEGIN TRANSACTION;")
+                        written = self._write_rows(cursor, docs)
+                        conn.commit()
+                        self._bump_generation()
+                        self._finish_writes(written)
+                    except Exception as e: # Not only SQLite errors: a bad field must not kill the thread
+                        self._writer_errors += len(docs)
+                        print(f"Error writing {len(docs)} queued documents: {e}")
+                        try:
+                            conn.rollback()
+                        except sqlite3.Error as re:
+                            print(f"Error during rollback: {re}")
+            finally:
+                # Always, or flush() and close() would wait on queue.join() forever.
+                for _ in batch:
+                    self._write_queue.task_done()
+        if conn is not None:
+            conn.close()
+
+    def flush(self) -> bool:
+        """
+        Blocks until every document queued so far has been committed (write-behind mode).
+
+        Returns:
+            True if no queued document failed to write since the previous flush, False otherwise.
+            Always True when write-behind mode is off, since writes are already synchronous.
+        """
+        if self._write_queue is None:
+            return True
+        self._write_queue.join()
+        failed, self._writer_errors = self._writer_errors, 0
+        return failed == 0
 
     def close(self):
+        if self._writer_thread is not None:
+            # Drain the queue so no accepted document is lost at shutdown.
+            self._write_queue.put(_STOP_WRITER)
+            self._writer_thread.join()
+            self._writer_thread = None
+            self._write_queue = None
+        with self._reader_lock:
+            idle, self._idle_readers = self._idle_readers, []
+            self._reader_epoch += 1
+        for reader in idle:
+            self._close_reader(reader)
+        self._seen_data_version = None
+        if self._vectors is not None:
+            self._vectors.close()
         if self.conn:
             try:
                 self.conn.close()
@@ -259,7 +1402,7 @@ if __name__ == '__main__':
     indexer.add_document(doc2)
 
     cur = indexer.conn.cursor()
-    cur.execute("SELECT title, source_engine, llm_summary FROM pages WHERE url = ?", (doc1['url'],))
+    cur.execute("SELECT title, source_engine, llm_summary FROM page_content WHERE id = (SELECT id FROM page_meta WHERE url = ?)", (doc1['url'],))
     res = cur.fetchone()
     print(f"\nDoc1 content before update: {res}")
     assert res and res[0] == doc1['title'], f"Doc1 title check failed. Got: {res}"
@@ -269,7 +1412,7 @@ if __name__ == '__main__':
     print("\nAdding doc3 (update for page1)...")
     indexer.add_document(doc3_update_page1)
 
-    cur.execute("SELECT title, source_engine, llm_summary FROM pages WHERE url = ?", (doc1['url'],))
+    cur.execute("SELECT title, source_engine, llm_summary FROM page_content WHERE id = (SELECT id FROM page_meta WHERE url = ?)", (doc1['url'],))
     res_updated = cur.fetchone()
     print(f"\nDoc1 content after update: {res_updated}")
     assert res_updated and res_updated[0] == doc3_update_page1['title'], f"Doc1 updated title check failed. Got: {res_updated}"
@@ -299,12 +1442,12 @@ if __name__ == '__main__':
     print(f"Batch add: {num_added} documents successfully processed for insertion.")
     assert num_added == 2, f"Batch add count mismatch. Expected 2, got {num_added}"
 
-    cur.execute("SELECT COUNT(*) FROM pages")
+    cur.execute("SELECT COUNT(*) FROM page_content")
     total_docs = cur.fetchone()[0]
     print(f"Total documents in index: {total_docs}")
     assert total_docs == 3, f"Total documents mismatch. Expected 3, got {total_docs}" # doc1 (updated), doc2 (updated), doc4
 
-    cur.execute("SELECT title, source_engine, llm_summary FROM pages WHERE url = ?", (doc5_update_page2['url'],))
+    cur.execute("SELECT title, source_engine, llm_summary FROM page_content WHERE id = (SELECT id FROM page_meta WHERE url = ?)", (doc5_update_page2['url'],))
     res_batch_updated = cur.fetchone()
     print(f"Doc2 content after batch update: {res_batch_updated}")
     assert res_batch_updated and res_batch_updated[0] == doc5_update_page2['title'], f"Doc2 batch updated title check failed. Got {res_batch_updated}"
@@ -0,0 +1,295 @@
+"""
+Turns user input into a safe FTS5 MATCH expression.
+
+Raw input is never handed to FTS5: a stray quote, hyphen or colon is an FTS5
+syntax error, and some valid expressions (huge OR lists, one-letter prefixes)
+are slow. parse_query() reads a small, forgiving syntax and never fails:
+
+    apples pears          both words (implicit AND)
+    "apple pie"           phrase
+    pyth*                 prefix (at least MIN_PREFIX characters)
+    title:apples          column filter (also title:"apple pie"); see COLUMN_ALIASES
+    apples OR pears       alternatives (OR binds tighter than the implicit AND:
+                          'red apples OR pears' is red AND (apples OR pears))
+    -pears, NOT pears     exclusion
+    NEAR(apple pie, 5)    words within 5 tokens of each other
+
+Words are split with the tokenizer rules of suggest.tokenize (unicode61 with
+remove_diacritics 2), so 'e-mail' becomes the phrase "e mail", exactly what
+FTS5 indexed. Anything else is treated as a word separator. Input beyond the
+MAX_* limits is dropped.
+
+plan_query() then uses document frequencies from the FTS5 vocabulary to skip
+the query entirely when a required word occurs nowhere, drop alternatives and
+exclusions that occur nowhere, drop very common words from larger queries, and
+put the rarest required word first.
+"""
+import re
+
+from .storage import FTS_COLUMNS
+from .suggest import tokenize
+
+MAX_QUERY_CHARS = 512
+# Total words (phrase words included) kept from one query.
+MAX_TERMS = 32
+MAX_OR_TERMS = 16
+MAX_PHRASE_TERMS = 16
+MIN_PREFIX = 2
+MAX_NEAR_DISTANCE = 100
+DEFAULT_NEAR_DISTANCE = 10
+# Required words found in more than this share of pages are dropped (if other words remain)...
+COMMON_TERM_FRACTION = 0.5
+# ...once the index has at least this many pages; small indexes keep every word.
+MIN_PAGES_FOR_PRUNING = 1000
+
+COLUMN_ALIASES = {column: column for column in FTS_COLUMNS}
+COLUMN_ALIASES.update({'summary': 'llm_summary', 'source': 'source_engine'})
+
+_LEXER_RE = re.compile(r'''
+      (?P<near>\bNEAR\s*\()
+    | (?P<close>\))
+    | (?P<phrase>"[^"]*"?)
+    | (?P<column>[^\W\d]\w*):(?=["\w])
+    | (?P<op>\b(?:OR|AND|NOT)\b)
+    | (?P<minus>(?<![\w*])-(?=["\w]))
+    | (?P<number>(?<=,)\s*\d+)
+    | (?P<word>[\w-]+\*?)
+    ''', re.VERBOSE)
+
+
+class Term:
+    """A word, a phrase (several words) or a prefix, optionally restricted to one column."""
+    __slots__ = ('words', 'prefix', 'column')
+
+    def __init__(self, words: list[str], prefix: bool = False, column: str | None = None):
+        self.words = words
+        self.prefix = prefix
+        self.column = column
+
+    def to_fts(self) -> str:
+        # Words only contain letters and digits, so quoting needs no escaping.
+        text = '"' + ' '.join(self.words) + '"' + (' *' if self.prefix else '')
+        return f"{self.column} : {text}" if self.column else text
+
+    def __repr__(self):
+        return f"Term({self.to_fts()})"
+
+
+class Near:
+    __slots__ = ('terms', 'distance')
+
+    def __init__(self, terms: list[Term], distance: int = DEFAULT_NEAR_DISTANCE):
+        self.terms = terms
+        self.distance = distance
+
+    def to_fts(self) -> str:
+        return f"NEAR({' '.join(term.to_fts() for term in self.terms)}, {self.distance})"
+
+    def __repr__(self):
+        return f"Near({self.to_fts()})"
+
+
+class Clause:
+    """One AND-ed part of a query: a single item or alternatives joined by OR, possibly excluded."""
+    __slots__ = ('items', 'negated')
+
+    def __init__(self, items: list, negated: bool = False):
+        self.items = items
+        self.negated = negated
+
+    def to_fts(self) -> str:
+        if len(self.items) == 1:
+            return self.items[0].to_fts()
+        return '(' + ' OR '.join(item.to_fts() for item in self.items) + ')'
+
+
+class Query:
+    """A parsed query: clauses that must all match, minus the negated ones."""
+
+    def __init__(self, clauses: list[Clause], notes: list[str] | None = None):
+        self.clauses = clauses
+        # Human-readable remarks on anything the parser or planner changed.
+        self.notes = notes if notes is not None else []
+
+    @property
+    def required(self) -> list[Clause]:
+        return [clause for clause in self.clauses if not clause.negated]
+
+    @property
+    def excluded(self) -> list[Clause]:
+        return [clause for clause in self.clauses if clause.negated]
+
+    def to_fts(self) -> str | None:
+        """The FTS5 MATCH expression, or None if nothing can match (e.g. only exclusions)."""
+        required = self.required
+        if not required:
+            return None
+        expression = ' AND '.join(clause.to_fts() for clause in required)
+        excluded = self.excluded
+        if excluded:
+            expression = f"({expression}) NOT ({' OR '.join(clause.to_fts() for clause in excluded)})"
+        return expression
+
+    def words(self) -> list[str]:
+        """Every word of the query, in order."""
+        found = []
+        for clause in self.clauses:
+            for item in clause.items:
+                for term in (item.terms if isinstance(item, Near) else [item]):
+                    found.extend(term.words)
+        return found
+
+
+def _word_terms(raw: str, column: str | None) -> list[Term]:
+    """Terms for one input word: 'e-mail' -> phrase "e mail", 'pyth*' -> prefix."""
+    prefix = raw.endswith('*')
+    words = tokenize(raw.rstrip('*'))
+    if not words:
+        return []
+    prefix = prefix and len(words[-1]) >= MIN_PREFIX
+    return [Term(words, prefix=prefix, column=column)]
+
+
+def parse_query(text: str) -> Query:
+    """Parses user input (see the module docstring). Never raises; unusable input gives an empty Query."""
+    notes = []
+    if len(text) > MAX_QUERY_CHARS:
+        text = text[:MAX_QUERY_CHARS]
+        notes.append(f"query truncated to {MAX_QUERY_CHARS} characters")
+
+    clauses = []
+    negate_next = False
+    or_next = False
+    column = None
+    near = None # Terms collected inside NEAR( ... )
+    near_distance = DEFAULT_NEAR_DISTANCE
+    term_count = 0
+
+    def add(item, words: int):
+        nonlocal negate_next, or_next, column, term_count
+        if term_count + words > MAX_TERMS:
+            if not notes or not notes[-1].startswith("only the first"):
+                notes.append(f"only the first {MAX_TERMS} words are used")
+            return
+        term_count += words
+        if or_next and clauses and not clauses[-1].negated and not negate_next:
+            if len(clauses[-1].items) < MAX_OR_TERMS:
+                clauses[-1].items.append(item)
+            elif not any(note.startswith("OR list") for note in notes):
+                notes.append(f"OR list capped at {MAX_OR_TERMS} alternatives")
+        else:
+            clauses.append(Clause([item], negated=negate_next))
+        negate_next = or_next = False
+        column = None
+
+    for match in _LEXER_RE.finditer(text):
+        kind, value = match.lastgroup, match.group()
+        if near is not None:
+            if kind == 'close':
+                if len(near) >= 2:
+                    add(Near(near, near_distance), sum(len(term.words) for term in near))
+                elif near:
+                    add(near[0], len(near[0].words))
+                near = None
+            elif kind == 'number':
+                near_distance = min(int(value), MAX_NEAR_DISTANCE)
+            elif kind in ('word', 'phrase'):
+                words = tokenize(value) if kind == 'phrase' else [w for t in _word_terms(value, None) for w in t.words]
+                if words:
+                    near.append(Term(words[:MAX_PHRASE_TERMS]))
+            continue
+
+        if kind == 'near':
+            if column is not None:
+                notes.append(f"column filter {column}: ignored before NEAR(...)")
+                column = None
+            near, near_distance = [], DEFAULT_NEAR_DISTANCE
+        elif kind == 'op':
+            if value == 'OR':
+                or_next = bool(clauses)
+            elif value == 'NOT':
+                negate_next = True
+        elif kind == 'minus':
+            negate_next = True
+        elif kind == 'column':
+            name = match.group('column')
+            column = COLUMN_ALIASES.get(name.lower())
+            if column is None: # Not a column: 'foo:bar' is two words
+                for term in _word_terms(name, None):
+                    add(term, len(term.words))
+        elif kind == 'phrase':
+            words = tokenize(value)
+            if len(words) > MAX_PHRASE_TERMS:
+                words = words[:MAX_PHRASE_TERMS]
+                notes.append(f"phrase shortened to {MAX_PHRASE_TERMS} words")
+            if words:
+                add(Term(words, column=column), len(words))
+        elif kind in ('word', 'number'):
+            for term in _word_terms(value, column):
+                add(term, len(term.words))
+    if near: # Unterminated NEAR(
+        add(Near(near, near_distance) if len(near) >= 2 else near[0], sum(len(term.words) for term in near))
+
+    query = Query(clauses, notes)
+    if query.clauses and not query.required:
+        notes.append("a query of only exclusions matches nothing")
+    return query
+
+
+def plan_query(query: Query, doc_freq, total_pages: int) -> Query:
+    """
+    Prunes and reorders a parsed query using document frequencies.
+
+    Args:
+        query: From parse_query().
+        doc_freq: doc_freq(word) -> number of pages containing word (fts5vocab 'doc').
+        total_pages: Number of pages in the index.
+
+    Returns:
+        A new Query; its to_fts() is None if the query cannot match anything.
+    """
+    notes = list(query.notes)
+    cache = {}
+
+    def frequency(word: str) -> int:
+        if word not in cache:
+            cache[word] = doc_freq(word)
+        return cache[word]
+
+    def estimate(item) -> int:
+        """Upper bound on the pages matching item (prefixes are not estimated)."""
+        terms = item.terms if isinstance(item, Near) else [item]
+        bound = total_pages
+        for term in terms:
+            exact = term.words[:-1] if term.prefix else term.words
+            for word in exact:
+                bound = min(bound, frequency(word))
+        return bound
+
+    required, excluded = [], []
+    for clause in query.clauses:
+        estimates = [(estimate(item), item) for item in clause.items]
+        kept = [(docs, item) for docs, item in estimates if docs > 0]
+        if clause.negated:
+            if kept:
+                excluded.append(Clause([item for _, item in kept], negated=True))
+            continue
+        if not kept:
+            notes.append(f"no page contains {clause.to_fts()}")
+            return Query([], notes)
+        if len(kept) < len(estimates):
+            notes.append(f"dropped alternatives found in no page from {clause.to_fts()}")
+        required.append((sum(docs for docs, _ in kept), Clause([item for _, item in kept])))
+
+    if total_pages >= MIN_PAGES_FOR_PRUNING and len(required) > 1:
+        common = [(docs, clause) for docs, clause in required
+                  if docs > COMMON_TERM_FRACTION * total_pages and len(clause.items) == 1
+                  and isinstance(clause.items[0], Term) and not clause.items[0].column]
+        if len(common) < len(required):
+            for entry in common:
+                required.remove(entry)
+                notes.append(f"dropped very common word {entry[1].to_fts()}")
+
+    # FTS5 intersects doclists in step; starting from the shortest lets it skip the most.
+    required.sort(key=lambda entry: entry[0])
+    return Query([clause for _, clause in required] + excluded, notes)
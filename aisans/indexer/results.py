@@ -0,0 +1,93 @@
+_UNLOADED = object() # Marks a lazy column that has not been fetched yet
+
+
+class SearchResult:
+    """
+    One search hit.
+
+    A __slots__ object built straight from the result tuple, so a hit costs one small
+    object instead of a sqlite3.Row plus a dict. It still reads like the dicts search()
+    used to return: res['title'], res.get('snippet'), res.keys() and dict(res) all work.
+
+    Large columns (llm_summary, body) are not part of the search query. They are fetched
+    from the index the first time they are read, or for a whole page of hits at once with
+    Indexer.load_columns(). 'body' is available on request but is not one of keys().
+    """
+    __slots__ = ('id', 'url', 'title', 'snippet', 'source_engine', 'crawled_timestamp', 'rank',
+                 '_source', '_llm_summary', '_body')
+
+    FIELDS = ('url', 'title', 'snippet', 'llm_summary', 'source_engine', 'crawled_timestamp', 'rank')
+    LAZY_FIELDS = ('llm_summary', 'body')
+    # Column order of the row tuple passed to __init__.
+    ROW_FIELDS = ('id', 'url', 'title', 'snippet', 'source_engine', 'crawled_timestamp', 'rank')
+
+    def __init__(self, source, row: tuple):
+        """
+        Args:
+            source: The Indexer the hit came from; lazy columns are loaded through it.
+            row: (id, url, title, snippet, source_engine, crawled_timestamp, rank).
+        """
+        self.id, self.url, self.title, self.snippet, self.source_engine, self.crawled_timestamp, self.rank = row
+        self._source = source
+        self._llm_summary = _UNLOADED
+        self._body = _UNLOADED
+
+    def is_loaded(self, field: str) -> bool:
+        return getattr(self, '_' + field) is not _UNLOADED
+
+    def _lazy(self, field: str):
+        if getattr(self, '_' + field) is _UNLOADED and self._source is not None:
+            self._source.load_columns([self], (field,))
+        value = getattr(self, '_' + field)
+        return None if value is _UNLOADED else value
+
+    @property
+    def llm_summary(self):
+        return self._lazy('llm_summary')
+
+    @llm_summary.setter
+    def llm_summary(self, value):
+        self._llm_summary = value
+
+    @property
+    def body(self):
+        return self._lazy('body')
+
+    @body.setter
+    def body(self, value):
+        self._body = value
+
+    def __getitem__(self, key):
+        if key in self.FIELDS or key == 'body':
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.FIELDS or key == 'body':
+            setattr(self, key, value)
+        else:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self.FIELDS)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return f"SearchResult(url={self.url!r}, title={self.title!r}, rank={self.rank!r})"
@@ -0,0 +1,215 @@
+import hashlib
+import heapq
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from . import spelling
+from .indexer import Indexer
+from .results import SearchResult
+
+
+def shard_paths(db_path: str, num_shards: int) -> list[str]:
+    """Returns the per-shard database paths, e.g. aisans_index.db -> aisans_index.shard0.db, ..."""
+    root, ext = os.path.splitext(db_path)
+    return [f"{root}.shard{i}{ext or '.db'}" for i in range(num_shards)]
+
+
+class ShardedIndexer:
+    """
+    Spreads the index over N SQLite files, routed by a stable hash of the URL.
+
+    Offers the same add_document/add_batch/search contract as Indexer, so callers can
+    switch between the two with a config value. Each shard is an ordinary Indexer and
+    every keyword argument is passed through to them (write_behind, wal, cache_size, ...).
+
+    search() queries all shards in parallel and merges their partial top-k lists by
+    bm25 rank. bm25 uses per-shard document frequencies; with hash routing every shard
+    holds a random sample of the corpus, so the merged order closely tracks the order
+    a single index would produce.
+
+    The shard count must stay the same for the lifetime of an index: changing it
+    re-routes URLs to different files. Near-duplicate detection runs per shard, so
+    copies of a page stored under URLs on different shards are not clustered.
+    """
+    def __init__(self, db_path=None, num_shards: int = 4, max_workers: int | None = None, **indexer_kwargs):
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1.")
+        base_path = db_path if db_path is not None else os.getenv('AISANS_DB_PATH', 'aisans_index.db')
+        self.db_path = base_path
+        self.num_shards = num_shards
+        self.shards = [Indexer(db_path=path, **indexer_kwargs) for path in shard_paths(base_path, num_shards)]
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or num_shards, thread_name_prefix="aisans-shard")
+
+    @property
+    def conn(self):
+        """The first shard's connection if every shard connected, else None (mirrors Indexer.conn checks)."""
+        if all(shard.conn for shard in self.shards):
+            return self.shards[0].conn
+        return None
+
+    @property
+    def writes_avoided(self) -> int:
+        """Total of Indexer.writes_avoided over the shards."""
+        return sum(shard.writes_avoided for shard in self.shards)
+
+    @property
+    def near_duplicates_found(self) -> int:
+        """Total of Indexer.near_duplicates_found over the shards."""
+        return sum(shard.near_duplicates_found for shard in self.shards)
+
+    def shard_for(self, url: str) -> int:
+        """Stable across processes and Python versions, unlike the built-in hash()."""
+        digest = hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big') % self.num_shards
+
+    def _route(self, url: str) -> Indexer:
+        return self.shards[self.shard_for(url)]
+
+    def add_document(self, doc_data: dict):
+        if not isinstance(doc_data.get('url'), str):
+            print(f"Document data is missing one or more required fields ({Indexer.REQUIRED_FIELDS}) "
+                  f"or has no string url: {doc_data.get('url', 'N/A')}")
+            return False
+        return self._route(doc_data['url']).add_document(doc_data)
+
+    def add_batch(self, documents: list[dict]):
+        per_shard = [[] for _ in self.shards]
+        for doc in documents:
+            if not isinstance(doc.get('url'), str):
+                print(f"Skipping document in batch due to missing fields or no string url (URL: {doc.get('url', 'N/A')})")
+                continue
+            per_shard[self.shard_for(doc['url'])].append(doc)
+        futures = [self._executor.submit(shard.add_batch, docs)
+                   for shard, docs in zip(self.shards, per_shard) if docs]
+        return sum(future.result() for future in futures)
+
+    def delete_document(self, url: str) -> bool:
+        return self._route(url).delete_document(url)
+
+    def get_document(self, url: str) -> dict | None:
+        return self._route(url).get_document(url)
+
+    def search(self, query_string: str, limit: int = 10, columns: tuple[str, ...] = (),
+               collapse: bool = True, autocorrect: bool = False, **filters) -> list[SearchResult]:
+        """
+        Runs search on every shard in parallel and merges the results into a global top-limit.
+
+        filters (since, until, sources, hosts, raw) are passed through to Indexer.search.
+        autocorrect uses correct_query(), so every shard searches for the same words.
+        """
+        if autocorrect and not filters.get('raw'):
+            query_string = self.correct_query(query_string) or query_string
+        futures = [self._executor.submit(shard.search, query_string, limit, collapse=collapse, **filters)
+                   for shard in self.shards]
+        partials = [future.result() for future in futures]
+        # Each partial list is already sorted by rank (lower is better).
+        results = list(itertools.islice(heapq.merge(*partials, key=lambda res: res.rank), limit))
+        if columns:
+            # Only for the hits that made the global top-k.
+            self.load_columns(results, columns)
+        return results
+
+    def hybrid_search(self, query_string: str, limit: int = 10, columns: tuple[str, ...] = (),
+                      autocorrect: bool = False, **kwargs) -> list[SearchResult]:
+        """
+        Runs Indexer.hybrid_search on every shard in parallel and merges by fused score.
+
+        Each shard fuses its own bm25 and vector candidates; the reciprocal-rank scores use the
+        same formula everywhere, so the per-shard lists are merged like search() results.
+        """
+        if autocorrect:
+            query_string = self.correct_query(query_string) or query_string
+        futures = [self._executor.submit(shard.hybrid_search, query_string, limit, **kwargs)
+                   for shard in self.shards]
+        partials = [future.result() for future in futures]
+        results = list(itertools.islice(heapq.merge(*partials, key=lambda res: res.rank), limit))
+        if columns:
+            self.load_columns(results, columns)
+        return results
+
+    def suggest(self, prefix: str, k: int = 10) -> list[str]:
+        """
+        Indexer.suggest over all shards: document counts of each term are summed across shards.
+
+        Each shard contributes its own top 2*k, so a term that is common overall but never in
+        a shard's top list can be missed; with URL-hash routing shards see similar vocabularies.
+        """
+        head, _, last_word = prefix.rpartition(' ')
+        if not last_word:
+            return []
+        futures = [self._executor.submit(shard._suggest_terms, last_word, 2 * k) for shard in self.shards]
+        totals = {}
+        for future in futures:
+            for term, docs in future.result():
+                totals[term] = totals.get(term, 0) + docs
+        best = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [head + ' ' + term if head else term for term, _ in best]
+
+    def correct_query(self, query_string: str) -> str | None:
+        """
+        Indexer.correct_query over all shards: a word is corrected only if no shard has it, to
+        the closest candidate of any shard, with document counts summed across shards on ties.
+        """
+        futures = [self._executor.submit(shard._spelling_candidates, query_string) for shard in self.shards]
+        per_shard = [future.result() for future in futures]
+        corrections = {}
+        for word in per_shard[0]:
+            if not all(word in candidates for candidates in per_shard[1:]):
+                continue # Found in some shard
+            found = [item for candidates in per_shard for item in candidates[word]]
+            if not found:
+                continue
+            best = min(distance for _, distance, _ in found)
+            totals = {}
+            for term, distance, docs in found:
+                if distance == best:
+                    totals[term] = totals.get(term, 0) + docs
+            corrections[word] = min(totals.items(), key=lambda item: (-item[1], item[0]))[0]
+        return spelling.rewrite_query(query_string, corrections) if corrections else None
+
+    def load_columns(self, results: list[SearchResult], columns: tuple[str, ...] = ('llm_summary',)) -> None:
+        """Loads lazy columns with one query per shard that contributed results."""
+        by_shard = {}
+        for res in results:
+            by_shard.setdefault(id(res._source), (res._source, []))[1].append(res)
+        for shard, shard_results in by_shard.values():
+            shard.load_columns(shard_results, columns)
+
+    def maintain(self, **kwargs) -> dict:
+        """
+        Runs Indexer.maintain on every shard.
+
+        Returns the same keys as Indexer.maintain, totalled over the shards (levels_after
+        is the deepest shard, seconds are summed per step), plus 'shards' with the
+        per-shard stats. 'error' is the first shard error, or None.
+        """
+        shard_stats = [shard.maintain(**kwargs) for shard in self.shards]
+        totals = {'segments_before': None, 'segments_after': None, 'levels_after': None,
+                  'pages_before': None, 'pages_after': None, 'seconds': {}, 'error': None,
+                  'shards': shard_stats}
+        for stats in shard_stats:
+            for key in ('segments_before', 'segments_after', 'pages_before', 'pages_after'):
+                if stats[key] is not None:
+                    totals[key] = (totals[key] or 0) + stats[key]
+            if stats['levels_after'] is not None:
+                totals['levels_after'] = max(totals['levels_after'] or 0, stats['levels_after'])
+            for step, seconds in stats['seconds'].items():
+                totals['seconds'][step] = totals['seconds'].get(step, 0.0) + seconds
+            if totals['error'] is None:
+                totals['error'] = stats['error']
+        return totals
+
+    def flush(self) -> bool:
+        return all([shard.flush() for shard in self.shards])
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,75 @@
+"""
+SimHash fingerprints for near-duplicate detection.
+
+A page body is reduced to a 64-bit fingerprint such that similar texts get
+fingerprints that differ in only a few bits. To find every stored fingerprint
+within MAX_DISTANCE bits without scanning, the fingerprint is cut into BANDS
+equal bands: two fingerprints that differ in at most BANDS - 1 bits agree
+exactly on at least one band (pigeonhole), so an exact lookup per band finds
+all candidates. The tables live in storage.py.
+"""
+import hashlib
+import re
+
+FINGERPRINT_BITS = 64
+BANDS = 4
+BAND_BITS = FINGERPRINT_BITS // BANDS
+# Largest Hamming distance still treated as a near-duplicate; must stay below BANDS.
+MAX_DISTANCE = 3
+SHINGLE_SIZE = 3
+# Shorter bodies are not fingerprinted: with a handful of shingles, unrelated
+# texts collide too easily for the result to mean anything.
+MIN_SHINGLES = 16
+
+_WORD_RE = re.compile(r"\w+")
+# _BIT_TABLES[bit] maps a byte to its bit-th most significant bit, for bytes.translate.
+_BIT_TABLES = [bytes((byte >> (7 - bit)) & 1 for byte in range(256)) for bit in range(8)]
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> list[str]:
+    """Overlapping word n-grams of the lower-cased text."""
+    words = _WORD_RE.findall(text.lower())
+    return [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def fingerprint(text: str | None) -> int | None:
+    """
+    Returns the 64-bit SimHash of text, or None if it is too short to fingerprint.
+
+    Each shingle is hashed to 64 bits and every bit position takes the majority
+    vote. The votes are counted per byte column of the concatenated digests with
+    bytes.translate/count, so the per-shingle work stays in C.
+    """
+    if not text:
+        return None
+    features = shingles(text)
+    if len(features) < MIN_SHINGLES:
+        return None
+    digests = b''.join(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest() for feature in features)
+    half = len(features) / 2
+    value = 0
+    for column in range(8):
+        column_bytes = digests[column::8]
+        for table in _BIT_TABLES:
+            value = (value << 1) | (column_bytes.translate(table).count(1) > half)
+    return value
+
+
+def distance(a: int, b: int) -> int:
+    """Hamming distance between two fingerprints."""
+    return (a ^ b).bit_count()
+
+
+def band_keys(value: int) -> list[int]:
+    """One lookup key per band: the band number in the high bits, the band's value below it."""
+    mask = (1 << BAND_BITS) - 1
+    return [(band << BAND_BITS) | ((value >> (band * BAND_BITS)) & mask) for band in range(BANDS)]
+
+
+def to_sqlite(value: int) -> int:
+    """SQLite integers are signed 64-bit; store fingerprints in two's complement."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def from_sqlite(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
@@ -0,0 +1,226 @@
+"""
+Spelling correction of query words from the FTS5 vocabulary.
+
+SpellChecker implements symmetric delete spelling correction (SymSpell): every
+indexed term is stored under each string obtained by deleting up to
+max_distance characters from its first prefix_length characters. A query word
+generates its own deletes the same way, and any term sharing one of them is a
+candidate; only those few candidates get a real edit distance computed
+(Damerau-Levenshtein, adjacent transpositions counting as one edit). The
+closest candidates win, ties going to the term found in the most pages.
+
+As with suggest.Suggester, terms come from the fts5vocab table 'pages_vocab'
+with their document counts, and after local writes only the terms of the
+written pages are re-read (note_terms/apply_pending).
+"""
+import re
+import threading
+
+from .suggest import fold
+
+MAX_DISTANCE = 2
+# Deletes are only generated from this many leading characters; longer words are still
+# compared in full. Keeps the index at ~30 entries per term for max_distance 2.
+PREFIX_LENGTH = 7
+# Shorter query words are never corrected: nearly every short string is close to some term.
+MIN_WORD_LENGTH = 4
+
+# Words of a query as written, with what follows them ('*' prefix, ':' column filter).
+_QUERY_WORD_RE = re.compile(r"[^\W_]+(?P<suffix>[*:]?)")
+_OPERATORS = frozenset(('OR', 'AND', 'NOT', 'NEAR'))
+
+
+def damerau_levenshtein(a: str, b: str, limit: int) -> int:
+    """Edit distance between a and b with adjacent transpositions, or limit + 1 if it exceeds limit."""
+    # A common prefix and suffix do not change the distance; typos leave most of a word intact.
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    a_end, b_end = len(a), len(b)
+    while a_end > start and b_end > start and a[a_end - 1] == b[b_end - 1]:
+        a_end -= 1
+        b_end -= 1
+    a, b = a[start:a_end], b[start:b_end]
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if not a or not b:
+        return len(a) or len(b)
+
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, char_b in enumerate(b, 1):
+            value = previous[j - 1] + (char_a != char_b)
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if (before_previous is not None and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b
+                    and before_previous[j - 2] + 1 < value):
+                value = before_previous[j - 2] + 1
+            current.append(value)
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+
+def query_words(text: str) -> list[str]:
+    """
+    The folded words of a user query that spelling correction applies to: not operators,
+    column names or prefixes ('pyth*'), and at least MIN_WORD_LENGTH letters without digits.
+    """
+    words = []
+    for match in _QUERY_WORD_RE.finditer(text):
+        word = match.group()[:match.start('suffix') - match.start()]
+        if match.group('suffix') or word in _OPERATORS:
+            continue
+        word = fold(word)
+        if len(word) >= MIN_WORD_LENGTH and word.isalpha() and word not in words:
+            words.append(word)
+    return words
+
+
+def rewrite_query(text: str, corrections: dict[str, str]) -> str | None:
+    """Replaces the query words (see query_words) found in corrections; None if nothing changed."""
+    changed = False
+
+    def replace(match):
+        nonlocal changed
+        word = match.group()[:match.start('suffix') - match.start()]
+        correction = None if match.group('suffix') or word in _OPERATORS else corrections.get(fold(word))
+        if correction is None:
+            return match.group()
+        changed = True
+        return correction + match.group('suffix')
+
+    rewritten = _QUERY_WORD_RE.sub(replace, text)
+    return rewritten if changed else None
+
+
+class SpellChecker:
+    def __init__(self, min_docs: int = 2, max_distance: int = MAX_DISTANCE, prefix_length: int = PREFIX_LENGTH):
+        """
+        Args:
+            min_docs: Terms found in fewer pages are never offered as corrections.
+            max_distance: Largest edit distance corrected.
+            prefix_length: See PREFIX_LENGTH.
+        """
+        self.min_docs = min_docs
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self._docs = {} # Term -> document count (0 once it fell below min_docs)
+        # Delete string -> term, or list of terms once several share it (saves a list per entry).
+        self._deletes = {}
+        self._pending = set()
+        # note_terms() is called by writers while correct() may be running.
+        self._pending_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def load(self, cursor):
+        """Reads the whole vocabulary, replacing whatever was loaded before."""
+        self._docs = {}
+        self._deletes = {}
+        for term, docs in cursor.execute("SELECT term, doc FROM pages_vocab WHERE doc >= ?", (self.min_docs,)):
+            if term.isalpha():
+                self._add(term, docs)
+
+    def note_terms(self, new_terms: set[str]):
+        """Records terms whose document counts may have changed, for the next apply_pending()."""
+        with self._pending_lock:
+            self._pending |= new_terms
+
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def apply_pending(self, cursor):
+        """Re-reads the document counts of the terms passed to note_terms since the last call."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, set()
+        for term in sorted(pending):
+            if not term.isalpha():
+                continue
+            # fts5vocab answers term = ? with an index lookup, but scans the whole vocabulary for IN lists.
+            row = cursor.execute("SELECT doc FROM pages_vocab WHERE term = ?", (term,)).fetchone()
+            docs = row[0] if row else 0
+            if term in self._docs:
+                self._docs[term] = docs if docs >= self.min_docs else 0
+            elif docs >= self.min_docs:
+                self._add(term, docs)
+
+    def _add(self, term: str, docs: int):
+        self._docs[term] = docs
+        deletes = self._deletes
+        for delete in self._edits(term[:self.prefix_length]):
+            entry = deletes.get(delete)
+            if entry is None:
+                deletes[delete] = term
+            elif entry.__class__ is str:
+                deletes[delete] = [entry, term]
+            else:
+                entry.append(term)
+
+    def _edits(self, word: str) -> set[str]:
+        """word and every string made by deleting up to max_distance of its characters."""
+        edits = set()
+        for level in self._edit_levels(word):
+            edits.update(level)
+        return edits
+
+    def _edit_levels(self, word: str):
+        """Yields the strings made by deleting 0, 1, ... max_distance characters of word, one set per count."""
+        level = {word}
+        yield level
+        for _ in range(self.max_distance):
+            level = {current[:i] + current[i + 1:] for current in level for i in range(len(current))}
+            if not level:
+                return
+            yield level
+
+    def known(self, word: str) -> bool:
+        """Whether word is a term found in at least min_docs pages."""
+        return self._docs.get(word, 0) > 0
+
+    def candidates(self, word: str) -> list[tuple[str, int, int]]:
+        """
+        The closest terms to word (already folded) within max_distance, as (term, distance,
+        document count) tuples, most common first. [] if none is close enough.
+        """
+        best = self.max_distance
+        found = []
+        seen = set()
+        for deleted, level in enumerate(self._edit_levels(word[:self.prefix_length])):
+            # A term found through n deletes from word is at least n edits away.
+            if deleted > best:
+                break
+            for delete in level:
+                entry = self._deletes.get(delete)
+                if entry is None:
+                    continue
+                for term in ((entry,) if entry.__class__ is str else entry):
+                    if term in seen:
+                        continue
+                    seen.add(term)
+                    docs = self._docs[term]
+                    if docs == 0 or abs(len(term) - len(word)) > best:
+                        continue
+                    distance = damerau_levenshtein(word, term, best)
+                    if distance > best:
+                        continue
+                    if distance < best:
+                        best = distance
+                        found = []
+                    found.append((term, distance, docs))
+        found.sort(key=lambda item: (-item[2], item[0]))
+        return found
+
+    def correct(self, word: str) -> str | None:
+        """The best correction of an unknown word, or None."""
+        found = self.candidates(word)
+        return found[0][0] if found else None
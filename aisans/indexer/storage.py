@@ -0,0 +1,549 @@
+"""
+On-disk layout of the AISANS index: table definitions, migrations and the
+low-level row reads/writes shared by Indexer and the maintenance scripts.
+
+Layout (SCHEMA_VERSION 7):
+    page_meta     url -> id mapping (unique B-tree index on url), content hash, and the
+                  typed filter columns crawled_at/source/host (each B-tree indexed).
+    page_content  stored fields, keyed by the same id; body is compressed.
+    pages         contentless FTS5 index over FTS_COLUMNS, rowid = id, with prefix indexes.
+    pages_vocab   fts5vocab view of the terms in pages and their document counts.
+    page_simhash  SimHash fingerprint of each body and the near-duplicate cluster it joined.
+    simhash_bands one row per fingerprint band, for exact-match candidate lookup (see simhash.py).
+
+'pages' keeps no copy of the text it indexes. Removing a row from a contentless
+FTS5 table means replaying the exact values that were indexed through the
+'delete' command, which is why every write goes through write_pages/remove_pages.
+"""
+import hashlib
+import math
+import zlib
+from datetime import date, datetime, timezone
+from urllib.parse import urlsplit
+
+from . import simhash
+
+try:
+    import zstandard
+except ImportError: # Optional dependency; bodies fall back to zlib.
+    zstandard = None
+
+# Bumped whenever the on-disk layout changes; stored in PRAGMA user_version.
+# 0/1: original layout, a single FTS5 'pages' table holding every column.
+# 2: adds 'page_meta', a rowid table with a unique index on url.
+# 3: stored fields move to 'page_content' (body compressed); 'pages' becomes a
+#    contentless FTS5 index and no longer tokenizes snippet or crawled_timestamp.
+# 4: adds page_meta.content_hash, so unchanged recrawls can skip re-indexing.
+# 5: adds page_simhash and simhash_bands. Existing pages are fingerprinted on their next write.
+# 6: adds page_meta.crawled_at (epoch seconds), source and host, backfilled from page_content.
+# 7: rebuilds 'pages' with prefix indexes (FTS_PREFIX) and adds the 'pages_vocab' table.
+SCHEMA_VERSION = 7
+
+# Tokenizer: unicode61 remove_diacritics 2 (removes diacritics for better matching)
+# remove_diacritics 0=off, 1=on (default, some issues), 2=on (better for all latin chars)
+FTS_TOKENIZE = "unicode61 remove_diacritics 2"
+
+# Columns tokenized into the FTS5 index. snippet is just the start of body and
+# crawled_timestamp is not prose, so neither is indexed; both are still stored.
+FTS_COLUMNS = ('title', 'body', 'llm_summary', 'source_engine')
+
+# Prefix lengths FTS5 keeps extra index entries for, so short prefix queries ('py*')
+# read one index entry instead of merging the doclists of every matching term.
+FTS_PREFIX = '2 3'
+
+# Codec used for new bodies. Each row records its own codec, so a database may mix them.
+BODY_CODEC = 'zstd' if zstandard is not None else 'zlib'
+
+# Keeps "IN (?, ?, ...)" lists well below SQLite's bound-parameter limit.
+_IN_CHUNK = 500
+
+# Range of an SQLite INTEGER; larger Python ints raise OverflowError when bound.
+SQLITE_MIN_INTEGER = -2 ** 63
+SQLITE_MAX_INTEGER = 2 ** 63 - 1
+
+CREATE_META_SQL = """
+CREATE TABLE IF NOT EXISTS page_meta (
+    id INTEGER PRIMARY KEY, -- Same value as the rowid of the page in pages
+    url TEXT NOT NULL UNIQUE,
+    content_hash BLOB, -- content_hash() of the stored page; NULL if written before version 4
+    crawled_at INTEGER, -- crawled_timestamp as Unix epoch seconds; NULL if it could not be parsed
+    source TEXT, -- source_engine
+    host TEXT -- Lower-cased host name of url
+);
+"""
+
+# Filter columns added in version 6, with the indexes search() filters use.
+META_FILTER_COLUMNS = {'crawled_at': 'INTEGER', 'source': 'TEXT', 'host': 'TEXT'}
+CREATE_META_INDEXES_SQL = (
+    "CREATE INDEX IF NOT EXISTS idx_page_meta_crawled_at ON page_meta (crawled_at);",
+    "CREATE INDEX IF NOT EXISTS idx_page_meta_source ON page_meta (source, crawled_at);",
+    "CREATE INDEX IF NOT EXISTS idx_page_meta_host ON page_meta (host, crawled_at);",
+)
+
+CREATE_CONTENT_SQL = """
+CREATE TABLE IF NOT EXISTS page_content (
+    id INTEGER PRIMARY KEY, -- page_meta.id
+    title TEXT,
+    snippet TEXT,
+    llm_summary TEXT,
+    source_engine TEXT,
+    crawled_timestamp TEXT,
+    body BLOB, -- Compressed with body_codec
+    body_codec TEXT
+);
+"""
+
+CREATE_FTS_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(
+    {', '.join(FTS_COLUMNS)},
+    content = '',
+    prefix = '{FTS_PREFIX}',
+    tokenize = "{FTS_TOKENIZE}"
+);
+"""
+
+# One row per distinct term: (term, doc, cnt), doc being the number of pages containing it.
+CREATE_VOCAB_SQL = "CREATE VIRTUAL TABLE IF NOT EXISTS pages_vocab USING fts5vocab(pages, 'row');"
+
+
+CREATE_SIMHASH_SQL = """
+CREATE TABLE IF NOT EXISTS page_simhash (
+    id INTEGER PRIMARY KEY, -- page_meta.id
+    fingerprint INTEGER NOT NULL, -- simhash.to_sqlite() of the 64-bit fingerprint
+    cluster_id INTEGER NOT NULL -- id of the first page seen in this near-duplicate cluster
+);
+"""
+
+CREATE_SIMHASH_CLUSTER_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_page_simhash_cluster ON page_simhash (cluster_id);"
+
+CREATE_SIMHASH_BANDS_SQL = """
+CREATE TABLE IF NOT EXISTS simhash_bands (
+    band_key INTEGER NOT NULL, -- simhash.band_keys()
+    id INTEGER NOT NULL,
+    PRIMARY KEY (band_key, id)
+) WITHOUT ROWID;
+"""
+
+
+def to_epoch(value) -> int | None:
+    """
+    Converts a timestamp to Unix epoch seconds.
+
+    Accepts epoch numbers, datetimes, dates (midnight) and ISO 8601 strings (a trailing
+    'Z' is allowed); naive values are taken as UTC. Returns None for None and for anything
+    else that is not a usable timestamp (unparseable strings, NaN, values outside SQLite's
+    64-bit INTEGER range, other types), so a bad crawled_timestamp never fails a write.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        if isinstance(value, float) and not math.isfinite(value):
+            return None
+        epoch = int(value)
+    else:
+        if isinstance(value, str):
+            text = value.strip()
+            if text.endswith(('Z', 'z')):
+                text = text[:-1] + '+00:00'
+            try:
+                value = datetime.fromisoformat(text)
+            except ValueError:
+                return None
+        elif isinstance(value, date) and not isinstance(value, datetime):
+            value = datetime(value.year, value.month, value.day)
+        elif not isinstance(value, datetime):
+            return None
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        epoch = int(value.timestamp())
+    return epoch if SQLITE_MIN_INTEGER <= epoch <= SQLITE_MAX_INTEGER else None
+
+
+def _timestamp_param(value):
+    """crawled_timestamp as bound to the TEXT column: ints SQLite cannot bind are stored as their text."""
+    if isinstance(value, int) and not SQLITE_MIN_INTEGER <= value <= SQLITE_MAX_INTEGER:
+        return str(value)
+    return value
+
+
+def url_host(url: str) -> str | None:
+    try:
+        return urlsplit(url).hostname
+    except ValueError:
+        return None
+
+
+def content_hash(title, body, snippet, llm_summary, source_engine) -> bytes:
+    """
+    Digest of everything a page stores except crawled_timestamp.
+
+    Two crawls of a page with the same hash would write identical rows, so the
+    second one does not need to touch the FTS5 index.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for value in (title, body, snippet, llm_summary, source_engine):
+        # Length-prefixed, and None distinct from '', so field boundaries cannot shift.
+        data = b'' if value is None else str(value).encode('utf-8')
+        digest.update(b'N' if value is None else b'S' + len(data).to_bytes(8, 'big') + data)
+    return digest.digest()
+
+
+def compress_text(text) -> tuple[bytes | None, str | None]:
+    """Returns (blob, codec) for a body; None bodies are stored as NULL."""
+    if text is None:
+        return None, None
+    data = str(text).encode('utf-8')
+    if BODY_CODEC == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(data), 'zstd'
+    return zlib.compress(data, 6), 'zlib'
+
+
+def decompress_text(blob, codec) -> str | None:
+    if blob is None:
+        return None
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("This index stores zstd-compressed bodies; install the 'zstandard' package to read them.")
+        return zstandard.ZstdDecompressor().decompress(blob).decode('utf-8')
+    if codec == 'zlib':
+        return zlib.decompress(blob).decode('utf-8')
+    return blob if isinstance(blob, str) else bytes(blob).decode('utf-8')
+
+
+def _chunks(items: list, size: int = _IN_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def ensure_schema(cursor):
+    """Creates the index tables, migrating older layouts up to SCHEMA_VERSION."""
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    has_pages = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pages'"
+    ).fetchone() is not None
+
+    if has_pages and version < 3:
+        _migrate_legacy(cursor, version)
+    cursor.execute(CREATE_META_SQL)
+    if version < 4:
+        # Version 3 -> 4. Existing rows keep a NULL hash and are re-indexed once on their next write.
+        meta_columns = [row[1] for row in cursor.execute("PRAGMA table_info(page_meta)")]
+        if 'content_hash' not in meta_columns:
+            cursor.execute("ALTER TABLE page_meta ADD COLUMN content_hash BLOB")
+    cursor.execute(CREATE_CONTENT_SQL)
+    if version < 7 and has_pages:
+        _add_prefix_index(cursor)
+    cursor.execute(CREATE_FTS_SQL)
+    cursor.execute(CREATE_VOCAB_SQL)
+    cursor.execute(CREATE_SIMHASH_SQL)
+    cursor.execute(CREATE_SIMHASH_CLUSTER_INDEX_SQL)
+    cursor.execute(CREATE_SIMHASH_BANDS_SQL)
+    if version < 6:
+        _add_filter_columns(cursor)
+    for sql in CREATE_META_INDEXES_SQL:
+        cursor.execute(sql)
+    if version < SCHEMA_VERSION:
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def _add_filter_columns(cursor):
+    """Version 5 -> 6: adds crawled_at/source/host to page_meta and fills them from page_content."""
+    meta_columns = [row[1] for row in cursor.execute("PRAGMA table_info(page_meta)")]
+    for column, column_type in META_FILTER_COLUMNS.items():
+        if column not in meta_columns:
+            cursor.execute(f"ALTER TABLE page_meta ADD COLUMN {column} {column_type}")
+    reader = cursor.connection.cursor()
+    reader.execute("""
+    SELECT m.id, m.url, c.crawled_timestamp, c.source_engine
+    FROM page_meta m JOIN page_content c ON c.id = m.id
+    """)
+    while True:
+        rows = reader.fetchmany(1000)
+        if not rows:
+            break
+        cursor.executemany("UPDATE page_meta SET crawled_at = ?, source = ?, host = ? WHERE id = ?", [
+            (to_epoch(crawled_timestamp), source_engine, url_host(url), page_id)
+            for page_id, url, crawled_timestamp, source_engine in rows
+        ])
+
+
+def _add_prefix_index(cursor):
+    """Version 6 -> 7: rebuilds the FTS5 index with prefix indexes from page_content."""
+    fts_sql = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'pages'").fetchone()[0]
+    if 'prefix' in fts_sql: # Already created by _migrate_legacy
+        return
+    # A contentless table's options cannot be changed, and it cannot be renamed while its
+    # contents are replayed into the new one; the stored fields are the only source anyway.
+    cursor.execute("DROP TABLE pages")
+    cursor.execute(CREATE_FTS_SQL)
+    reader = cursor.connection.cursor()
+    reader.execute("SELECT id, title, body, body_codec, llm_summary, source_engine FROM page_content ORDER BY id")
+    while True:
+        rows = reader.fetchmany(1000)
+        if not rows:
+            break
+        cursor.executemany(
+            f"INSERT INTO pages (rowid, {', '.join(FTS_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+            [(page_id, title, decompress_text(blob, codec), llm_summary, source_engine)
+             for page_id, title, blob, codec, llm_summary, source_engine in rows]
+        )
+
+
+def _migrate_legacy(cursor, version: int):
+    """Upgrades a database whose 'pages' table still stores every column (versions 0-2)."""
+    cursor.execute(CREATE_META_SQL)
+    if version < 2:
+        # Backfill the URL mapping. Newest rowid wins if a URL was ever stored twice,
+        # and any older copies are dropped from pages so every row has a page_meta entry.
+        cursor.execute("""
+        INSERT OR IGNORE INTO page_meta (id, url)
+        SELECT rowid, url FROM pages WHERE url IS NOT NULL ORDER BY rowid DESC
+        """)
+        cursor.execute("DELETE FROM pages WHERE rowid NOT IN (SELECT id FROM page_meta)")
+
+    # Version 2 -> 3: move stored fields out of the FTS5 table and rebuild it contentless.
+    cursor.execute("ALTER TABLE pages RENAME TO pages_v2")
+    cursor.execute(CREATE_CONTENT_SQL)
+    cursor.execute(CREATE_FTS_SQL)
+    reader = cursor.connection.cursor()
+    reader.execute("""
+    SELECT rowid, title, body, snippet, llm_summary, source_engine, crawled_timestamp
+    FROM pages_v2 ORDER BY rowid
+    """)
+    while True:
+        rows = reader.fetchmany(1000)
+        if not rows:
+            break
+        write_pages(cursor, rows, replace=False)
+    cursor.execute("DROP TABLE pages_v2")
+
+
+def write_pages(cursor, rows: list[tuple], replace: bool = True):
+    """
+    Stores and indexes pages.
+
+    Args:
+        cursor: Cursor inside the caller's transaction.
+        rows: (id, title, body, snippet, llm_summary, source_engine, crawled_timestamp)
+              tuples; id must already exist in page_meta.
+        replace: Unindex any previous version of these ids first. Only skip this
+                 when the ids are known to be new.
+    """
+    if replace:
+        _unindex(cursor, [row[0] for row in rows])
+
+    content_rows = []
+    fts_rows = []
+    for page_id, title, body, snippet, llm_summary, source_engine, crawled_timestamp in rows:
+        blob, codec = compress_text(body)
+        content_rows.append((page_id, title, snippet, llm_summary, source_engine, _timestamp_param(crawled_timestamp),
+                             blob, codec))
+        fts_rows.append((page_id, title, body, llm_summary, source_engine))
+
+    cursor.executemany("""
+    INSERT OR REPLACE INTO page_content
+        (id, title, snippet, llm_summary, source_engine, crawled_timestamp, body, body_codec)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, content_rows)
+    cursor.executemany(
+        f"INSERT INTO pages (rowid, {', '.join(FTS_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+        fts_rows
+    )
+
+
+def remove_pages(cursor, ids: list[int]):
+    """Unindexes and deletes pages (content and URL mapping) by id."""
+    _unindex(cursor, ids)
+    remove_fingerprints(cursor, ids)
+    params = [(page_id,) for page_id in ids]
+    cursor.executemany("DELETE FROM page_content WHERE id = ?", params)
+    cursor.executemany("DELETE FROM page_meta WHERE id = ?", params)
+
+
+def _unindex(cursor, ids: list[int]):
+    """Removes the FTS5 entries of ids by replaying their stored values through 'delete'."""
+    delete_rows = []
+    for chunk in _chunks(ids):
+        placeholders = ', '.join('?' * len(chunk))
+        cursor.execute(f"""
+        SELECT id, title, body, body_codec, llm_summary, source_engine
+        FROM page_content WHERE id IN ({placeholders})
+        """, chunk)
+        for page_id, title, blob, codec, llm_summary, source_engine in cursor.fetchall():
+            delete_rows.append((page_id, title, decompress_text(blob, codec), llm_summary, source_engine))
+    cursor.executemany(
+        f"INSERT INTO pages (pages, rowid, {', '.join(FTS_COLUMNS)}) VALUES ('delete', ?, ?, ?, ?, ?)",
+        delete_rows
+    )
+
+
+def lookup_pages(cursor, urls: list[str]) -> dict[str, tuple[int, bytes | None]]:
+    """Maps each URL that exists in page_meta to its (id, content_hash)."""
+    pages = {}
+    for chunk in _chunks(urls):
+        placeholders = ', '.join('?' * len(chunk))
+        cursor.execute(f"SELECT url, id, content_hash FROM page_meta WHERE url IN ({placeholders})", chunk)
+        pages.update((url, (page_id, digest)) for url, page_id, digest in cursor.fetchall())
+    return pages
+
+
+def write_meta(cursor, rows: list[tuple[bytes, str, str, int]]):
+    """Records (content_hash, crawled_timestamp, source_engine, id) for freshly written pages."""
+    cursor.executemany("UPDATE page_meta SET content_hash = ?, crawled_at = ?, source = ? WHERE id = ?", [
+        (digest, to_epoch(crawled_timestamp), source_engine, page_id)
+        for digest, crawled_timestamp, source_engine, page_id in rows
+    ])
+
+
+def touch_pages(cursor, timestamps: list[tuple[str, int]]):
+    """Updates crawled_timestamp for (crawled_timestamp, id) pairs; the FTS5 index is not touched."""
+    cursor.executemany("UPDATE page_content SET crawled_timestamp = ? WHERE id = ?",
+                       [(_timestamp_param(crawled_timestamp), page_id) for crawled_timestamp, page_id in timestamps])
+    cursor.executemany("UPDATE page_meta SET crawled_at = ? WHERE id = ?",
+                       [(to_epoch(crawled_timestamp), page_id) for crawled_timestamp, page_id in timestamps])
+
+
+def find_near_duplicate(cursor, value: int, exclude_id: int | None = None,
+                        max_distance: int = simhash.MAX_DISTANCE) -> tuple[int, int] | None:
+    """
+    Looks up the stored page closest to fingerprint value, within max_distance bits.
+
+    Returns (id, cluster_id) of the match, or None. Costs one index probe per band.
+    """
+    keys = simhash.band_keys(value)
+    cursor.execute(f"""
+    SELECT DISTINCT s.id, s.fingerprint, s.cluster_id
+    FROM simhash_bands b JOIN page_simhash s ON s.id = b.id
+    WHERE b.band_key IN ({', '.join('?' * len(keys))})
+    """, keys)
+    best = None
+    for page_id, stored, cluster_id in cursor.fetchall():
+        if page_id == exclude_id:
+            continue
+        bits = simhash.distance(value, simhash.from_sqlite(stored))
+        if bits <= max_distance and (best is None or bits < best[0]):
+            best = (bits, page_id, cluster_id)
+    return None if best is None else (best[1], best[2])
+
+
+def set_fingerprint(cursor, page_id: int, value: int | None, cluster_id: int | None = None):
+    """Replaces the fingerprint of page_id; None just removes it. cluster_id defaults to page_id."""
+    remove_fingerprints(cursor, [page_id])
+    if value is None:
+        return
+    cursor.execute("INSERT INTO page_simhash (id, fingerprint, cluster_id) VALUES (?, ?, ?)",
+                   (page_id, simhash.to_sqlite(value), page_id if cluster_id is None else cluster_id))
+    cursor.executemany("INSERT INTO simhash_bands (band_key, id) VALUES (?, ?)",
+                       [(key, page_id) for key in simhash.band_keys(value)])
+
+
+def remove_fingerprints(cursor, ids: list[int]):
+    """
+    Deletes fingerprints and their band rows (located through the stored fingerprint).
+
+    Pages left in the cluster of a removed page move to the cluster of their lowest id,
+    so the removed id can never group them with an unrelated page later on.
+    """
+    band_rows = []
+    removed = []
+    for chunk in _chunks(ids):
+        placeholders = ', '.join('?' * len(chunk))
+        cursor.execute(f"SELECT id, fingerprint FROM page_simhash WHERE id IN ({placeholders})", chunk)
+        for page_id, stored in cursor.fetchall():
+            band_rows.extend((key, page_id) for key in simhash.band_keys(simhash.from_sqlite(stored)))
+            removed.append((page_id,))
+    if removed:
+        cursor.executemany("DELETE FROM simhash_bands WHERE band_key = ? AND id = ?", band_rows)
+        cursor.executemany("DELETE FROM page_simhash WHERE id = ?", removed)
+        cursor.executemany("""
+        UPDATE page_simhash SET cluster_id = (SELECT MIN(id) FROM page_simhash WHERE cluster_id = ?1)
+        WHERE cluster_id = ?1
+        """, removed)
+
+
+def _fts_varint(data: bytes, offset: int) -> tuple[int, int]:
+    """Decodes one SQLite varint from data at offset; returns (value, next_offset)."""
+    value = 0
+    for position in range(9):
+        byte = data[offset]
+        offset += 1
+        if position == 8:
+            return (value << 8) | byte, offset
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, offset
+    return value, offset
+
+
+def fts_structure(cursor) -> dict:
+    """
+    Reads the level and segment counts of the 'pages' FTS5 index.
+
+    FTS5 keeps them in its structure record (row 10 of pages_data): a 4-byte cookie,
+    an optional 4-byte version-2 marker, then varints for the number of levels and
+    the total number of segments. Every segment is one more b-tree a query has to probe.
+    """
+    row = cursor.execute("SELECT block FROM pages_data WHERE id = 10").fetchone()
+    if row is None or not row[0]:
+        return {'levels': 0, 'segments': 0}
+    data = bytes(row[0])
+    offset = 8 if data[4:8] == b'\xff\x00\x00\x01' else 4
+    levels, offset = _fts_varint(data, offset)
+    segments, offset = _fts_varint(data, offset)
+    return {'levels': levels, 'segments': segments}
+
+
+def read_fields(cursor, ids: list[int], fields: tuple[str, ...]) -> dict[int, dict]:
+    """
+    Fetches selected stored fields for many pages at once.
+
+    Returns {id: {field: value}} for the ids that exist; 'body' is decompressed.
+    """
+    unknown = set(fields) - {'title', 'snippet', 'llm_summary', 'source_engine', 'crawled_timestamp', 'body'}
+    if unknown:
+        raise ValueError(f"Unknown page fields: {sorted(unknown)}")
+    columns = [field for field in fields if field != 'body']
+    if 'body' in fields:
+        columns += ['body', 'body_codec']
+
+    found = {}
+    for chunk in _chunks(ids):
+        placeholders = ', '.join('?' * len(chunk))
+        cursor.execute(f"SELECT id, {', '.join(columns)} FROM page_content WHERE id IN ({placeholders})", chunk)
+        for row in cursor.fetchall():
+            values = dict(zip(columns, row[1:]))
+            if 'body' in values:
+                values['body'] = decompress_text(values['body'], values.pop('body_codec'))
+            found[row[0]] = values
+    return found
+
+
+_PAGE_SELECT_SQL = """
+SELECT m.url, c.title, c.body, c.body_codec, c.snippet, c.llm_summary, c.source_engine, c.crawled_timestamp
+FROM page_meta m JOIN page_content c ON c.id = m.id
+"""
+
+
+def read_page(cursor, url: str) -> dict | None:
+    """Returns every stored field of the page for url (body decompressed), or None."""
+    row = cursor.execute(_PAGE_SELECT_SQL + "WHERE m.url = ?", (url,)).fetchone()
+    return None if row is None else _page_dict(row)
+
+
+def iter_pages(cursor):
+    """Yields every stored page as a document dict (same fields as read_page), in id order."""
+    for row in cursor.execute(_PAGE_SELECT_SQL + "ORDER BY m.id"):
+        yield _page_dict(row)
+
+
+def _page_dict(row: tuple) -> dict:
+    url, title, blob, codec, snippet, llm_summary, source_engine, crawled_timestamp = row
+    return {
+        'url': url,
+        'title': title,
+        'body': decompress_text(blob, codec),
+        'snippet': snippet,
+        'llm_summary': llm_summary,
+        'source_engine': source_engine,
+        'crawled_timestamp': crawled_timestamp,
+    }
@@ -0,0 +1,142 @@
+"""
+Type-ahead term suggestions from the FTS5 vocabulary.
+
+Suggester keeps every indexed term with its document count (read from the
+fts5vocab table 'pages_vocab') in a sorted array, so the terms starting with a
+prefix are one bisect away. The most frequent of them are picked with a heap;
+prefixes matching many terms (the first keystrokes) have their top entries
+memoized. After local writes only the terms of the written pages are
+re-read from the vocabulary (note_terms/apply_pending).
+"""
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+
+# Prefixes matching more terms than this keep a memoized top list.
+MEMO_MIN_TERMS = 1024
+# Length of the memoized top lists; larger k are answered directly.
+MEMO_K = 20
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def fold(text: str) -> str:
+    """Lower-cases text and strips diacritics, approximating FTS5's unicode61 remove_diacritics 2."""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str | None) -> list[str]:
+    """The terms the FTS5 tokenizer would (approximately) produce for text, in order."""
+    if not text:
+        return []
+    return _TOKEN_RE.findall(fold(text))
+
+
+def terms(text: str | None) -> set[str]:
+    """The distinct terms of text (see tokenize)."""
+    return set(tokenize(text))
+
+
+class Suggester:
+    def __init__(self, min_docs: int = 2):
+        """
+        Args:
+            min_docs: Terms found in fewer pages are not suggested (typos, ids, one-off tokens).
+        """
+        self.min_docs = min_docs
+        self._terms = [] # Sorted
+        self._docs = [] # Document count of _terms[i]
+        self._positions = {}
+        self._added = {} # Terms not yet merged into _terms -> document count
+        self._memo = {}
+        self._pending = set()
+        # note_terms() is called by writers while suggest() may be running.
+        self._pending_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._terms) + len(self._added)
+
+    def load(self, cursor):
+        """Reads the whole vocabulary, replacing whatever was loaded before."""
+        rows = cursor.execute("SELECT term, doc FROM pages_vocab WHERE doc >= ?", (self.min_docs,)).fetchall()
+        self._terms = [term for term, _ in rows] # fts5vocab returns terms in sorted order
+        self._docs = [doc for _, doc in rows]
+        self._positions = {term: i for i, term in enumerate(self._terms)}
+        self._added = {}
+        self._memo = {}
+
+    def note_terms(self, new_terms: set[str]):
+        """Records terms whose document counts may have changed, for the next apply_pending()."""
+        with self._pending_lock:
+            self._pending |= new_terms
+
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def apply_pending(self, cursor):
+        """Re-reads the document counts of the terms passed to note_terms since the last call."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, set()
+        for term in sorted(pending):
+            # fts5vocab answers term = ? with an index lookup, but scans the whole vocabulary for IN lists.
+            row = cursor.execute("SELECT doc FROM pages_vocab WHERE term = ?", (term,)).fetchone()
+            self._set_count(term, row[0] if row else 0)
+        if len(self._added) > max(MEMO_MIN_TERMS, len(self._terms) // 100):
+            self._merge_added()
+
+    def _set_count(self, term: str, docs: int):
+        position = self._positions.get(term)
+        old = self._docs[position] if position is not None else self._added.get(term, 0)
+        if docs == old:
+            return
+        if position is not None:
+            self._docs[position] = docs
+        elif docs >= self.min_docs:
+            self._added[term] = docs
+        else:
+            self._added.pop(term, None)
+        for length in range(1, len(term) + 1):
+            top = self._memo.get(term[:length])
+            if top is None:
+                continue
+            if docs < old:
+                # Another term may now belong in the top list; recompute it on demand.
+                del self._memo[term[:length]]
+            elif docs >= self.min_docs and (len(top) < MEMO_K or docs > top[-1][0]):
+                entries = [entry for entry in top if entry[1] != term] + [(docs, term)]
+                entries.sort(key=lambda entry: (-entry[0], entry[1]))
+                self._memo[term[:length]] = entries[:MEMO_K]
+
+    def _merge_added(self):
+        merged = sorted(list(zip(self._terms, self._docs)) + list(self._added.items()))
+        merged = [(term, docs) for term, docs in merged if docs >= self.min_docs]
+        self._terms = [term for term, _ in merged]
+        self._docs = [docs for _, docs in merged]
+        self._positions = {term: i for i, term in enumerate(self._terms)}
+        self._added = {}
+
+    def suggest(self, prefix: str, k: int = 10) -> list[tuple[str, int]]:
+        """The k most frequent terms starting with prefix, as (term, document count) pairs."""
+        prefix = fold(prefix)
+        if not prefix or k <= 0:
+            return []
+        memo = self._memo.get(prefix)
+        if memo is not None and k <= MEMO_K:
+            return [(term, docs) for docs, term in memo[:k]]
+
+        lo = bisect.bisect_left(self._terms, prefix)
+        # Every string starting with prefix sorts below prefix + U+10FFFF.
+        hi = bisect.bisect_left(self._terms, prefix + '\U0010ffff', lo)
+        candidates = ((self._docs[i], self._terms[i]) for i in range(lo, hi) if self._docs[i] >= self.min_docs)
+        extra = [(docs, term) for term, docs in self._added.items() if term.startswith(prefix)]
+        top = heapq.nsmallest(max(k, MEMO_K) if hi - lo > MEMO_MIN_TERMS else k,
+                              (entry for source in (candidates, extra) for entry in source),
+                              key=lambda entry: (-entry[0], entry[1]))
+        if hi - lo > MEMO_MIN_TERMS:
+            self._memo[prefix] = top[:MEMO_K]
+        return [(term, docs) for docs, term in top[:k]]
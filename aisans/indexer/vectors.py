@@ -0,0 +1,153 @@
+"""
+Local semantic vectors for hybrid (vector + bm25) retrieval.
+
+Texts are embedded without any model or service: every unigram and bigram is
+hashed to HASHES_PER_TOKEN signed positions of a DIM-dimensional vector (a
+sparse random projection of the hashed term-frequency vector), weighted by
+1 + log(tf) for pages and by idf for queries, and L2-normalized. Page vectors
+therefore never depend on corpus statistics and are not re-encoded as the index
+grows; the query side brings in idf from the FTS5 vocabulary.
+
+Vectors are stored next to the database in '<db_path>.vectors', a flat float32
+matrix whose row i belongs to page id i (rows of deleted or never-stored ids
+are zero). Search is a brute-force dot product over the memory-mapped matrix.
+The file is derived state: it is written after each commit, so a crash between
+the two can leave some rows stale until the page is written again.
+
+Requires numpy; without it the Indexer runs lexical-only.
+"""
+import math
+import os
+import threading
+import zlib
+from collections import Counter
+
+from .suggest import tokenize
+
+try:
+    import numpy
+except ImportError: # Optional dependency; hybrid search falls back to bm25 only.
+    numpy = None
+
+DIM = 128
+HASHES_PER_TOKEN = 2
+ROW_BYTES = DIM * 4
+# Rows are added in blocks so the file (and the readers' mappings) grow rarely.
+GROW_ROWS = 4096
+
+
+def vectors_path(db_path: str) -> str:
+    return db_path + '.vectors'
+
+
+def features(text: str | None) -> Counter:
+    """Unigram and bigram counts of text."""
+    words = tokenize(text)
+    counts = Counter(words)
+    counts.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return counts
+
+
+def _project(rows: list[int], encoded: list[bytes], weights: list[float], num_rows: int):
+    """Sums weighted feature projections into a (num_rows, DIM) matrix and L2-normalizes each row."""
+    flat = numpy.zeros(num_rows * DIM, dtype=numpy.float64)
+    if encoded:
+        row_offsets = numpy.asarray(rows, dtype=numpy.int64) * DIM
+        weight_array = numpy.asarray(weights, dtype=numpy.float64)
+        for seed in range(HASHES_PER_TOKEN):
+            # crc32 with a different start value per seed; bit 0 is the sign, the rest the position.
+            hashes = numpy.fromiter((zlib.crc32(data, seed) for data in encoded), dtype=numpy.int64, count=len(encoded))
+            signed = numpy.where(hashes & 1, weight_array, -weight_array)
+            flat += numpy.bincount(row_offsets + (hashes >> 1) % DIM, weights=signed, minlength=num_rows * DIM)
+    matrix = flat.reshape(num_rows, DIM).astype(numpy.float32)
+    norms = numpy.linalg.norm(matrix, axis=1, keepdims=True)
+    numpy.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def encode_pages(texts: list[str | None]):
+    """Embeds page texts in one batch; returns a (len(texts), DIM) float32 matrix."""
+    rows, encoded, weights = [], [], []
+    for row, text in enumerate(texts):
+        counts = features(text)
+        rows.extend([row] * len(counts))
+        encoded.extend(feature.encode('utf-8') for feature in counts)
+        weights.extend(1.0 + math.log(count) for count in counts.values())
+    return _project(rows, encoded, weights, len(texts))
+
+
+def encode_query(text: str, idf) -> 'numpy.ndarray':
+    """
+    Embeds a query. idf(term) gives the weight of a unigram; a bigram gets the mean of
+    its two words' weights.
+    """
+    word_weights = {}
+    encoded, weights = [], []
+    for feature in features(text):
+        words = feature.split(' ')
+        for word in words:
+            if word not in word_weights:
+                word_weights[word] = idf(word)
+        encoded.append(feature.encode('utf-8'))
+        weights.append(sum(word_weights[word] for word in words) / len(words))
+    return _project([0] * len(encoded), encoded, weights, 1)[0]
+
+
+class VectorStore:
+    """The '<db_path>.vectors' file: row writes by the index writer, mapped top-k reads for search."""
+
+    def __init__(self, path: str, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self._map = None
+        self._mapped_size = 0
+        # Serializes writes (the caller's ingest() and the write-behind thread may both write): a size check
+        # and truncate racing with a larger write would cut off the rows just written. Also guards the map.
+        self._lock = threading.Lock()
+        if not read_only and not os.path.exists(path):
+            open(path, 'wb').close()
+
+    def write(self, ids: list[int], matrix):
+        """Stores matrix[i] as the vector of page ids[i]."""
+        if not ids:
+            return
+        with self._lock, open(self.path, 'r+b') as f:
+            size = os.fstat(f.fileno()).st_size
+            needed = (max(ids) + 1) * ROW_BYTES
+            if needed > size:
+                f.truncate(max(needed, size + GROW_ROWS * ROW_BYTES))
+            data = numpy.ascontiguousarray(matrix, dtype=numpy.float32)
+            for page_id, row in zip(ids, data):
+                os.pwrite(f.fileno(), row.tobytes(), page_id * ROW_BYTES)
+
+    def delete(self, ids: list[int]):
+        if ids:
+            self.write(ids, numpy.zeros((len(ids), DIM), dtype=numpy.float32))
+
+    def _matrix(self):
+        """The mapped matrix, remapped if the file grew since the last call (None if empty)."""
+        with self._lock:
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            rows = size // ROW_BYTES
+            if rows == 0:
+                return None
+            if self._map is None or size != self._mapped_size:
+                self._map = numpy.memmap(self.path, dtype=numpy.float32, mode='r', shape=(rows, DIM))
+                self._mapped_size = size
+            return self._map
+
+    def top_k(self, query, k: int) -> list[tuple[int, float]]:
+        """(page id, cosine similarity) of the k best-matching rows, best first; zero rows are skipped."""
+        matrix = self._matrix()
+        if matrix is None or k <= 0:
+            return []
+        scores = matrix @ query
+        k = min(k, len(scores))
+        best = numpy.argpartition(-scores, k - 1)[:k]
+        best = best[numpy.argsort(-scores[best], kind='stable')]
+        return [(int(page_id), float(scores[page_id])) for page_id in best if scores[page_id] > 0]
+
+    def close(self):
+        with self._lock:
+            self._map = None
+            self._mapped_size = 0
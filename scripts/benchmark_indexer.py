@@ -0,0 +1,323 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+try:
+    import resource
+except ImportError: # Not available on Windows; peak RSS is then reported as null.
+    resource = None
+
+# Add project root to sys.path to allow imports from aisans package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aisans.indexer.indexer import Indexer
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+WORKLOADS = ('add_document', 'add_batch', 'upsert', 'search')
+SOURCES = ('crawler', 'google', 'duckduckgo', 'bing')
+# Pseudo-word syllables; the vocabulary is every syllable sequence, shortest first.
+SYLLABLES = ('ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'be', 'da', 'fu', 'ge', 'ho', 'ji', 'pe', 'zo',
+             'an', 'el', 'is', 'or', 'un', 'tra', 'pli', 'sto', 'gra', 'bre', 'cho', 'shi', 'qua', 'vex')
+# The most frequent ranks behave like stop words; queries draw from the ranks after them.
+QUERY_MIN_RANK = 50
+BASE_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class Corpus:
+    """
+    Seeded synthetic documents with a Zipf-distributed vocabulary.
+
+    Document i depends only on (seed, i), so every workload and every run sees the same
+    documents, and a corpus of any size is generated lazily without holding it in memory.
+    """
+
+    def __init__(self, num_docs: int, seed: int = 42, vocabulary_size: int = 50_000, zipf_exponent: float = 1.07,
+                 body_words: int = 300, num_hosts: int = 2_000, duplicate_fraction: float = 0.05):
+        self.num_docs = num_docs
+        self.seed = seed
+        self.body_words = body_words
+        self.num_hosts = num_hosts
+        self.duplicate_fraction = duplicate_fraction
+        self.vocabulary = [self._word(rank) for rank in range(vocabulary_size)]
+        self._ranks = range(vocabulary_size)
+        self._cum_weights = list(itertools.accumulate(1.0 / (rank + 1) ** zipf_exponent
+                                                      for rank in range(vocabulary_size)))
+
+    @staticmethod
+    def _word(rank: int) -> str:
+        syllables = []
+        rank += 1
+        while rank:
+            rank, digit = divmod(rank - 1, len(SYLLABLES))
+            syllables.append(SYLLABLES[digit])
+        return ''.join(reversed(syllables))
+
+    def _rng(self, *key) -> random.Random:
+        return random.Random(':'.join(map(str, (self.seed,) + key)))
+
+    def _words(self, rng: random.Random, count: int, min_rank: int = 0) -> list[str]:
+        if not min_rank:
+            return rng.choices(self.vocabulary, cum_weights=self._cum_weights, k=count)
+        words = []
+        while len(words) < count:
+            rank = rng.choices(self._ranks, cum_weights=self._cum_weights)[0]
+            if rank >= min_rank:
+                words.append(self.vocabulary[rank])
+        return words
+
+    def document(self, i: int, revision: int = 0) -> dict:
+        """Document i; a revision > 0 is the same page re-crawled with partly new text."""
+        rng = self._rng('doc', i)
+        length = max(20, int(rng.lognormvariate(math.log(self.body_words) - 0.125, 0.5)))
+        if i > 0 and rng.random() < self.duplicate_fraction:
+            # A near-duplicate: another page's body with a few words changed.
+            words = self.document(rng.randrange(i))['body'].split()
+            for position in rng.sample(range(len(words)), min(3, len(words))):
+                words[position] = self._words(rng, 1)[0]
+        else:
+            words = self._words(rng, length)
+        if revision:
+            revision_rng = self._rng('revision', i, revision)
+            words = words[:len(words) // 2] + self._words(revision_rng, length - len(words) // 2)
+        body = ' '.join(words)
+        host = f"host{int(rng.paretovariate(1.2)) % self.num_hosts}.example.com"
+        return {
+            'url': f"https://{host}/{'/'.join(self._words(rng, 2))}/{i}",
+            'title': ' '.join(self._words(rng, rng.randint(3, 9))).capitalize(),
+            'body': body,
+            'snippet': ' '.join(words[:25]),
+            'source_engine': SOURCES[rng.randrange(len(SOURCES))],
+            'crawled_timestamp': (BASE_TIME + timedelta(seconds=30 * i + 3600 * revision)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'llm_summary': ' '.join(self._words(rng, 20)) if rng.random() < 0.3 else None,
+        }
+
+    def documents(self, start: int = 0, stop: int | None = None):
+        for i in range(start, self.num_docs if stop is None else stop):
+            yield self.document(i)
+
+    def queries(self, count: int) -> list[str]:
+        """A reproducible query mix: 1-3 words, phrases, prefixes and OR queries."""
+        rng = self._rng('queries')
+        queries = []
+        for n in range(count):
+            words = self._words(rng, 3, min_rank=QUERY_MIN_RANK)
+            kind = n % 6
+            if kind == 0:
+                queries.append(words[0])
+            elif kind in (1, 2):
+                queries.append(' '.join(words[:2]))
+            elif kind == 3:
+                queries.append(' '.join(words))
+            elif kind == 4:
+                queries.append(f'"{words[0]} {words[1]}" OR {words[2][:3]}*')
+            else:
+                queries.append(f"{words[0]} OR {words[1]}")
+        return queries
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
+
+
+def peak_rss_mib() -> float | None:
+    """Peak resident set size of this process so far, in MiB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def database_size(db_path: str) -> int:
+    return sum(os.path.getsize(db_path + suffix) for suffix in ('', '-wal') if os.path.exists(db_path + suffix))
+
+
+def _write_stats(docs: int, seconds: float, indexer: Indexer) -> dict:
+    return {'docs': docs, 'seconds': round(seconds, 3), 'docs_per_sec': round(docs / seconds, 1) if seconds else None,
+            'writes_avoided': indexer.writes_avoided, 'near_duplicates_found': indexer.near_duplicates_found,
+            'peak_rss_mib': peak_rss_mib()}
+
+
+def run_add_document(corpus: Corpus, db_path: str, num_docs: int, indexer_options: dict) -> dict:
+    """One add_document call (one transaction) per document, on an empty index."""
+    with Indexer(db_path=db_path, **indexer_options) as indexer:
+        documents = list(corpus.documents(0, num_docs))
+        start = time.perf_counter()
+        for doc in documents:
+            indexer.add_document(doc)
+        seconds = time.perf_counter() - start
+    return _write_stats(num_docs, seconds, indexer)
+
+
+def run_add_batch(corpus: Corpus, db_path: str, batch_size: int, indexer_options: dict) -> dict:
+    """The whole corpus in add_batch calls of batch_size, on an empty index. Generation time is excluded."""
+    seconds = 0.0
+    with Indexer(db_path=db_path, **indexer_options) as indexer:
+        for start in range(0, corpus.num_docs, batch_size):
+            batch = list(corpus.documents(start, min(start + batch_size, corpus.num_docs)))
+            began = time.perf_counter()
+            indexer.add_batch(batch)
+            seconds += time.perf_counter() - began
+    stats = _write_stats(corpus.num_docs, seconds, indexer)
+    stats['db_size_bytes'] = database_size(db_path)
+    return stats
+
+
+def run_upsert(corpus: Corpus, db_path: str, fraction: float, batch_size: int, indexer_options: dict) -> dict:
+    """
+    Re-adds a random fraction of the indexed pages in add_batch calls: half of them
+    re-crawled with changed text (rewritten), half unchanged (the on_unchanged path).
+    """
+    rng = corpus._rng('upsert')
+    ids = rng.sample(range(corpus.num_docs), int(corpus.num_docs * fraction))
+    seconds = 0.0
+    with Indexer(db_path=db_path, **indexer_options) as indexer:
+        for start in range(0, len(ids), batch_size):
+            batch = [corpus.document(i, revision=1 if n % 2 == 0 else 0)
+                     for n, i in enumerate(ids[start:start + batch_size], start)]
+            began = time.perf_counter()
+            indexer.add_batch(batch)
+            seconds += time.perf_counter() - began
+    stats = _write_stats(len(ids), seconds, indexer)
+    stats['changed'] = (len(ids) + 1) // 2
+    stats['db_size_bytes'] = database_size(db_path)
+    return stats
+
+
+def run_search(corpus: Corpus, db_path: str, num_queries: int, limit: int, indexer_options: dict) -> dict:
+    """Uncached search() latency over the query mix, after a short warm-up."""
+    queries = corpus.queries(num_queries)
+    latencies = []
+    hits = 0
+    with Indexer(db_path=db_path, **dict(indexer_options, cache_size=0)) as indexer:
+        for query in queries[:min(50, num_queries)]:
+            indexer.search(query, limit=limit)
+        for query in queries:
+            start = time.perf_counter()
+            results = indexer.search(query, limit=limit)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += len(results)
+    latencies.sort()
+    total_seconds = sum(latencies) / 1000
+    return {
+        'queries': num_queries, 'limit': limit,
+        'p50_ms': round(percentile(latencies, 0.50), 3), 'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3), 'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        'queries_per_sec': round(num_queries / total_seconds, 1) if total_seconds else None,
+        'mean_hits': round(hits / num_queries, 2) if num_queries else 0.0, 'peak_rss_mib': peak_rss_mib(),
+    }
+
+
+def run_benchmark(corpus: Corpus, workloads=WORKLOADS, db_dir: str | None = None, single_docs: int = 2_000,
+                  batch_size: int = 500, upsert_fraction: float = 0.2, num_queries: int = 1_000, limit: int = 10,
+                  indexer_options: dict | None = None, keep: bool = False) -> dict:
+    """
+    Runs the selected workloads and returns the report dict. upsert and search run on the
+    index built by add_batch, which therefore always runs when either of them is selected.
+    """
+    indexer_options = dict(indexer_options or {})
+    work_dir = db_dir or tempfile.mkdtemp(prefix='aisans-bench-')
+    os.makedirs(work_dir, exist_ok=True)
+    report = {
+        'config': {'docs': corpus.num_docs, 'seed': corpus.seed, 'vocabulary_size': len(corpus.vocabulary),
+                   'body_words': corpus.body_words, 'single_docs': min(single_docs, corpus.num_docs),
+                   'batch_size': batch_size, 'upsert_fraction': upsert_fraction, 'queries': num_queries,
+                   'workloads': list(workloads), 'indexer_options': indexer_options},
+        'environment': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                        'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'workloads': {}, 'db_size_bytes': None, 'peak_rss_mib': None,
+    }
+    batch_db = os.path.join(work_dir, 'bench_batch.db')
+    try:
+        if 'add_document' in workloads:
+            report['workloads']['add_document'] = run_add_document(
+                corpus, os.path.join(work_dir, 'bench_single.db'), min(single_docs, corpus.num_docs), indexer_options)
+        if {'add_batch', 'upsert', 'search'} & set(workloads):
+            report['workloads']['add_batch'] = run_add_batch(corpus, batch_db, batch_size, indexer_options)
+        if 'upsert' in workloads:
+            report['workloads']['upsert'] = run_upsert(corpus, batch_db, upsert_fraction, batch_size, indexer_options)
+        if 'search' in workloads:
+            report['workloads']['search'] = run_search(corpus, batch_db, num_queries, limit, indexer_options)
+        if os.path.exists(batch_db):
+            report['db_size_bytes'] = database_size(batch_db)
+        report['peak_rss_mib'] = peak_rss_mib()
+    finally:
+        if not keep:
+            if db_dir is None:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            else:
+                for name in ('bench_single.db', 'bench_batch.db'):
+                    for suffix in ('', '-wal', '-shm', '-journal', '.vectors'):
+                        path = os.path.join(work_dir, name + suffix)
+                        if os.path.exists(path):
+                            os.remove(path)
+    return report
+
+
+def main():
+    """
+    Benchmarks the indexer on a seeded synthetic corpus and prints a JSON report.
+
+    The same --seed and sizes always produce the same documents and queries, so reports
+    from two revisions (or machines) can be compared directly, e.g. in CI:
+        python scripts/benchmark_indexer.py --size 10k --output before.json
+    """
+    arg_parser = argparse.ArgumentParser(description="Benchmark the AISANS indexer on a synthetic corpus.")
+    arg_parser.add_argument("--size", choices=SIZES, default="10k", help="Corpus size preset (default: 10k).")
+    arg_parser.add_argument("--docs", type=int, help="Corpus size in documents (overrides --size).")
+    arg_parser.add_argument("--seed", type=int, default=42, help="Corpus and query seed.")
+    arg_parser.add_argument("--vocabulary", type=int, default=50_000, help="Distinct words in the corpus.")
+    arg_parser.add_argument("--zipf", type=float, default=1.07, help="Zipf exponent of word frequencies.")
+    arg_parser.add_argument("--body-words", type=int, default=300, help="Median-ish body length in words.")
+    arg_parser.add_argument("--workloads", default=','.join(WORKLOADS),
+                            help=f"Comma-separated subset of {', '.join(WORKLOADS)}.")
+    arg_parser.add_argument("--single-docs", type=int, default=2_000,
+                            help="Documents for the add_document workload (one transaction each).")
+    arg_parser.add_argument("--batch-size", type=int, default=500, help="Documents per add_batch call.")
+    arg_parser.add_argument("--upsert-fraction", type=float, default=0.2,
+                            help="Share of the corpus re-added by the upsert workload.")
+    arg_parser.add_argument("--queries", type=int, default=1_000, help="Queries for the search workload.")
+    arg_parser.add_argument("--limit", type=int, default=10, help="Results per query.")
+    arg_parser.add_argument("--wal", action="store_true", help="Open the index in WAL mode.")
+    arg_parser.add_argument("--near-duplicates", choices=Indexer.NEAR_DUPLICATE_MODES, default="cluster",
+                            help="Near-duplicate handling while indexing.")
+    arg_parser.add_argument("--db-dir", help="Directory for the benchmark databases (default: a temporary one).")
+    arg_parser.add_argument("--keep", action="store_true", help="Keep the benchmark databases afterwards.")
+    arg_parser.add_argument("--output", help="Also write the JSON report to this file.")
+    args = arg_parser.parse_args()
+
+    workloads = [name.strip() for name in args.workloads.split(',') if name.strip()]
+    unknown = set(workloads) - set(WORKLOADS)
+    if unknown:
+        arg_parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+
+    corpus = Corpus(args.docs or SIZES[args.size], seed=args.seed, vocabulary_size=args.vocabulary,
+                    zipf_exponent=args.zipf, body_words=args.body_words)
+    report = run_benchmark(corpus, workloads, db_dir=args.db_dir, single_docs=args.single_docs,
+                           batch_size=args.batch_size, upsert_fraction=args.upsert_fraction,
+                           num_queries=args.queries, limit=args.limit,
+                           indexer_options={'wal': args.wal, 'near_duplicates': args.near_duplicates},
+                           keep=args.keep)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import json
+import os
+import sys
+
+# Add project root to sys.path to allow imports from aisans package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aisans.indexer.indexer import Indexer
+
+DEFAULT_DB_PATH = "aisans_index.db"
+
+
+def main():
+    """
+    Runs FTS5 index maintenance on an index database and prints before/after stats as JSON.
+
+    Without flags this performs one incremental merge, which is safe to run while a crawl
+    is writing. Use --optimize (and optionally --vacuum) during off-hours.
+    """
+    arg_parser = argparse.ArgumentParser(description="Merge, optimize and vacuum an AISANS index database.")
+    arg_parser.add_argument("db_path", nargs="?", default=os.getenv("AISANS_DB_PATH", DEFAULT_DB_PATH),
+                            help="Index database (default: AISANS_DB_PATH or aisans_index.db).")
+    arg_parser.add_argument("--merge-pages", type=int, default=500,
+                            help="Work budget for the incremental merge, in pages written (0 to skip).")
+    arg_parser.add_argument("--optimize", action="store_true", help="Merge the whole index into a single segment.")
+    arg_parser.add_argument("--vacuum", action="store_true", help="VACUUM the database file afterwards.")
+    arg_parser.add_argument("--automerge", type=int, default=None,
+                            help="Persistently set the FTS5 automerge threshold (0 disables automatic merges).")
+    arg_parser.add_argument("--rebuild-vectors", action="store_true",
+                            help="(Re)compute the semantic vectors of every page, enabling hybrid search (requires numpy).")
+    args = arg_parser.parse_args()
+
+    db_path = os.path.abspath(args.db_path)
+    if not os.path.exists(db_path):
+        print(f"Error: Index database '{db_path}' not found.")
+        return
+
+    with Indexer(db_path=db_path, cache_size=0, semantic=args.rebuild_vectors) as indexer:
+        stats = indexer.maintain(merge_pages=args.merge_pages, optimize=args.optimize,
+                                 vacuum=args.vacuum, automerge=args.automerge)
+        if args.rebuild_vectors:
+            stats['vectors_encoded'] = indexer.rebuild_vectors()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+# Add project root to sys.path to allow imports from aisans package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aisans.indexer.indexer import Indexer
+from aisans.indexer.storage import BODY_CODEC, SCHEMA_VERSION
+
+DEFAULT_DB_PATH = "aisans_index.db"
+
+
+def database_size(db_path: str) -> int:
+    """Size of the database including any WAL/journal file, in bytes."""
+    return sum(os.path.getsize(db_path + suffix)
+               for suffix in ('', '-wal', '-journal') if os.path.exists(db_path + suffix))
+
+
+def schema_version(db_path: str) -> int:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def main():
+    """
+    Upgrades an index database to the current schema and reports the size delta.
+
+    Indexer migrates older files automatically when it opens them; this script does
+    the same thing offline, then VACUUMs so the space freed by the old layout is
+    returned to the filesystem.
+    """
+    arg_parser = argparse.ArgumentParser(description="Migrate an AISANS index database to the current schema.")
+    arg_parser.add_argument("db_path", nargs="?", default=os.getenv("AISANS_DB_PATH", DEFAULT_DB_PATH),
+                            help="Index database to migrate (default: AISANS_DB_PATH or aisans_index.db).")
+    arg_parser.add_argument("--no-vacuum", action="store_true",
+                            help="Skip VACUUM; the file keeps its old size until the free pages are reused.")
+    args = arg_parser.parse_args()
+
+    db_path = os.path.abspath(args.db_path)
+    if not os.path.exists(db_path):
+        print(f"Error: Index database '{db_path}' not found.")
+        return
+
+    version_before = schema_version(db_path)
+    size_before = database_size(db_path)
+    print(f"Database: {db_path}")
+    print(f"Schema version: {version_before} (current: {SCHEMA_VERSION}), size: {size_before / 1e6:.2f} MB")
+    if version_before >= SCHEMA_VERSION:
+        print("Already up to date.")
+        return
+
+    print(f"Migrating (new bodies are compressed with {BODY_CODEC})...")
+    started = time.perf_counter()
+    indexer = Indexer(db_path=db_path, cache_size=0)
+    try:
+        migrate_seconds = time.perf_counter() - started
+        documents = indexer.conn.execute("SELECT COUNT(*) FROM page_meta").fetchone()[0]
+        if not args.no_vacuum:
+            indexer.conn.execute("VACUUM")
+    finally:
+        indexer.close()
+    total_seconds = time.perf_counter() - started
+
+    version_after = schema_version(db_path)
+    size_after = database_size(db_path)
+    if version_after < SCHEMA_VERSION:
+        print(f"Migration failed; the database is still at schema version {version_after}.")
+        return
+
+    rate = documents / migrate_seconds if migrate_seconds > 0 else 0.0
+    print(f"Migrated {documents} documents in {migrate_seconds:.2f}s ({rate:.0f} docs/sec); total with VACUUM {total_seconds:.2f}s.")
+    delta = size_after - size_before
+    percent = 100.0 * delta / size_before if size_before else 0.0
+    print(f"Size: {size_before / 1e6:.2f} MB -> {size_after / 1e6:.2f} MB ({delta / 1e6:+.2f} MB, {percent:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import sys
+
+# Add project root to sys.path to allow imports from aisans package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aisans.indexer.bulk import bulk_build
+from aisans.indexer.indexer import Indexer
+from aisans.indexer.storage import iter_pages
+
+DEFAULT_DB_PATH = "aisans_index.db"
+
+
+def read_jsonl(path: str):
+    """Yields one document dict per non-empty line of a JSON Lines file ('-' reads stdin)."""
+    handle = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        for line_number, line in enumerate(handle, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping line {line_number} of {path}: {e}")
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def main():
+    """
+    Rebuilds an index database offline and swaps it over the live file.
+
+    Documents come from a JSON Lines dump (one document dict per line, same fields as
+    Indexer.add_document) or from an existing index (--from-index, which may be the
+    target itself). Searches keep working on the old file during the build; stop the
+    crawler first, since anything it writes to the old file is lost at the swap.
+    """
+    arg_parser = argparse.ArgumentParser(description="Bulk-build an AISANS index and atomically replace the live one.")
+    arg_parser.add_argument("dump", nargs="?", help="JSON Lines file of documents, or '-' for stdin.")
+    arg_parser.add_argument("--from-index", metavar="PATH", help="Read the documents from an existing index instead.")
+    arg_parser.add_argument("--db-path", default=os.getenv("AISANS_DB_PATH", DEFAULT_DB_PATH),
+                            help="Index database to replace (default: AISANS_DB_PATH or aisans_index.db).")
+    arg_parser.add_argument("--chunk-size", type=int, default=5000, help="Documents per transaction.")
+    arg_parser.add_argument("--cache-mib", type=int, default=256, help="SQLite page cache of the build, in MiB.")
+    arg_parser.add_argument("--wal", action="store_true", help="Leave the new index in WAL mode.")
+    arg_parser.add_argument("--near-duplicates", choices=Indexer.NEAR_DUPLICATE_MODES, default="cluster",
+                            help="Near-duplicate handling during the build ('off' is fastest).")
+    arg_parser.add_argument("--semantic", action="store_true",
+                            help="Also build semantic vectors for hybrid search (requires numpy).")
+    args = arg_parser.parse_args()
+
+    if (args.dump is None) == (args.from_index is None):
+        arg_parser.error("give either a dump file or --from-index")
+
+    source = None
+    if args.from_index:
+        if not os.path.exists(args.from_index):
+            print(f"Error: Index database '{args.from_index}' not found.")
+            return
+        source = Indexer.open_readonly(args.from_index, cache_size=0)
+        if not source.conn:
+            print(f"Failed to open {args.from_index}.")
+            return
+        documents = iter_pages(source.conn.cursor())
+    else:
+        if args.dump != '-' and not os.path.exists(args.dump):
+            print(f"Error: Dump file '{args.dump}' not found.")
+            return
+        documents = read_jsonl(args.dump)
+
+    try:
+        stats = bulk_build(documents, args.db_path, chunk_size=args.chunk_size, page_cache_mib=args.cache_mib,
+                           wal=args.wal, near_duplicates=args.near_duplicates, semantic=args.semantic)
+    finally:
+        if source is not None:
+            source.close()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import sys
 import os # For environment variable checking
 import datetime
-from collections import deque
+import time
 import urllib.parse # Added for urljoin
 import json # Import json for config loading
 import logging # Import logging module
@@ -9,9 +9,12 @@ import logging # Import logging module
 # Add project root to sys.path to allow imports from aisans package
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from aisans.crawler.crawler import fetch_url_content
+from aisans.crawler import async_crawler
+from aisans.crawler.crawler import Fetcher, robot_parsers_cache
 from aisans.crawler.parser import parse_html_content
+from aisans.crawler.scheduler import HostScheduler
 from aisans.indexer.indexer import Indexer
+from aisans.indexer.sharded import ShardedIndexer
 from aisans.llm.client import LLMClient # Import LLMClient
 from aisans.metasearch.core import search_all_engines # Import Metasearch
 
@@ -24,7 +27,27 @@ DEFAULT_CONFIG = {
     "METASEARCH_INTERVAL": 20,
     "MAX_METASEARCH_RESULTS_PER_ENGINE": 2,
     "METASEARCH_QUERY_USE_LLM_SUMMARY": True,
-    "SEED_FILE_PATH": "config/seeds.txt"
+    "SEED_FILE_PATH": "config/seeds.txt",
+    "INDEXER_WRITE_BEHIND": True,
+    "INDEXER_WRITE_QUEUE_SIZE": 1000,
+    "INDEXER_WAL": True,
+    "INDEX_SHARDS": 1,
+    "INDEXER_ON_UNCHANGED": "touch",
+    "INDEXER_NEAR_DUPLICATES": "cluster",
+    "INDEXER_SEMANTIC": False,
+    "INDEX_MAINTENANCE_INTERVAL": 500,
+    "INDEX_MAINTENANCE_MERGE_PAGES": 500,
+    "FETCHER_POOL_HOSTS": 100,
+    "FETCHER_POOL_PER_HOST": 10,
+    "CRAWL_ENGINE": "sync",
+    "ASYNC_MAX_CONCURRENCY": 200,
+    "ASYNC_PER_HOST_CONCURRENCY": 1,
+    "CRAWL_DEFAULT_DELAY": 1.0,
+    "CRAWL_MAX_QUEUE_PER_HOST": 1000,
+    "ROBOTS_CACHE_PATH": None, # None: next to the index, <db_path>.robots
+    "ROBOTS_CACHE_MAX_ENTRIES": 10000,
+    "ROBOTS_CACHE_TTL": 86400,
+    "ROBOTS_CACHE_ERROR_TTL": 300
 }
 CONFIG_FILE_PATH = "config/crawler_config.json"
 LOG_FILE = "crawler.log"
@@ -52,6 +75,45 @@ def load_config():
         logging.warning(f"Error decoding {CONFIG_FILE_PATH}. Using default settings.")
     return config
 
+def fetch_pages(fetcher, urls_to_visit, visited_urls, max_pages):
+    """
+    Yields (url, depth, html_content or None) for up to max_pages unvisited URLs taken from the
+    HostScheduler urls_to_visit, fetching one at a time and sleeping while no host is ready.
+    Same contract as AsyncCrawlEngine.pages.
+    """
+    pages_fetched = 0
+    while urls_to_visit and pages_fetched < max_pages:
+        entry = urls_to_visit.next_ready()
+        if entry is None:
+            time.sleep(urls_to_visit.wait_time()) # Every queued host was requested within its delay
+            continue
+        current_url, current_depth = entry
+
+        if current_url in visited_urls:
+            logging.debug(f"Skipping already visited URL: {current_url}")
+            urls_to_visit.release(current_url)
+            continue
+
+        visited_urls.add(current_url)
+        pages_fetched += 1
+        html_content = fetcher.fetch(current_url) # Already logs its own errors
+        urls_to_visit.release(current_url)
+        yield current_url, current_depth, html_content
+
+def create_fetch_engine(config):
+    """The (Fetcher or AsyncCrawlEngine) selected by CRAWL_ENGINE ("sync" or "async")."""
+    if config["CRAWL_ENGINE"] == "async":
+        if async_crawler.aiohttp is not None:
+            logging.info(f"Using the asyncio crawl engine: up to {config['ASYNC_MAX_CONCURRENCY']} requests in flight, "
+                         f"{config['ASYNC_PER_HOST_CONCURRENCY']} per host.")
+            return async_crawler.AsyncCrawlEngine(max_concurrency=config["ASYNC_MAX_CONCURRENCY"],
+                                                  per_host=config["ASYNC_PER_HOST_CONCURRENCY"])
+        logging.warning("CRAWL_ENGINE is 'async' but aiohttp is not installed. Falling back to sequential fetching.")
+    elif config["CRAWL_ENGINE"] != "sync":
+        logging.warning(f"Unknown CRAWL_ENGINE '{config['CRAWL_ENGINE']}'. Using sequential fetching.")
+    # One keep-alive session for the whole crawl: pages of a host reuse its open connections.
+    return Fetcher(pool_hosts=config["FETCHER_POOL_HOSTS"], pool_per_host=config["FETCHER_POOL_PER_HOST"])
+
 def main():
     """
     Main function to read seed URLs, fetch, parse, index, and print content,
@@ -61,8 +123,29 @@ def main():
     setup_logging() # Setup logging first
     config = load_config()
 
-    indexer = Indexer()  # Initialize Indexer
-    urls_to_visit = deque()
+    # With write-behind enabled, add_document only enqueues; commits happen on the indexer's writer thread.
+    indexer_options = dict(write_behind=config["INDEXER_WRITE_BEHIND"],
+                           write_queue_size=config["INDEXER_WRITE_QUEUE_SIZE"],
+                           wal=config["INDEXER_WAL"],
+                           on_unchanged=config["INDEXER_ON_UNCHANGED"],
+                           near_duplicates=config["INDEXER_NEAR_DUPLICATES"],
+                           semantic=config["INDEXER_SEMANTIC"])
+    if config["INDEX_SHARDS"] > 1:
+        # Documents are spread over INDEX_SHARDS files by URL hash; keep the value fixed for an existing index.
+        indexer = ShardedIndexer(num_shards=config["INDEX_SHARDS"], **indexer_options)
+    else:
+        indexer = Indexer(**indexer_options)
+    # robots.txt answers survive restarts in ROBOTS_CACHE_PATH (by default next to the index; "" keeps them in memory only).
+    robots_cache_path = config["ROBOTS_CACHE_PATH"]
+    if robots_cache_path is None:
+        robots_cache_path = indexer.db_path + ".robots"
+    robot_parsers_cache.configure(max_entries=config["ROBOTS_CACHE_MAX_ENTRIES"], ttl=config["ROBOTS_CACHE_TTL"],
+                                  error_ttl=config["ROBOTS_CACHE_ERROR_TTL"], path=robots_cache_path or None)
+    fetcher = create_fetch_engine(config)
+    # Frontier: URLs are taken host by host, each host paced by its robots.txt Crawl-delay/Request-rate.
+    urls_to_visit = HostScheduler(default_delay=config["CRAWL_DEFAULT_DELAY"],
+                                  max_queue_per_host=config["CRAWL_MAX_QUEUE_PER_HOST"],
+                                  max_in_flight_per_host=config["ASYNC_PER_HOST_CONCURRENCY"])
     visited_urls = set()
     pages_crawled = 0
     pages_since_last_metasearch = 0 # Initialize metasearch counter
@@ -107,24 +190,22 @@ def main():
             return
 
         for seed_url in seed_urls:
-            urls_to_visit.append((seed_url, 0))
+            urls_to_visit.add(seed_url, 0)
 
         logging.info(f"Starting crawl. Max depth: {config['MAX_DEPTH']}, Max pages: {config['MAX_PAGES']}. Initial queue size: {len(urls_to_visit)}")
 
-        while urls_to_visit and pages_crawled < config["MAX_PAGES"]:
-            current_url, current_depth = urls_to_visit.popleft()
-
-            if current_url in visited_urls:
-                logging.debug(f"Skipping already visited URL: {current_url}")
-                continue
+        if isinstance(fetcher, async_crawler.AsyncCrawlEngine):
+            # Pages arrive in completion order while later URLs are still being fetched.
+            fetched_pages = fetcher.pages(urls_to_visit, visited_urls, config["MAX_PAGES"])
+        else:
+            fetched_pages = fetch_pages(fetcher, urls_to_visit, visited_urls, config["MAX_PAGES"])
 
-            visited_urls.add(current_url)
+        for current_url, current_depth, html_content in fetched_pages:
             pages_crawled += 1
 
             logging.info(f"Processing URL (depth {current_depth}, {pages_crawled}/{config['MAX_PAGES']}): {current_url}")
 
             try:
-                html_content = fetch_url_content(current_url) # Already logs its own errors
                 if not html_content:
                     logging.warning(f"No content fetched for {current_url}. Skipping further processing.")
                     continue
@@ -147,7 +228,7 @@ def main():
                         else:
                             logging.warning(f"LLM generated no summary for {current_url}.")
                     except Exception as e:
-                logging.warning(f"LLM summarization failed for {current_url}: {e}", exc_info=True) # Added exc_info
+                        logging.warning(f"LLM summarization failed for {current_url}: {e}", exc_info=True) # Added exc_info
 
                 snippet = text_content[:200] + '...' if len(text_content) > 200 else text_content
                 doc_data = {
@@ -174,8 +255,8 @@ def main():
                     logging.debug(f"Found {len(extracted_links)} links on {current_url}. Enqueuing valid links.")
                     for link in extracted_links:
                         absolute_link = urllib.parse.urljoin(current_url, link)
-                        if absolute_link not in visited_urls and not any(item[0] == absolute_link for item in urls_to_visit):
-                            urls_to_visit.append((absolute_link, current_depth + 1))
+                        # add() refuses URLs already queued, and any beyond the host's queue limit.
+                        if absolute_link not in visited_urls and urls_to_visit.add(absolute_link, current_depth + 1):
                             logging.debug(f"Enqueued: {absolute_link} (depth {current_depth + 1})")
                 else:
                     logging.info(f"Reached max depth ({config['MAX_DEPTH']}) for URL: {current_url}. Not adding further links from this page.")
@@ -185,6 +266,11 @@ def main():
 
             pages_since_last_metasearch += 1
 
+            # Periodic incremental FTS5 merge so query latency does not drift during long crawls.
+            if config["INDEX_MAINTENANCE_INTERVAL"] and pages_crawled % config["INDEX_MAINTENANCE_INTERVAL"] == 0:
+                maintenance = indexer.maintain(merge_pages=config["INDEX_MAINTENANCE_MERGE_PAGES"])
+                logging.info(f"Index maintenance: {maintenance['segments_before']} -> {maintenance['segments_after']} FTS5 segments.")
+
             # Metasearch for seed expansion
             if config["ENABLE_METASEARCH"] and pages_since_last_metasearch >= config["METASEARCH_INTERVAL"] and pages_crawled > 0:
                 logging.info(f"--- Triggering Metasearch (crawled {pages_crawled}, interval {config['METASEARCH_INTERVAL']}) ---")
@@ -214,9 +300,8 @@ def main():
                             new_links_added_count = 0
                             for result in meta_results:
                                 new_url = result.get('url')
-                                if new_url and new_url not in visited_urls and not any(item[0] == new_url for item in urls_to_visit):
+                                if new_url and new_url not in visited_urls and urls_to_visit.add(new_url, 0):
                                     logging.info(f"Adding new URL from metasearch to queue: {new_url} (depth 0)")
-                                    urls_to_visit.append((new_url, 0))
                                     new_links_added_count +=1
                             if new_links_added_count > 0:
                                 logging.info(f"Added {new_links_added_count} new unique URLs to queue from metasearch.")
@@ -231,14 +316,20 @@ def main():
 
             # Removed the print("-" * 50) as logging provides separators/timestamps.
 
-        logging.info(f"Crawling finished. Total pages visited: {pages_crawled}. URLs remaining in queue: {len(urls_to_visit)}")
+        logging.info(f"Crawling finished. Total pages visited: {pages_crawled}. URLs remaining in queue: {len(urls_to_visit)}"
+                     f" (dropped over the per-host queue limit: {urls_to_visit.dropped})")
 
     except Exception as e: # Catch-all for errors at the main level (e.g., indexer init, config issues not caught by load_config)
         logging.critical(f"A critical error occurred in the main crawler execution: {e}", exc_info=True)
     finally:
+        fetcher.close()
+        robot_parsers_cache.close()
         try:
-            indexer.close() # indexer.close() should ideally have its own internal logging for errors
+            indexer.close() # Drains the write-behind queue before closing; logs its own errors
             logging.info("Indexer closed successfully.")
+            # Counted at commit time, so only complete after close() has drained the queue.
+            logging.info(f"Index writes avoided (page content unchanged since the last crawl): {indexer.writes_avoided}")
+            logging.info(f"Near-duplicate pages found ({config['INDEXER_NEAR_DUPLICATES']}): {indexer.near_duplicates_found}")
         except Exception as e:
             logging.error(f"Error closing indexer: {e}", exc_info=True)
 
@@ -1,10 +1,13 @@
+import argparse
 import sys
 import os
+import sqlite3
 
 # Add project root to sys.path to allow imports from aisans package
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from aisans.indexer.indexer import Indexer
+from aisans.indexer.sharded import ShardedIndexer, shard_paths
 
 # Define the path to the database file.
 # For consistency, let's assume it's in the project root or a 'data' subfolder.
@@ -13,20 +16,32 @@ from aisans.indexer.indexer import Indexer
 DEFAULT_DB_PATH = "aisans_index.db"
 
 def main():
+    arg_parser = argparse.ArgumentParser(description="Interactively search an AISANS index.")
+    arg_parser.add_argument("--autocorrect", action="store_true",
+                            help="Correct misspelled words from the index vocabulary before searching.")
+    args = arg_parser.parse_args()
+
     db_path = os.getenv("AISANS_DB_PATH", DEFAULT_DB_PATH)
     # Ensure the path is absolute for clarity, especially if running from different dirs
     db_path_abs = os.path.abspath(db_path)
+    # Must match INDEX_SHARDS in the crawler config that built the index.
+    num_shards = int(os.getenv("AISANS_INDEX_SHARDS", "1"))
+    first_file = shard_paths(db_path_abs, num_shards)[0] if num_shards > 1 else db_path_abs
 
-
-    if not os.path.exists(db_path_abs):
-        print(f"Error: Index database '{db_path_abs}' not found.")
+    if not os.path.exists(first_file):
+        print(f"Error: Index database '{first_file}' not found.")
         print("Please run a script (e.g., crawler or meta-search with indexing enabled) to create and populate the index,")
         print("or ensure AISANS_DB_PATH environment variable is set correctly if using a custom path.")
         return
 
     try:
-        # Using the Indexer as a context manager
-        with Indexer(db_path=db_path_abs) as indexer:
+        # Searching never writes: open the index read-only and memory-mapped.
+        if num_shards > 1:
+            index = ShardedIndexer(db_path=db_path_abs, num_shards=num_shards, read_only=True, mmap_size=1 << 30,
+                                   page_cache_mib=64)
+        else:
+            index = Indexer.open_readonly(db_path_abs)
+        with index as indexer:
             if not indexer.conn: # Check if connection was successful within Indexer's init
                 print(f"Failed to connect to the database at {db_path_abs}. Please check the file and permissions.")
                 return
@@ -42,7 +57,14 @@ def main():
                     if user_query.lower() == 'quit':
                         break
 
-                    results = indexer.search(query_string=user_query, limit=10)
+                    if args.autocorrect:
+                        corrected = indexer.correct_query(user_query)
+                        if corrected:
+                            print(f"Showing results for '{corrected}' instead of '{user_query}'.")
+                            user_query = corrected
+
+                    # Same as search() unless the index has semantic vectors.
+                    results = indexer.hybrid_search(user_query, limit=10)
 
                     if results:
                         print(f"\n--- Found {len(results)} results for '{user_query}' ---")
@@ -57,6 +79,9 @@ def main():
                             print("-" * 20)
                     else:
                         print(f"No results found for '{user_query}'.")
+                        corrected = None if args.autocorrect else indexer.correct_query(user_query)
+                        if corrected:
+                            print(f"Did you mean '{corrected}'?")
                 except KeyboardInterrupt:
                     print("\nExiting search loop...")
                     break # Exit while loop
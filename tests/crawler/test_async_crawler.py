@@ -0,0 +1,179 @@
+import asyncio
+import http.server
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# Add project root to sys.path to allow imports from aisans package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from aisans.crawler import async_crawler
+from aisans.crawler.async_crawler import AsyncCrawlEngine, AsyncFetcher
+from aisans.crawler.crawler import robot_parsers_cache
+from aisans.crawler.scheduler import HostScheduler
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay)
+            if self.path == "/robots.txt":
+                status, body = server.robots
+            else:
+                status, body = 200, f"<html><body>{self.path}</body></html>"
+            body = body.encode()
+            # One write: separate header and body segments stall on delayed ACKs.
+            self.wfile.write(b"HTTP/1.1 %d X\r\nContent-Length: %d\r\n\r\n" % (status, len(body)) + body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(robots=(200, "User-agent: *\nDisallow: /private/"), delay=0.0):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.robots, server.delay = robots, delay
+    server.lock = threading.Lock()
+    server.requests, server.active, server.max_active = [], 0, 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+@unittest.skipIf(async_crawler.aiohttp is None, "aiohttp is not installed")
+class TestAsyncFetcher(unittest.TestCase):
+    def setUp(self):
+        robot_parsers_cache.clear()
+        self.servers = []
+        self.print_patch = patch('builtins.print')
+        self.print_patch.start()
+
+    def tearDown(self):
+        self.print_patch.stop()
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def _server(self, **kwargs):
+        server, base = start_server(**kwargs)
+        self.servers.append(server)
+        return server, base
+
+    def test_fetch_respects_robots_and_shares_cache(self):
+        server, base = self._server()
+
+        async def run():
+            async with AsyncFetcher() as fetcher:
+                return await asyncio.gather(fetcher.fetch(base + "/a"), fetcher.fetch(base + "/private/b"),
+                                            fetcher.fetch(base + "/c"))
+
+        self.assertEqual(asyncio.run(run()), ["<html><body>/a</body></html>", None, "<html><body>/c</body></html>"])
+        self.assertEqual(server.requests.count("/robots.txt"), 1)
+        self.assertNotIn("/private/b", server.requests)
+        self.assertIn(base.split("//")[1], robot_parsers_cache)
+
+    def test_concurrent_requests_to_new_host_fetch_robots_once(self):
+        server, base = self._server(delay=0.05)
+
+        async def run():
+            async with AsyncFetcher(per_host=8) as fetcher:
+                return await asyncio.gather(*(fetcher.fetch(f"{base}/{i}") for i in range(8)))
+
+        self.assertTrue(all(asyncio.run(run())))
+        self.assertEqual(server.requests.count("/robots.txt"), 1)
+
+    def test_robots_client_error_allows(self):
+        server, base = self._server(robots=(404, ""))
+
+        async def run():
+            async with AsyncFetcher() as fetcher:
+                return await fetcher.fetch(base + "/private/x")
+
+        self.assertEqual(asyncio.run(run()), "<html><body>/private/x</body></html>")
+
+    def test_per_host_and_global_limits(self):
+        (slow, slow_base), (other, other_base) = self._server(delay=0.05), self._server(delay=0.05)
+
+        async def run():
+            async with AsyncFetcher(max_concurrency=8, per_host=2) as fetcher:
+                urls = [f"{slow_base}/s{i}" for i in range(8)] + [f"{other_base}/o{i}" for i in range(8)]
+                results = await asyncio.gather(*(fetcher.fetch(url) for url in urls))
+                return results, fetcher._host_slots
+
+        results, host_slots = asyncio.run(run())
+        self.assertTrue(all(results))
+        self.assertEqual(slow.max_active, 2)
+        self.assertEqual(other.max_active, 2)
+        self.assertEqual(host_slots, {}) # Released slots of idle hosts are dropped
+
+
+@unittest.skipIf(async_crawler.aiohttp is None, "aiohttp is not installed")
+class TestAsyncCrawlEngine(unittest.TestCase):
+    def setUp(self):
+        robot_parsers_cache.clear()
+        self.print_patch = patch('builtins.print')
+        self.print_patch.start()
+        self.server, self.base = start_server(delay=0.01)
+
+    def tearDown(self):
+        self.print_patch.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_pages_follows_appended_urls_up_to_max_pages(self):
+        urls_to_visit = HostScheduler(default_delay=0, max_in_flight_per_host=2)
+        for url in (self.base + "/0", self.base + "/0", self.base + "/private/1"):
+            urls_to_visit.add(url, 0)
+        visited_urls = set()
+        seen = []
+        with AsyncCrawlEngine(max_concurrency=4, per_host=2) as engine:
+            for url, depth, content in engine.pages(urls_to_visit, visited_urls, max_pages=5):
+                seen.append((url, depth, content is not None))
+                if url == self.base + "/0":
+                    for i in range(4):
+                        urls_to_visit.add(f"{self.base}/{depth + 1}-{i}", depth + 1)
+
+        self.assertEqual(len(seen), 5)
+        self.assertIn((self.base + "/private/1", 0, False), seen)
+        self.assertEqual(sum(1 for url, _, _ in seen if url == self.base + "/0"), 1)
+        self.assertEqual(len(visited_urls), 5)
+        self.assertEqual(len(urls_to_visit), 1) # 4 distinct links queued, 3 taken
+
+    def test_pages_blocks_while_all_slots_are_busy(self):
+        server, base = start_server(delay=0.2)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        urls_to_visit = HostScheduler(default_delay=0, max_in_flight_per_host=10)
+        for i in range(6):
+            urls_to_visit.add(f"{base}/{i}", 0)
+        wait_time_calls = []
+        wait_time = urls_to_visit.wait_time
+        with patch.object(urls_to_visit, 'wait_time', side_effect=lambda: wait_time_calls.append(1) or wait_time()):
+            with AsyncCrawlEngine(max_concurrency=2, per_host=10) as engine:
+                pages = list(engine.pages(urls_to_visit, set(), max_pages=6))
+        self.assertEqual(len(pages), 6)
+        # The host stays ready throughout; polling it while both slots are busy would spin.
+        self.assertLess(len(wait_time_calls), 10)
+
+    def test_close_cancels_in_flight_fetches(self):
+        engine = AsyncCrawlEngine()
+        future = engine.submit(self.base + "/slow")
+        engine.close()
+        self.assertTrue(future.cancelled() or future.done())
+        engine.close() # Idempotent
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,6 @@
+import asyncio
+import threading
+import time
 import unittest
 from unittest.mock import patch, MagicMock
 import sys
@@ -6,7 +9,8 @@ import os
 # Add project root to sys.path to allow imports from aisans package
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from aisans.crawler.crawler import fetch_url_content, robot_parsers_cache, CRAWLER_USER_AGENT
+from aisans.crawler.crawler import (AsyncSingleFlight, Fetcher, SingleFlight, default_fetcher, fetch_url_content,
+                                   robot_parsers_cache, CRAWLER_USER_AGENT)
 import requests # For requests.exceptions
 
 # Helper for mock requests.get side_effect
@@ -34,7 +38,7 @@ class TestFetchUrlContent(unittest.TestCase):
         # Clear the cache before each test to ensure test isolation
         robot_parsers_cache.clear()
 
-    @patch('aisans.crawler.crawler.requests.get')
+    @patch('aisans.crawler.crawler.requests.Session.get')
     def test_successful_fetch_respects_robots_allow(self, mock_get):
         page_url = "http://example.com/allowedpage.html"
         robots_content = "User-agent: *\nAllow: /"
@@ -55,7 +59,7 @@ class TestFetchUrlContent(unittest.TestCase):
         self.assertEqual(mock_get.call_args_list[1][1]['headers']['User-Agent'], CRAWLER_USER_AGENT)
 
 
-    @patch('aisans.crawler.crawler.requests.get')
+    @patch('aisans.crawler.crawler.requests.Session.get')
     def test_http_error_for_page_after_robots_allow(self, mock_get):
         page_url = "http://example.com/notfound"
         robots_content = "User-agent: *\nAllow: /"
@@ -72,7 +76,7 @@ class TestFetchUrlContent(unittest.TestCase):
         self.assertEqual(mock_get.call_count, 2) # robots.txt (OK) + page (404)
 
 
-    @patch('aisans.crawler.crawler.requests.get')
+    @patch('aisans.crawler.crawler.requests.Session.get')
     def test_request_exception_for_page_after_robots_allow(self, mock_get):
         page_url = "http://example.com/timeout_page"
         robots_content = "User-agent: *\nAllow: /"
@@ -89,7 +93,7 @@ class TestFetchUrlContent(unittest.TestCase):
         self.assertEqual(mock_get.call_count, 2) # robots.txt (OK) + page (Exception)
 
     # New tests for robots.txt specific scenarios
-    @patch('aisans.crawler.crawler.requests.get')
+    @patch('aisans.crawler.crawler.requests.Session.get')
     def test_robots_disallows_fetch(self, mock_get):
         robots_url = "http://example.com/robots.txt"
         page_url = "http://example.com/private/page.html"
@@ -118,7 +122,7 @@ class TestFetchUrlContent(unittest.TestCase):
         mock_get.assert_called_once_with(robots_url, headers={"User-Agent": CRAWLER_USER_AGENT}, timeout=5)
 
 
-    @patch('aisans.crawler.crawler.requests.get')
+    @patch('aisans.crawler.crawler.requests.Session.get')
     def test_robots_allows_fetch(self, mock_get): # Similar to test_successful_fetch but more explicit
         robots_content = f"User-agent: {CRAWLER_USER_AGENT}\nAllow: /"
         page_url = "http://example.com/allowed/page.html"
@@ -134,7 +138,7 @@ class TestFetchUrlContent(unittest.TestCase):
         self.assertEqual(mock_get.call_args_list[0][0][0], "http://example.com/robots.txt")
         self.assertEqual(mock_get.call_args_list[1][0][0], page_url)
 
-    @patch('aisans.crawler.crawler.requests.get')
+    @patch('aisans.crawler.crawler.requests.Session.get')
     def test_robots_fetch_fails_allows_page_fetch(self, mock_get):
         page_url = "http://example.com/anotherpage.html"
         expected_page_content = "Content when robots fails"
@@ -165,7 +169,7 @@ class TestFetchUrlContent(unittest.TestCase):
         self.assertEqual(mock_get.call_args_list[1][0][0], page_url)
 
 
-    @patch('aisans.crawler.crawler.requests.get')
+    @patch('aisans.crawler.crawler.requests.Session.get')
     def test_robots_parser_caching(self, mock_get):
         robots_content = f"User-agent: {CRAWLER_USER_AGENT}\nDisallow:" # Allow all
         url1 = "http://example.com/page1.html"
@@ -210,5 +214,124 @@ class TestFetchUrlContent(unittest.TestCase):
                 robots_fetch_count += 1
         self.assertEqual(robots_fetch_count, 1, "robots.txt should only be fetched once due to caching")
 
+class TestFetcher(unittest.TestCase):
+    def setUp(self):
+        robot_parsers_cache.clear()
+
+    def test_session_pools_connections_and_negotiates_compression(self):
+        with Fetcher(pool_hosts=7, pool_per_host=3) as fetcher:
+            adapter = fetcher.session.get_adapter("https://example.com/")
+            self.assertIs(adapter, fetcher.session.get_adapter("http://example.com/"))
+            self.assertEqual(adapter._pool_connections, 7)
+            self.assertEqual(adapter._pool_maxsize, 3)
+            self.assertIn('gzip', fetcher.session.headers['Accept-Encoding'])
+
+    def test_fetch_url_content_reuses_one_session(self):
+        self.assertIs(default_fetcher(), default_fetcher())
+        with patch.object(default_fetcher().session, 'get') as mock_get, patch('builtins.print'):
+            mock_get.side_effect = mock_requests_get_side_effect_handler("User-agent: *\nAllow: /", "Page")
+            self.assertEqual(fetch_url_content("http://example.com/a"), "Page")
+            self.assertEqual(fetch_url_content("http://example.com/b"), "Page")
+        self.assertEqual([c[0][0] for c in mock_get.call_args_list],
+                         ["http://example.com/robots.txt", "http://example.com/a", "http://example.com/b"])
+
+    def test_custom_user_agent_is_sent_and_matched(self):
+        robots_content = "User-agent: OtherBot\nDisallow: /\n\nUser-agent: *\nAllow: /"
+        with Fetcher(user_agent="OtherBot") as fetcher, patch.object(fetcher.session, 'get') as mock_get, \
+                patch('builtins.print'):
+            mock_get.side_effect = mock_requests_get_side_effect_handler(robots_content, "Page")
+            self.assertIsNone(fetcher.fetch("http://example.com/page"))
+        mock_get.assert_called_once_with("http://example.com/robots.txt", headers={"User-Agent": "OtherBot"}, timeout=5)
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        robot_parsers_cache.clear()
+
+    def test_threads_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+            return "result"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("key", slow))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05) # Let every thread reach do()
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, ["result"] * 8)
+        self.assertEqual(flight.do("key", lambda: "again"), "again") # Finished calls are not reused
+
+    def test_errors_reach_every_waiter(self):
+        async def run():
+            flight = AsyncSingleFlight()
+            calls = []
+
+            async def failing():
+                calls.append(1)
+                await asyncio.sleep(0.01)
+                raise ValueError("boom")
+
+            results = await asyncio.gather(*(flight.do("key", failing) for _ in range(4)), return_exceptions=True)
+            return calls, results
+
+        calls, results = asyncio.run(run())
+        self.assertEqual(calls, [1])
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    def test_waiter_takes_over_from_cancelled_leader(self):
+        async def run():
+            flight = AsyncSingleFlight()
+            calls = []
+
+            async def fetch():
+                calls.append(1)
+                await asyncio.sleep(5 if len(calls) == 1 else 0.01) # The first leader is cancelled below
+                return "result"
+
+            leader = asyncio.create_task(flight.do("key", fetch))
+            await asyncio.sleep(0)
+            waiters = [asyncio.create_task(flight.do("key", fetch)) for _ in range(2)]
+            await asyncio.sleep(0)
+            leader.cancel()
+            results = await asyncio.gather(*waiters)
+            return calls, results, leader.cancelled()
+
+        calls, results, leader_cancelled = asyncio.run(run())
+        self.assertTrue(leader_cancelled)
+        self.assertEqual(calls, [1, 1]) # One waiter became the leader, the other waited for it
+        self.assertEqual(results, ["result"] * 2)
+
+    def test_threaded_fetchers_request_robots_once_per_host(self):
+        lock = threading.Lock()
+        robots_requests = []
+
+        def get(url, headers, timeout):
+            if url.endswith("/robots.txt"):
+                with lock:
+                    robots_requests.append(url)
+                time.sleep(0.05) # Keep the fetch in flight while the other threads miss the cache
+                return MagicMock(status_code=200, text="User-agent: *\nDisallow: /private/")
+            return MagicMock(status_code=200, text="Page")
+
+        results = []
+        with Fetcher() as fetcher, patch.object(fetcher.session, 'get', side_effect=get), patch('builtins.print'):
+            threads = [threading.Thread(target=lambda i=i: results.append(fetcher.fetch(f"http://example.com/{i}")))
+                       for i in range(8)]
+            threads.append(threading.Thread(target=lambda: results.append(fetcher.fetch("http://example.com/private/x"))))
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(robots_requests, ["http://example.com/robots.txt"])
+        self.assertEqual(sorted(results, key=str), [None] + ["Page"] * 8)
+
 if __name__ == '__main__':
     unittest.main()
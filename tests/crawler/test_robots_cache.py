@@ -0,0 +1,135 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import urllib.robotparser
+from unittest.mock import patch, MagicMock
+
+# Add project root to sys.path to allow imports from aisans package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import requests
+from aisans.crawler.crawler import Fetcher, robot_parsers_cache
+from aisans.crawler.robots_cache import RobotsCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def parser_for(text):
+    parser = urllib.robotparser.RobotFileParser("http://example.com/robots.txt")
+    parser.parse(text.splitlines())
+    return parser
+
+
+class TestRobotsCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "robots.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_dict_interface_and_lru_bound(self):
+        cache = RobotsCache(max_entries=2, clock=self.clock)
+        cache["a"] = parser_for("User-agent: *\nDisallow: /")
+        cache["b"] = None
+        self.assertIn("a", cache) # Also marks a as recently used
+        cache["c"] = None
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn("b", cache)
+        self.assertIsNone(cache["c"])
+        self.assertFalse(cache["a"].can_fetch("bot", "http://a/x"))
+        self.assertEqual(cache.get("b", "missing"), "missing")
+        with self.assertRaises(KeyError):
+            cache["b"]
+        del cache["a"]
+        self.assertNotIn("a", cache)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_ttls(self):
+        cache = RobotsCache(ttl=100, error_ttl=10, clock=self.clock)
+        cache.store("ok", parser_for("User-agent: *\nAllow: /"), text="User-agent: *\nAllow: /")
+        cache.store("down", None, error=True)
+        self.clock.now += 10
+        self.assertEqual(cache.lookup("down"), (False, None))
+        self.assertTrue(cache.lookup("ok")[0])
+        self.clock.now += 90
+        self.assertNotIn("ok", cache)
+
+    def test_persists_across_instances(self):
+        text = "User-agent: *\nDisallow: /private/\nCrawl-delay: 3"
+        cache = RobotsCache(ttl=100, error_ttl=10, path=self.path, clock=self.clock)
+        cache.store("example.com", parser_for(text), text=text)
+        cache.store("missing.com", None)
+        cache.store("memory-only.com", parser_for(text)) # No text: not persisted
+        cache.store("expiring.com", None, error=True)
+        cache.close()
+
+        self.clock.now += 50 # Past error_ttl, within ttl
+        reopened = RobotsCache(ttl=100, path=self.path, clock=self.clock)
+        parser = reopened["example.com"]
+        self.assertFalse(parser.can_fetch("bot", "http://example.com/private/x"))
+        self.assertTrue(parser.can_fetch("bot", "http://example.com/public"))
+        self.assertEqual(parser.crawl_delay("bot"), 3)
+        self.assertEqual(reopened.lookup("missing.com"), (True, None))
+        self.assertNotIn("memory-only.com", reopened)
+        count = reopened.conn.execute("SELECT COUNT(*) FROM robots").fetchone()[0]
+        self.assertEqual(count, 2) # The expired error entry was deleted on open
+        reopened.clear()
+        reopened.close()
+        self.assertNotIn("example.com", RobotsCache(path=self.path, clock=self.clock))
+
+
+class TestFetcherNegativeCaching(unittest.TestCase):
+    def setUp(self):
+        robot_parsers_cache.clear()
+
+    def tearDown(self):
+        robot_parsers_cache.clear()
+
+    def _responses(self, robots_status=None, robots_error=None):
+        def get(url, headers, timeout):
+            if url.endswith("/robots.txt"):
+                if robots_error:
+                    raise robots_error
+                return MagicMock(status_code=robots_status, text="")
+            return MagicMock(status_code=200, text="Page")
+        return get
+
+    def _robots_requests(self, mock_get):
+        return sum(1 for call in mock_get.call_args_list if call[0][0].endswith("/robots.txt"))
+
+    def test_client_error_is_cached_as_allow_all(self):
+        with Fetcher() as fetcher, patch.object(fetcher.session, 'get') as mock_get, patch('builtins.print'):
+            mock_get.side_effect = self._responses(robots_status=404)
+            self.assertEqual(fetcher.fetch("http://example.com/a"), "Page")
+            self.assertEqual(fetcher.fetch("http://example.com/b"), "Page")
+        self.assertEqual(self._robots_requests(mock_get), 1)
+        self.assertEqual(robot_parsers_cache.lookup("example.com"), (True, None))
+
+    def test_server_errors_and_timeouts_are_cached_briefly(self):
+        for responses in (self._responses(robots_status=503),
+                          self._responses(robots_error=requests.exceptions.Timeout("slow"))):
+            robot_parsers_cache.clear()
+            with Fetcher() as fetcher, patch.object(fetcher.session, 'get') as mock_get, patch('builtins.print'):
+                mock_get.side_effect = responses
+                fetcher.fetch("http://example.com/a")
+                fetcher.fetch("http://example.com/b")
+                self.assertEqual(self._robots_requests(mock_get), 1)
+                with patch.object(robot_parsers_cache, 'clock', return_value=robot_parsers_cache.clock()
+                                  + robot_parsers_cache.error_ttl + 1):
+                    fetcher.fetch("http://example.com/c")
+                self.assertEqual(self._robots_requests(mock_get), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import urllib.robotparser
+import sys
+import os
+
+# Add project root to sys.path to allow imports from aisans package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from aisans.crawler.crawler import robot_parsers_cache
+from aisans.crawler.scheduler import HostScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def cache_robots(netloc, text):
+    parser = urllib.robotparser.RobotFileParser()
+    parser.parse(text.splitlines())
+    robot_parsers_cache[netloc] = parser
+
+
+class TestHostScheduler(unittest.TestCase):
+    def setUp(self):
+        robot_parsers_cache.clear()
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        robot_parsers_cache.clear()
+
+    def _take(self, scheduler):
+        entry = scheduler.next_ready()
+        if entry is not None:
+            scheduler.release(entry[0])
+        return entry and entry[0]
+
+    def test_interleaves_hosts(self):
+        scheduler = HostScheduler(default_delay=1, clock=self.clock)
+        for i in range(3):
+            scheduler.add(f"http://a/{i}", 0)
+        scheduler.add("http://b/0", 0)
+        scheduler.add("http://c/0", 0)
+
+        self.assertEqual([self._take(scheduler) for _ in range(4)], ["http://a/0", "http://b/0", "http://c/0", None])
+        self.assertAlmostEqual(scheduler.wait_time(), 1)
+        self.clock.now += 1
+        self.assertEqual(self._take(scheduler), "http://a/1")
+        self.assertIsNone(self._take(scheduler))
+        self.assertEqual(len(scheduler), 1)
+
+    def test_crawl_delay_and_request_rate(self):
+        cache_robots("slow", "User-agent: *\nCrawl-delay: 10")
+        cache_robots("rate", "User-agent: *\nRequest-rate: 1/20")
+        cache_robots("fast", "User-agent: *\nCrawl-delay: 0.1")
+        scheduler = HostScheduler(default_delay=2, clock=self.clock)
+        self.assertEqual(scheduler.delay("slow"), 10)
+        self.assertEqual(scheduler.delay("rate"), 20)
+        self.assertEqual(scheduler.delay("fast"), 2) # Never faster than the default
+        self.assertEqual(scheduler.delay("unknown"), 2)
+
+        scheduler.add("http://slow/1", 0)
+        scheduler.add("http://slow/2", 0)
+        self.assertEqual(self._take(scheduler), "http://slow/1")
+        self.clock.now += 9.9
+        self.assertIsNone(scheduler.next_ready())
+        self.clock.now += 0.1
+        self.assertEqual(self._take(scheduler), "http://slow/2")
+
+    def test_delay_learned_from_robots_fetched_by_first_request(self):
+        scheduler = HostScheduler(default_delay=1, clock=self.clock)
+        scheduler.add("http://a/1", 0)
+        scheduler.add("http://a/2", 0)
+        url, _ = scheduler.next_ready()
+        cache_robots("a", "User-agent: *\nCrawl-delay: 5") # As fetching url would
+        scheduler.release(url)
+        self.assertAlmostEqual(scheduler.wait_time(), 5)
+
+    def test_in_flight_limit_and_slow_responses(self):
+        scheduler = HostScheduler(default_delay=1, max_in_flight_per_host=1, clock=self.clock)
+        for i in range(3):
+            scheduler.add(f"http://a/{i}", 0)
+        first, _ = scheduler.next_ready()
+        self.clock.now += 5 # Response slower than the delay
+        self.assertIsNone(scheduler.next_ready())
+        self.assertIsNone(scheduler.wait_time())
+        scheduler.release(first)
+        self.assertEqual(scheduler.next_ready()[0], "http://a/1")
+
+        scheduler = HostScheduler(default_delay=0, max_in_flight_per_host=2, clock=self.clock)
+        for i in range(3):
+            scheduler.add(f"http://a/{i}", 0)
+        self.assertEqual([scheduler.next_ready()[0] for _ in range(2)], ["http://a/0", "http://a/1"])
+        self.assertIsNone(scheduler.next_ready())
+
+    def test_bounded_queues_and_duplicates(self):
+        scheduler = HostScheduler(max_queue_per_host=2, clock=self.clock)
+        self.assertTrue(scheduler.add("http://a/1", 0))
+        self.assertFalse(scheduler.add("http://a/1", 0))
+        self.assertTrue(scheduler.add("http://a/2", 0))
+        self.assertFalse(scheduler.add("http://a/3", 0))
+        self.assertTrue(scheduler.add("http://b/1", 0))
+        self.assertEqual(scheduler.dropped, 1)
+        self.assertEqual(len(scheduler), 3)
+        self.assertIn("http://a/2", scheduler)
+        self.assertNotIn("http://a/3", scheduler)
+
+    def test_idle_hosts_are_pruned(self):
+        scheduler = HostScheduler(default_delay=1, clock=self.clock)
+        for i in range(2000):
+            scheduler.add(f"http://host{i}/", 0)
+            self._take(scheduler)
+            self.clock.now += 0.01
+        self.assertLess(len(scheduler._hosts), 1100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import os
+import sys
+
+# Add project root to sys.path to allow imports from aisans package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from aisans.indexer.bulk import build_path_for, bulk_build
+from aisans.indexer.indexer import Indexer
+from aisans.indexer.storage import iter_pages
+
+class TestBulkBuild(unittest.TestCase):
+    DB_FILE = os.path.join(os.path.dirname(__file__), 'test_bulk.db')
+
+    def setUp(self):
+        self._remove_files()
+        self.docs = [{
+            'url': f'http://example{i % 3}.com/page{i}', 'title': f'Page {i}',
+            'body': f'Document number {i} about {"pears" if i % 2 else "quinces"}.',
+            'snippet': f'Snippet {i}', 'source_engine': 'crawler',
+            'crawled_timestamp': '2024-01-01T10:00:00Z', 'llm_summary': f'Summary {i}'
+        } for i in range(40)]
+
+    def tearDown(self):
+        self._remove_files()
+
+    def _remove_files(self):
+        for path in (self.DB_FILE, build_path_for(self.DB_FILE)):
+            for suffix in ('', '-journal', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def test_build_replaces_live_index(self):
+        with Indexer(db_path=self.DB_FILE) as live:
+            live.add_document(dict(self.docs[0], url='http://old.example.com/', body='Only in the old index.'))
+        old_reader = Indexer.open_readonly(self.DB_FILE, cache_size=0)
+        try:
+            self.assertEqual(len(old_reader.search("old")), 1)
+
+            stats = bulk_build(iter(self.docs + [{'title': 'no url'}]), self.DB_FILE, chunk_size=7)
+            self.assertIsNone(stats['error'])
+            self.assertEqual((stats['documents'], stats['skipped']), (40, 1))
+            self.assertEqual(set(stats['seconds']), {'load', 'indexes', 'optimize', 'swap'})
+            self.assertFalse(os.path.exists(build_path_for(self.DB_FILE)))
+            # A reader opened before the swap keeps serving the old file.
+            self.assertEqual(len(old_reader.search("old")), 1)
+        finally:
+            old_reader.close()
+
+        with Indexer(db_path=self.DB_FILE) as indexer:
+            self.assertEqual(indexer.search("old"), [])
+            self.assertEqual(len(indexer.search("pears", limit=50)), 20)
+            self.assertEqual(len(indexer.search("quinces", hosts=['example1.com'], limit=50)), 6)
+            conn = indexer.conn
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'delete')
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")}
+            self.assertIn('idx_page_meta_host', indexes)
+            self.assertIn('idx_page_simhash_cluster', indexes)
+            self.assertEqual(conn.execute("SELECT v FROM pages_config WHERE k = 'automerge'").fetchone()[0], 4)
+            self.assertEqual(indexer.maintain(merge_pages=0)['segments_after'], 1)
+            # Still an ordinary, writable index.
+            self.assertTrue(indexer.add_document(dict(self.docs[1], body='Now about plums.')))
+            self.assertEqual(len(indexer.search("plums")), 1)
+
+    def test_rebuild_from_existing_index_in_place(self):
+        with Indexer(db_path=self.DB_FILE) as live:
+            live.add_batch(self.docs)
+            expected = [live.get_document(doc['url']) for doc in self.docs]
+        source = Indexer.open_readonly(self.DB_FILE, cache_size=0)
+        try:
+            stats = bulk_build(iter_pages(source.conn.cursor()), self.DB_FILE, wal=True)
+        finally:
+            source.close()
+        self.assertIsNone(stats['error'])
+        self.assertEqual(stats['documents'], 40)
+        with Indexer(db_path=self.DB_FILE, wal=True) as indexer:
+            self.assertEqual([indexer.get_document(doc['url']) for doc in self.docs], expected)
+
+    def test_failed_build_leaves_live_index_untouched(self):
+        with Indexer(db_path=self.DB_FILE) as live:
+            live.add_document(self.docs[0])
+
+        def failing_documents():
+            yield from self.docs[:5]
+            raise IOError("dump truncated")
+
+        with self.assertRaises(IOError):
+            bulk_build(failing_documents(), self.DB_FILE, chunk_size=2)
+        self.assertFalse(os.path.exists(build_path_for(self.DB_FILE)))
+
+        stats = bulk_build(iter([dict(self.docs[0], crawled_timestamp=object())]), self.DB_FILE)
+        self.assertIsNotNone(stats['error'])
+        self.assertFalse(os.path.exists(build_path_for(self.DB_FILE)))
+        with Indexer(db_path=self.DB_FILE) as indexer:
+            self.assertEqual(len(indexer.search("quinces OR pears", limit=50)), 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,44 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+
+# Add project root to sys.path to allow imports from aisans package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from aisans.indexer.cache import QueryCache
+
+class TestQueryCache(unittest.TestCase):
+
+    def test_hit_requires_matching_generation(self):
+        cache = QueryCache(max_entries=4)
+        cache.put(('apples', 10), 1, ['result'])
+        self.assertEqual(cache.get(('apples', 10), 1), ['result'])
+        self.assertIsNone(cache.get(('apples', 10), 2))
+        # The stale entry was dropped, not just skipped.
+        self.assertIsNone(cache.get(('apples', 10), 1))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = QueryCache(max_entries=2)
+        cache.put('a', 0, 'A')
+        cache.put('b', 0, 'B')
+        cache.get('a', 0) # 'b' is now least recently used
+        cache.put('c', 0, 'C')
+        self.assertIsNone(cache.get('b', 0))
+        self.assertEqual(cache.get('a', 0), 'A')
+        self.assertEqual(cache.get('c', 0), 'C')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_entries_expire_after_ttl(self):
+        cache = QueryCache(max_entries=2, ttl_seconds=5)
+        with patch('aisans.indexer.cache.time.monotonic', return_value=100.0):
+            cache.put('a', 0, 'A')
+        with patch('aisans.indexer.cache.time.monotonic', return_value=104.0):
+            self.assertEqual(cache.get('a', 0), 'A')
+        with patch('aisans.indexer.cache.time.monotonic', return_value=106.0):
+            self.assertIsNone(cache.get('a', 0))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -2,6 +2,10 @@ import unittest
 import os
 import sqlite3
 import shutil # For cleaning up test directories if needed
+from unittest.mock import patch
+import threading
+import random
+from datetime import date, datetime
 
 # Add project root to sys.path to allow imports from aisans package
 import sys
@@ -9,6 +13,7 @@ project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(_
 sys.path.insert(0, project_root)
 
 from aisans.indexer.indexer import Indexer
+from aisans.indexer.storage import SCHEMA_VERSION
 
 class TestIndexer(unittest.TestCase):
     DB_FILE = os.path.join(os.path.dirname(__file__), 'test_indexer.db') # Store test db in the same dir as test file
@@ -59,47 +64,48 @@ class TestIndexer(unittest.TestCase):
     def test_add_single_document_and_retrieve_with_llm_summary(self):
         self.assertTrue(self.indexer.add_document(self.doc1))
 
-        cur = self.indexer.conn.cursor()
-        # Use row factory for easier column access by name
-        self.indexer.conn.row_factory = sqlite3.Row
-        cur = self.indexer.conn.cursor()
-        cur.execute("SELECT url, title, body, snippet, llm_summary, source_engine, crawled_timestamp FROM pages WHERE url = ?", (self.doc1['url'],))
-        res = cur.fetchone()
+        res = self.indexer.get_document(self.doc1['url'])
         self.assertIsNotNone(res)
         self.assertEqual(res['title'], self.doc1['title'])
         self.assertEqual(res['llm_summary'], self.doc1['llm_summary'])
         self.assertEqual(res['url'], self.doc1['url'])
-        self.indexer.conn.row_factory = None # Reset row factory
+        self.assertEqual(res, self.doc1) # Every field round-trips, including the compressed body
 
 
     def test_add_document_updates_existing_including_llm_summary(self):
         self.indexer.add_document(self.doc1)
         self.assertTrue(self.indexer.add_document(self.doc3_update_page1))
 
-        self.indexer.conn.row_factory = sqlite3.Row
-        cur = self.indexer.conn.cursor()
-        cur.execute("SELECT title, source_engine, llm_summary FROM pages WHERE url = ?", (self.doc1['url'],))
-        res_updated = cur.fetchone()
+        res_updated = self.indexer.get_document(self.doc1['url'])
         self.assertIsNotNone(res_updated)
         self.assertEqual(res_updated['title'], self.doc3_update_page1['title'])
         self.assertEqual(res_updated['source_engine'], self.doc3_update_page1['source_engine'])
         self.assertEqual(res_updated['llm_summary'], self.doc3_update_page1['llm_summary'])
 
-        cur.execute("SELECT COUNT(*) FROM pages")
+        cur = self.indexer.conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM page_content")
         count = cur.fetchone()[0]
         self.assertEqual(count, 1, "Update should not create a new row.")
-        self.indexer.conn.row_factory = None
+        # The old version was removed from the FTS index, not just from storage.
+        self.assertEqual(self.indexer.search("great"), [])
 
 
+    def test_non_string_fields_are_stored_as_text(self):
+        doc = dict(self.doc1, title=42, body=12345, llm_summary=3.5)
+        self.assertTrue(self.indexer.add_document(doc))
+        self.assertEqual(self.indexer.add_batch([dict(self.doc2, body=67890)]), 1)
+        res = self.indexer.get_document(doc['url'])
+        self.assertEqual((res['title'], res['body'], res['llm_summary']), ('42', '12345', '3.5'))
+        self.assertEqual([r['url'] for r in self.indexer.search("12345")], [doc['url']])
+        self.assertEqual(self.indexer.writes_avoided, 0)
+        self.assertTrue(self.indexer.add_document(doc)) # Same text: recognised as unchanged
+        self.assertEqual(self.indexer.writes_avoided, 1)
+
     def test_add_document_with_none_llm_summary(self):
         self.assertTrue(self.indexer.add_document(self.doc2))
-        self.indexer.conn.row_factory = sqlite3.Row
-        cur = self.indexer.conn.cursor()
-        cur.execute("SELECT llm_summary FROM pages WHERE url = ?", (self.doc2['url'],))
-        res = cur.fetchone()
+        res = self.indexer.get_document(self.doc2['url'])
         self.assertIsNotNone(res)
         self.assertIsNone(res['llm_summary'])
-        self.indexer.conn.row_factory = None
 
     def test_add_batch_documents_with_llm_summary(self):
         doc4 = {
@@ -121,21 +127,18 @@ class TestIndexer(unittest.TestCase):
         num_added = self.indexer.add_batch([doc4, doc5_update_page2])
         self.assertEqual(num_added, 2)
 
-        self.indexer.conn.row_factory = sqlite3.Row
-        cur = self.indexer.conn.cursor()
-
-        res_doc4 = cur.execute("SELECT * FROM pages WHERE url = ?", (doc4['url'],)).fetchone()
+        res_doc4 = self.indexer.get_document(doc4['url'])
         self.assertIsNotNone(res_doc4)
         self.assertEqual(res_doc4['llm_summary'], doc4['llm_summary'])
 
-        res_doc5_updated = cur.execute("SELECT * FROM pages WHERE url = ?", (doc5_update_page2['url'],)).fetchone()
+        res_doc5_updated = self.indexer.get_document(doc5_update_page2['url'])
         self.assertIsNotNone(res_doc5_updated)
         self.assertEqual(res_doc5_updated['title'], doc5_update_page2['title'])
         self.assertEqual(res_doc5_updated['llm_summary'], doc5_update_page2['llm_summary'])
 
-        cur.execute("SELECT COUNT(*) FROM pages")
+        cur = self.indexer.conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM page_content")
         self.assertEqual(cur.fetchone()[0], 3) # doc1, doc2 (updated), doc4
-        self.indexer.conn.row_factory = None
 
     def test_search_includes_llm_summary_field_and_content(self):
         self.indexer.add_document(self.doc1) # llm_summary: 'Apples are great fruit.'
@@ -177,5 +180,614 @@ class TestIndexer(unittest.TestCase):
         with patch('builtins.print'): # Suppress expected "Document data is missing..." print
             self.assertFalse(self.indexer.add_document(incomplete_doc))
 
+    def test_documents_without_string_url_are_rejected(self):
+        with patch('builtins.print'):
+            for url in (None, 5):
+                self.assertFalse(self.indexer.add_document(dict(self.doc1, url=url)))
+            self.assertEqual(self.indexer.add_batch([dict(self.doc1, url=None), self.doc2]), 1)
+            stats = self.indexer.ingest([dict(self.doc1, url=None), self.doc1])
+        self.assertEqual((stats[0]['documents'], stats[0]['skipped'], stats[0]['error']), (1, 1, None))
+        self.assertFalse(self.indexer.conn.in_transaction)
+        self.assertEqual(self.indexer.conn.execute("SELECT COUNT(*) FROM page_meta").fetchone()[0], 2)
+
+    def test_page_meta_maps_url_to_pages_rowid(self):
+        self.indexer.add_document(self.doc1)
+        self.indexer.add_document(self.doc2)
+        cur = self.indexer.conn.cursor()
+        page_id = cur.execute("SELECT id FROM page_meta WHERE url = ?", (self.doc1['url'],)).fetchone()[0]
+
+        # Updating keeps the same rowid, so the mapping never goes stale.
+        self.indexer.add_document(self.doc3_update_page1)
+        title = cur.execute("SELECT title FROM page_content WHERE id = ?", (page_id,)).fetchone()[0]
+        self.assertEqual(title, self.doc3_update_page1['title'])
+        self.assertEqual(cur.execute("SELECT COUNT(*) FROM page_meta").fetchone()[0], 2)
+
+        plan = cur.execute("EXPLAIN QUERY PLAN SELECT id FROM page_meta WHERE url = ?", (self.doc1['url'],)).fetchall()
+        self.assertTrue(any('USING' in row[-1] and 'INDEX' in row[-1] for row in plan), plan)
+
+    def test_legacy_database_is_migrated(self):
+        self.indexer.close()
+        os.remove(self.DB_FILE)
+
+        # Original layout: only the FTS5 table, with a URL stored twice.
+        conn = sqlite3.connect(self.DB_FILE)
+        conn.execute("""
+        CREATE VIRTUAL TABLE pages USING fts5(
+            url UNINDEXED, title, body, snippet, llm_summary, source_engine, crawled_timestamp,
+            tokenize = "unicode61 remove_diacritics 2"
+        );
+        """)
+        insert_sql = "INSERT INTO pages (url, title, body, snippet, llm_summary, source_engine, crawled_timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)"
+        for doc in (self.doc1, self.doc2, self.doc3_update_page1):
+            conn.execute(insert_sql, (doc['url'], doc['title'], doc['body'], doc['snippet'],
+                                      doc['llm_summary'], doc['source_engine'], doc['crawled_timestamp']))
+        conn.commit()
+        conn.close()
+
+        self.indexer = Indexer(db_path=self.DB_FILE)
+        cur = self.indexer.conn.cursor()
+        self.assertEqual(cur.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+        self.assertEqual(cur.execute("SELECT COUNT(*) FROM page_meta").fetchone()[0], 2)
+        self.assertEqual(cur.execute("SELECT COUNT(*) FROM page_content").fetchone()[0], 2)
+        results = self.indexer.search("cherries")
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['title'], self.doc3_update_page1['title'])
+        self.assertEqual(self.indexer.get_document(self.doc2['url']), self.doc2)
+        self.assertEqual(self.indexer.search("great"), []) # Dropped duplicate is not indexed
+
+        self.assertTrue(self.indexer.add_document(self.doc2))
+        self.assertEqual(cur.execute("SELECT COUNT(*) FROM page_content").fetchone()[0], 2)
+        self.assertEqual(len(self.indexer.search("bananas")), 1)
+        # Migrated rows have no content hash yet, so that write re-indexed; the next one does not.
+        self.assertEqual(self.indexer.writes_avoided, 0)
+        self.assertTrue(self.indexer.add_document(self.doc2))
+        self.assertEqual(self.indexer.writes_avoided, 1)
+
+    def test_version_3_database_gains_content_hash(self):
+        self.indexer.add_document(self.doc1)
+        self.indexer.close()
+        conn = sqlite3.connect(self.DB_FILE)
+        conn.execute("ALTER TABLE page_meta DROP COLUMN content_hash")
+        conn.execute("PRAGMA user_version = 3")
+        conn.commit()
+        conn.close()
+
+        self.indexer = Indexer(db_path=self.DB_FILE)
+        cur = self.indexer.conn.cursor()
+        self.assertEqual(cur.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+        self.assertIsNone(cur.execute("SELECT content_hash FROM page_meta").fetchone()[0])
+        self.assertEqual(self.indexer.search("apples")[0]['url'], self.doc1['url'])
+
+    def test_unchanged_pages_skip_reindexing(self):
+        recrawled = dict(self.doc1, crawled_timestamp='2024-02-01T00:00:00Z')
+
+        self.indexer.maintain(merge_pages=0, automerge=0) # Every FTS5 write then leaves a new segment
+        self.indexer.add_document(self.doc1)
+        segments = self.indexer.maintain(merge_pages=0)['segments_after']
+        self.assertTrue(self.indexer.add_document(recrawled))
+        self.assertEqual(self.indexer.writes_avoided, 1)
+        self.assertEqual(self.indexer.maintain(merge_pages=0)['segments_after'], segments)
+        self.assertEqual(self.indexer.get_document(self.doc1['url']), recrawled) # 'touch' updates the timestamp
+        self.assertEqual(self.indexer.search("apples")[0]['crawled_timestamp'], recrawled['crawled_timestamp'])
+
+        changed = dict(recrawled, body='Apples, now with pears.')
+        self.assertTrue(self.indexer.add_document(changed))
+        self.assertEqual(self.indexer.writes_avoided, 1)
+        self.assertEqual(len(self.indexer.search("pears")), 1)
+
+        stats = self.indexer.ingest([changed, self.doc2])
+        self.assertEqual(stats[0]['unchanged'], 1)
+        self.assertEqual(self.indexer.writes_avoided, 2)
+        self.indexer.close()
+
+        for mode, expected_timestamp, expected_avoided in (('skip', changed['crawled_timestamp'], 1),
+                                                           ('rewrite', self.doc1['crawled_timestamp'], 0)):
+            self.indexer = Indexer(db_path=self.DB_FILE, on_unchanged=mode)
+            self.indexer.add_document(dict(changed, crawled_timestamp=self.doc1['crawled_timestamp']))
+            self.assertEqual(self.indexer.writes_avoided, expected_avoided, mode)
+            self.assertEqual(self.indexer.get_document(changed['url'])['crawled_timestamp'], expected_timestamp, mode)
+            self.indexer.close()
+
+        with self.assertRaises(ValueError):
+            Indexer(db_path=self.DB_FILE, on_unchanged='ignore')
+        self.indexer = Indexer(db_path=self.DB_FILE)
+
+    def test_ingest_streams_generator_in_chunks(self):
+        def generate():
+            for i in range(25):
+                yield {
+                    'url': f'http://example.com/stream{i}', 'title': f'Stream {i}',
+                    'body': f'Streamed body number {i} about kiwis.', 'snippet': 'Streamed.',
+                    'source_engine': 'stream', 'crawled_timestamp': '2024-01-05T00:00:00Z'
+                }
+            yield {'url': 'http://example.com/broken', 'title': 'No body'}
+            yield dict(self.doc1)
+
+        stats = self.indexer.ingest(generate(), chunk_size=10, max_chunk_seconds=60)
+
+        self.assertEqual([chunk['documents'] for chunk in stats], [10, 10, 6])
+        self.assertEqual(sum(chunk['skipped'] for chunk in stats), 1)
+        self.assertTrue(all(chunk['error'] is None for chunk in stats))
+        self.assertEqual(len(self.indexer.search("kiwis", limit=100)), 25)
+
+        # Re-ingesting replaces rather than duplicates.
+        self.indexer.ingest([self.doc3_update_page1, self.doc3_update_page1])
+        cur = self.indexer.conn.cursor()
+        self.assertEqual(cur.execute("SELECT COUNT(*) FROM page_meta").fetchone()[0], 26)
+        self.assertEqual(self.indexer.search("cherries")[0]['title'], self.doc3_update_page1['title'])
+
+    def test_ingest_commits_chunk_after_time_bound(self):
+        docs = [dict(self.doc1), dict(self.doc2)]
+        with patch('aisans.indexer.indexer.time.monotonic', side_effect=[0.0, 0.0, 5.0, 5.0]):
+            stats = self.indexer.ingest(iter(docs), chunk_size=100, max_chunk_seconds=1.0)
+        self.assertEqual([chunk['documents'] for chunk in stats], [2])
+
+    def test_write_behind_flush_and_close_drain_queue(self):
+        self.indexer.close()
+        self.indexer = Indexer(db_path=self.DB_FILE, write_behind=True, write_queue_size=4, write_batch_size=3)
+
+        for i in range(20):
+            doc = dict(self.doc2, url=f'http://example.com/queued{i}', body=f'Queued page {i} about plums.')
+            self.assertTrue(self.indexer.add_document(doc))
+        self.assertTrue(self.indexer.flush())
+        self.assertEqual(len(self.indexer.search("plums", limit=50)), 20)
+
+        # Validation still happens synchronously.
+        with patch('builtins.print'):
+            self.assertFalse(self.indexer.add_document({'url': 'http://example.com/incomplete'}))
+
+        self.assertEqual(self.indexer.add_batch([self.doc1, self.doc3_update_page1]), 2)
+        self.indexer.close()
+
+        # close() drained the queue before returning.
+        self.indexer = Indexer(db_path=self.DB_FILE)
+        results = self.indexer.search("cherries")
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['title'], self.doc3_update_page1['title'])
+
+    def test_write_behind_survives_non_sqlite_errors(self):
+        self.indexer.close()
+        self.indexer = Indexer(db_path=self.DB_FILE, write_behind=True, write_batch_size=1)
+        write_rows = Indexer._write_rows
+
+        def failing_write_rows(indexer, cursor, docs):
+            if any('bad' in doc['url'] for doc in docs):
+                raise ValueError("unparseable date")
+            return write_rows(indexer, cursor, docs)
+
+        with patch.object(Indexer, '_write_rows', failing_write_rows), patch('builtins.print'):
+            self.assertTrue(self.indexer.add_document(dict(self.doc1, url='http://example.com/bad')))
+            self.assertFalse(self.indexer.flush()) # Returns: the failure was counted, the thread is alive
+            self.assertTrue(self.indexer.add_document(self.doc2))
+            self.assertTrue(self.indexer.flush())
+        self.assertEqual(len(self.indexer.search("bananas")), 1)
+
+    def test_write_behind_refuses_documents_when_writer_cannot_connect(self):
+        self.indexer.close()
+        configure = Indexer._configure_connection
+
+        def failing_in_writer(indexer, conn, *args, **kwargs):
+            if threading.current_thread().name == "aisans-index-writer":
+                raise sqlite3.OperationalError("unable to open database file")
+            return configure(indexer, conn, *args, **kwargs)
+
+        with patch.object(Indexer, '_configure_connection', failing_in_writer), patch('builtins.print'):
+            self.indexer = Indexer(db_path=self.DB_FILE, write_behind=True)
+            self.indexer._writer_thread.join(0.1) # Let it fail to connect
+            self.assertTrue(self.indexer._writer_failed)
+            self.assertFalse(self.indexer.add_document(self.doc1))
+            self.assertEqual(self.indexer.add_batch([self.doc1, self.doc2]), 0)
+            self.assertTrue(self.indexer.flush())
+            self.indexer.close() # Does not hang
+
+    def test_wal_mode_serves_search_from_pooled_readers(self):
+        self.indexer.close()
+        self.indexer = Indexer(db_path=self.DB_FILE, wal=True)
+        self.addCleanup(self._remove_wal_files)
+        self.assertEqual(self.indexer.conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        self.indexer.add_document(self.doc1)
+
+        # Hold an open write transaction on the writer connection.
+        cursor = self.indexer.conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        self.indexer._write_rows(cursor, [self.doc2])
+
+        results = {}
+        def search_in_thread():
+            results['apples'] = self.indexer.search("apples")
+            results['bananas'] = self.indexer.search("bananas")
+            with self.assertRaises(sqlite3.OperationalError), self.indexer._reader() as conn:
+                conn.execute("DELETE FROM page_meta")
+        worker = threading.Thread(target=search_in_thread)
+        worker.start()
+        worker.join(timeout=5)
+        self.assertFalse(worker.is_alive(), "search blocked on the open write transaction")
+        self.indexer.conn.commit()
+
+        self.assertEqual([r['url'] for r in results['apples']], [self.doc1['url']])
+        self.assertEqual(results['bananas'], []) # Uncommitted rows are not visible
+        self.assertEqual(len(self.indexer.search("bananas")), 1)
+
+    def test_new_readers_do_not_invalidate_the_query_cache(self):
+        self.indexer.close()
+        self.indexer = Indexer(db_path=self.DB_FILE, wal=True)
+        self.addCleanup(self._remove_wal_files)
+        self.indexer.add_document(self.doc1)
+        self.indexer.search("apples")
+        generation = self.indexer._write_generation
+        barrier = threading.Barrier(20)
+
+        def search():
+            barrier.wait() # All at once: most threads open a new reader
+            self.indexer.search("apples")
+        threads = [threading.Thread(target=search) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.indexer._write_generation, generation)
+        self.assertEqual(self.indexer.cache_stats()['hits'], 20)
+
+        # A reader that already reported a version still notices commits by other connections.
+        other = Indexer(db_path=self.DB_FILE, cache_size=0)
+        other.add_document(self.doc3_update_page1)
+        other.close()
+        self.assertEqual(self.indexer.search("apples")[0]['title'], self.doc3_update_page1['title'])
+
+    def test_short_lived_threads_share_pooled_readers(self):
+        self.indexer.close()
+        self.indexer = Indexer(db_path=self.DB_FILE, wal=True)
+        self.indexer.READER_POOL_SIZE = 2
+        self.addCleanup(self._remove_wal_files)
+        self.indexer.add_document(self.doc1)
+        opened = []
+        open_connection = self.indexer._open_readonly_connection
+
+        def counting_open():
+            opened.append(open_connection())
+            return opened[-1]
+
+        def search_in_threads(count, barrier=None):
+            def search():
+                if barrier is not None:
+                    barrier.wait()
+                self.assertEqual(len(self.indexer.search("apples")), 1)
+            for _ in range(count):
+                threads = [threading.Thread(target=search) for _ in range(barrier.parties if barrier else 1)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+        with patch.object(self.indexer, '_open_readonly_connection', counting_open):
+            search_in_threads(50) # One after another: all reuse the same idle connections
+            self.assertLessEqual(len(opened), 2)
+            search_in_threads(3, threading.Barrier(20)) # Concurrent: extra connections are closed when returned
+        self.assertLessEqual(len(self.indexer._idle_readers), 2)
+        idle = list(self.indexer._idle_readers)
+        closed = [conn for conn in opened if conn not in idle]
+        for conn in closed:
+            with self.assertRaises(sqlite3.ProgrammingError):
+                conn.execute("SELECT 1")
+        self.indexer.close()
+        for conn in idle:
+            with self.assertRaises(sqlite3.ProgrammingError):
+                conn.execute("SELECT 1")
+
+    def test_search_page_cursor_walks_all_results_once(self):
+        docs = [dict(self.doc2, url=f'http://example.com/melon{i}',
+                     body='melon ' * (i % 4 + 1) + f'filler text {i}') for i in range(23)]
+        self.indexer.ingest(docs)
+
+        seen = []
+        page, cursor = self.indexer.search_page("melon", limit=5)
+        while True:
+            seen.extend(page)
+            if cursor is None:
+                break
+            page, cursor = self.indexer.search_page("melon", limit=5, cursor=cursor)
+
+        self.assertEqual(len(seen), 23)
+        self.assertEqual(len({r['url'] for r in seen}), 23)
+        self.assertEqual([r['rank'] for r in seen], sorted(r['rank'] for r in seen))
+        self.assertNotIn('rowid', seen[0])
+        self.assertEqual([r['url'] for r in self.indexer.search_iter("melon", page_size=4)], [r['url'] for r in seen])
+
+        self.assertEqual(self.indexer.estimate_hits("melon"), 23)
+        self.assertEqual(self.indexer.estimate_hits("melon", cap=10), 10)
+        with self.assertRaises(ValueError):
+            self.indexer.search_page("melon", cursor="not-a-cursor")
+
+    def test_query_cache_is_invalidated_by_writes(self):
+        self.indexer.add_document(self.doc1)
+        first = self.indexer.search("apples")
+        first[0]['title'] = 'mutated by caller'
+        second = self.indexer.search("  apples ")
+        self.assertEqual(second[0]['title'], self.doc1['title'])
+        self.assertEqual(self.indexer.cache_stats()['hits'], 1)
+
+        self.indexer.add_document(self.doc3_update_page1)
+        self.assertEqual(self.indexer.search("apples")[0]['title'], self.doc3_update_page1['title'])
+
+        self.assertTrue(self.indexer.delete_document(self.doc1['url']))
+        self.assertEqual(self.indexer.search("apples"), [])
+        self.assertFalse(self.indexer.delete_document(self.doc1['url']))
+
+        # Commits from another connection are detected through PRAGMA data_version.
+        self.assertEqual(self.indexer.search("bananas"), [])
+        other = Indexer(db_path=self.DB_FILE, cache_size=0)
+        other.add_document(self.doc2)
+        other.close()
+        self.assertEqual(len(self.indexer.search("bananas")), 1)
+
+    def test_body_is_compressed_and_snippet_not_indexed(self):
+        doc = dict(self.doc2, body='bananas ' * 500, snippet='Only the snippet mentions kumquats.')
+        self.indexer.add_document(doc)
+
+        blob, codec = self.indexer.conn.execute("SELECT body, body_codec FROM page_content").fetchone()
+        self.assertIn(codec, ('zlib', 'zstd'))
+        self.assertLess(len(blob), len(doc['body']) // 10)
+        self.assertEqual(self.indexer.get_document(doc['url'])['body'], doc['body'])
+
+        self.assertEqual(self.indexer.search("kumquats"), [])
+        self.assertEqual(self.indexer.search("bananas")[0]['snippet'], doc['snippet'])
+
+    def test_search_results_fetch_large_columns_lazily(self):
+        self.indexer.add_batch([self.doc1, self.doc2])
+        results = self.indexer.search("page")
+        self.assertEqual(len(results), 2)
+        res = next(r for r in results if r['url'] == self.doc1['url'])
+        self.assertFalse(res.is_loaded('llm_summary'))
+        self.assertEqual(res['llm_summary'], self.doc1['llm_summary'])
+        self.assertTrue(res.is_loaded('llm_summary'))
+        self.assertEqual(res['body'], self.doc1['body'])
+        self.assertNotIn('body', res)
+        self.assertEqual(set(dict(res)), {'url', 'title', 'snippet', 'llm_summary', 'source_engine', 'crawled_timestamp', 'rank'})
+        with self.assertRaises(KeyError):
+            res['rowid']
+
+        # One batched query for the displayed hits; accessing them afterwards does not hit the database.
+        eager = self.indexer.search("page", columns=('llm_summary', 'body'))
+        self.assertTrue(all(r.is_loaded('llm_summary') and r.is_loaded('body') for r in eager))
+        with patch.object(self.indexer, 'load_columns') as load_columns:
+            self.assertEqual({r.url: r.llm_summary for r in eager},
+                             {self.doc1['url']: self.doc1['llm_summary'], self.doc2['url']: None})
+            load_columns.assert_not_called()
+        with self.assertRaises(ValueError):
+            self.indexer.load_columns(eager, ('url',))
+
+    def _article(self, seed: int) -> str:
+        rng = random.Random(seed)
+        return ' '.join(rng.choice(['apples', 'pears', 'orchards', 'harvest', 'trees', 'cider', 'autumn', 'soil'])
+                        + str(rng.randrange(50)) for _ in range(300))
+
+    def test_near_duplicates_are_clustered_and_collapsed(self):
+        article = self._article(1) + ' quinces'
+        original = dict(self.doc1, url='http://example.com/article', body=article)
+        mirror = dict(self.doc1, url='http://mirror.example.org/article', body='Mirrored copy. ' + article)
+        other = dict(self.doc1, url='http://example.com/other', body=self._article(2) + ' quinces')
+        self.indexer.add_batch([original, mirror, other])
+        self.assertEqual(self.indexer.near_duplicates_found, 1)
+
+        clusters = dict(self.indexer.conn.execute("SELECT id, cluster_id FROM page_simhash").fetchall())
+        self.assertEqual(len(clusters), 3)
+        self.assertEqual(len(set(clusters.values())), 2)
+
+        collapsed = self.indexer.search("quinces")
+        self.assertEqual(len(collapsed), 2)
+        self.assertIn(other['url'], [r['url'] for r in collapsed])
+        self.assertEqual(len(self.indexer.search("quinces", collapse=False)), 3)
+
+        # Deleting the page that founded the cluster must not fuse it with a later page.
+        self.assertTrue(self.indexer.delete_document(original['url']))
+        self.assertEqual(self.indexer.conn.execute("SELECT COUNT(*) FROM simhash_bands").fetchone()[0], 2 * 4)
+        self.assertEqual(len(self.indexer.search("quinces")), 2)
+
+    def test_search_page_collapses_and_filters_like_search(self):
+        docs = []
+        for i in range(6):
+            article = self._article(10 + i) + ' quinces'
+            host = 'a.example.com' if i % 2 else 'b.example.com'
+            docs.append(dict(self.doc1, url=f'http://{host}/article{i}', body=article))
+            docs.append(dict(self.doc1, url=f'http://mirror.example.org/article{i}', body='Mirrored copy. ' + article))
+        self.indexer.add_batch(docs)
+        self.assertEqual(self.indexer.near_duplicates_found, 6)
+
+        def all_pages(**kwargs):
+            seen, cursor = [], None
+            while True:
+                page, cursor = self.indexer.search_page("quinces", limit=4, cursor=cursor, **kwargs)
+                seen.extend(r['url'] for r in page)
+                if cursor is None:
+                    return seen
+
+        self.assertEqual([r['url'] for r in self.indexer.search_page("quinces", limit=4)[0]],
+                         [r['url'] for r in self.indexer.search("quinces", limit=4)])
+        collapsed = all_pages()
+        self.assertEqual(len(collapsed), 6)
+        self.assertEqual(sorted(collapsed), sorted(r['url'] for r in self.indexer.search("quinces", limit=50)))
+        self.assertEqual(len(all_pages(collapse=False)), 12)
+
+        # The mirror ranks within its cluster only among the pages that pass the filters.
+        on_a = all_pages(hosts=['a.example.com'])
+        self.assertEqual(on_a, [r['url'] for r in self.indexer.search("quinces", limit=50, hosts=['a.example.com'])])
+        self.assertEqual(sorted(on_a), sorted(d['url'] for d in docs if d['url'].startswith('http://a.')))
+        self.assertEqual([r['url'] for r in self.indexer.search_iter("quinces", page_size=2, hosts='a.example.com')],
+                         on_a)
+        self.assertEqual(all_pages(since='2030-01-01'), [])
+        with self.assertRaises(ValueError):
+            self.indexer.search_page("quinces", until='someday')
+
+    def test_near_duplicates_can_be_dropped(self):
+        self.indexer.close()
+        self.indexer = Indexer(db_path=self.DB_FILE, near_duplicates='drop')
+        article = self._article(3)
+        stats = self.indexer.ingest([
+            dict(self.doc1, url='http://example.com/a', body=article),
+            dict(self.doc1, url='http://example.com/a?print=1', body=article + ' Printed from example.com'),
+        ])
+        self.assertEqual(stats[0]['near_duplicates'], 1)
+        self.assertIsNone(self.indexer.get_document('http://example.com/a?print=1'))
+        self.assertEqual(self.indexer.conn.execute("SELECT COUNT(*) FROM page_meta").fetchone()[0], 1)
+        # Updates of a stored page are never dropped.
+        self.assertTrue(self.indexer.add_document(dict(self.doc1, url='http://example.com/a', body=article + ' Updated')))
+        self.assertTrue(self.indexer.get_document('http://example.com/a')['body'].endswith('Updated'))
+
+    def test_search_filters_on_typed_metadata(self):
+        docs = [dict(self.doc2, url=f'http://{host}/p{i}', body=f'Plums page {i}.', source_engine=source,
+                     crawled_timestamp=f'2024-03-{day:02d}T12:00:00Z')
+                for i, (host, source, day) in enumerate([
+                    ('a.example.com', 'crawler', 1), ('a.example.com', 'duckduckgo', 5),
+                    ('B.example.com', 'crawler', 10), ('b.example.com', 'crawler', 20)])]
+        self.indexer.add_batch(docs)
+        row = self.indexer.conn.execute("SELECT crawled_at, source, host FROM page_meta WHERE url = ?", (docs[2]['url'],)).fetchone()
+        self.assertEqual(row, (1710072000, 'crawler', 'b.example.com'))
+
+        def urls(**filters):
+            return sorted(r['url'] for r in self.indexer.search("plums", **filters))
+        self.assertEqual(len(urls()), 4)
+        self.assertEqual(urls(since='2024-03-05T12:00:00Z'), sorted(d['url'] for d in docs[1:]))
+        self.assertEqual(urls(until=datetime(2024, 3, 5, 12)), [docs[0]['url']])
+        self.assertEqual(urls(since=1709640000, until='2024-03-20'), sorted([docs[1]['url'], docs[2]['url']]))
+        self.assertEqual(urls(sources=['duckduckgo']), [docs[1]['url']])
+        self.assertEqual(urls(sources='crawler', hosts=['B.Example.com']), sorted(d['url'] for d in docs[2:]))
+        self.assertEqual(urls(hosts=[]), [])
+        with self.assertRaises(ValueError):
+            self.indexer.search("plums", since='last tuesday')
+
+        # Both plans (FTS5-sorted and rank-after-filter) return the same ranked rows.
+        with patch.object(self.indexer, '_filters_are_selective', return_value=True):
+            selective = self.indexer.search("plums", since='2024-03-05T12:00:00Z', limit=2)
+        broad = self.indexer.search("plums", since='2024-03-05T12:00:00Z', limit=2)
+        self.assertEqual([r['url'] for r in selective], [r['url'] for r in broad])
+
+        # Touching an unchanged page moves its crawled_at as well.
+        self.indexer.add_document(dict(docs[0], crawled_timestamp='2024-04-01T00:00:00Z'))
+        self.assertEqual(urls(since='2024-03-25'), [docs[0]['url']])
+
+    def test_unusable_timestamps_are_stored_without_crawled_at(self):
+        cases = [(date(2024, 3, 1), 1709251200), (float('nan'), None), (10**30, None)]
+        for i, (timestamp, expected) in enumerate(cases):
+            url = f'http://example.com/t{i}'
+            self.assertTrue(self.indexer.add_document(dict(self.doc1, url=url, crawled_timestamp=timestamp)), timestamp)
+            row = self.indexer.conn.execute("SELECT crawled_at FROM page_meta WHERE url = ?", (url,)).fetchone()
+            self.assertEqual(row, (expected,))
+        self.assertEqual(self.indexer.add_batch([self.doc2]), 1)
+
+    def test_failed_write_is_rolled_back(self):
+        with patch('aisans.indexer.indexer.write_meta', side_effect=ValueError("bad field")), patch('builtins.print'):
+            self.assertFalse(self.indexer.add_document(self.doc1))
+            self.assertEqual(self.indexer.add_batch([self.doc1]), 0)
+            self.assertEqual(self.indexer.ingest([self.doc1])[0]['error'], "bad field")
+        self.assertFalse(self.indexer.conn.in_transaction)
+        self.assertEqual(self.indexer.conn.execute("SELECT COUNT(*) FROM page_meta").fetchone()[0], 0)
+        self.assertTrue(self.indexer.add_document(self.doc2))
+        self.assertEqual(self.indexer.add_batch([self.doc1]), 1)
+        self.assertEqual(len(self.indexer.search("apples")), 1)
+
+    def test_version_5_database_gets_filter_columns(self):
+        self.indexer.add_document(self.doc1)
+        self.indexer.close()
+        conn = sqlite3.connect(self.DB_FILE)
+        for index in ('idx_page_meta_crawled_at', 'idx_page_meta_source', 'idx_page_meta_host'):
+            conn.execute(f"DROP INDEX {index}")
+        for column in ('crawled_at', 'source', 'host'):
+            conn.execute(f"ALTER TABLE page_meta DROP COLUMN {column}")
+        conn.execute("PRAGMA user_version = 5")
+        conn.commit()
+        conn.close()
+
+        self.indexer = Indexer(db_path=self.DB_FILE)
+        row = self.indexer.conn.execute("SELECT crawled_at, source, host FROM page_meta").fetchone()
+        self.assertEqual(row, (1704103200, 'crawler', 'example.com'))
+        self.assertEqual(len(self.indexer.search("apples", sources=['crawler'], since='2024-01-01')), 1)
+
+    def test_open_readonly_serves_searches_without_writing(self):
+        self.indexer.add_batch([self.doc1, self.doc2])
+        reader = Indexer.open_readonly(self.DB_FILE, mmap_size=1 << 20, page_cache_mib=8)
+        try:
+            self.assertEqual([r['url'] for r in reader.search("apples")], [self.doc1['url']])
+            self.assertEqual(reader.search("apples")[0]['llm_summary'], self.doc1['llm_summary'])
+            self.assertEqual(reader.get_document(self.doc2['url'])['title'], self.doc2['title'])
+            with reader._reader() as conn:
+                self.assertEqual(conn.execute("PRAGMA query_only").fetchone()[0], 1)
+                self.assertEqual(conn.execute("PRAGMA mmap_size").fetchone()[0], 1 << 20)
+                self.assertEqual(conn.execute("PRAGMA cache_size").fetchone()[0], -8 * 1024)
+
+            self.assertFalse(reader.add_document(dict(self.doc1, url='http://example.com/new')))
+            self.assertIsNone(self.indexer.get_document('http://example.com/new'))
+            # Writes by another connection are picked up (and the query cache invalidated).
+            self.indexer.add_document(dict(self.doc2, url='http://example.com/page3', body='More apples.'))
+            self.assertEqual(len(reader.search("apples")), 2)
+        finally:
+            reader.close()
+
+        missing = os.path.join(os.path.dirname(self.DB_FILE), 'no_such_dir', 'index.db')
+        reader = Indexer.open_readonly(missing)
+        self.assertIsNone(reader.conn)
+        self.assertFalse(os.path.exists(os.path.dirname(missing)))
+
+    def test_suggest_completes_frequent_terms(self):
+        words = ['python'] * 5 + ['pythonic'] * 3 + ['pyramid'] * 2 + ['pylon']
+        self.indexer.add_batch([dict(self.doc2, url=f'http://example.com/s{i}', title=f'Café {word}', body=f'About {word}.')
+                                for i, word in enumerate(words)])
+        self.assertEqual(self.indexer.suggest('py'), ['python', 'pythonic', 'pyramid']) # pylon: only one page
+        self.assertEqual(self.indexer.suggest('PYTH', k=1), ['python'])
+        self.assertEqual(self.indexer.suggest('learn about pyr'), ['learn about pyramid'])
+        self.assertEqual(self.indexer.suggest('cafe'), ['cafe'])
+        self.assertEqual(self.indexer.suggest('py '), [])
+        self.assertEqual(self.indexer.suggest('zz'), [])
+
+        # Later writes are applied incrementally, without reloading the vocabulary.
+        suggester = self.indexer._vocabulary_models['suggest'][0]
+        self.indexer.add_batch([dict(self.doc2, url=f'http://example.com/t{i}', body='A pyramid and a pylon.')
+                                for i in range(3)])
+        self.assertIs(self.indexer._vocabulary_models['suggest'][0], suggester)
+        self.assertEqual(self.indexer.suggest('py'), ['pyramid', 'python', 'pylon', 'pythonic'])
+
+        # Prefix queries use the prefix index and agree with a plain term query.
+        self.assertEqual(len(self.indexer.search('pyt*', limit=50, collapse=False)), 8)
+
+    def test_version_6_database_gets_prefix_index(self):
+        self.indexer.add_batch([self.doc1, self.doc2])
+        self.indexer.close()
+        conn = sqlite3.connect(self.DB_FILE)
+        conn.execute("DROP TABLE pages_vocab")
+        conn.execute("DROP TABLE pages")
+        conn.execute("""CREATE VIRTUAL TABLE pages USING fts5(title, body, llm_summary, source_engine,
+                        content = '', tokenize = "unicode61 remove_diacritics 2")""")
+        conn.execute("PRAGMA user_version = 6")
+        conn.commit()
+        conn.close()
+
+        self.indexer = Indexer(db_path=self.DB_FILE)
+        fts_sql = self.indexer.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'pages'").fetchone()[0]
+        self.assertIn("prefix", fts_sql)
+        self.assertEqual([r['url'] for r in self.indexer.search("appl*")], [self.doc1['url']])
+        self.assertEqual([r['url'] for r in self.indexer.search("bananas")], [self.doc2['url']])
+        self.assertTrue(self.indexer.delete_document(self.doc2['url'])) # Unindexing replays the rebuilt entries
+        self.assertEqual(self.indexer.search("bananas"), [])
+
+    def test_maintain_merges_segments(self):
+        self.indexer.maintain(merge_pages=0, automerge=0) # Let segments pile up
+        for i in range(12):
+            self.indexer.add_document(dict(self.doc2, url=f'http://example.com/segment{i}', body=f'Grapes page {i}.'))
+
+        stats = self.indexer.maintain(merge_pages=100)
+        self.assertIsNone(stats['error'])
+        self.assertEqual(stats['segments_before'], 12)
+        self.assertLess(stats['segments_after'], stats['segments_before'])
+        self.assertIn('merge', stats['seconds'])
+
+        stats = self.indexer.maintain(merge_pages=0, optimize=True, vacuum=True)
+        self.assertEqual(stats['segments_after'], 1)
+        self.assertEqual(set(stats['seconds']), {'optimize', 'vacuum'})
+        self.assertEqual(len(self.indexer.search("grapes", limit=50)), 12)
+
+    def _remove_wal_files(self):
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(self.DB_FILE + suffix):
+                os.remove(self.DB_FILE + suffix)
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -0,0 +1,112 @@
+import unittest
+import os
+import sys
+from unittest.mock import patch
+
+# Add project root to sys.path to allow imports from aisans package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from aisans.indexer import query
+from aisans.indexer.indexer import Indexer
+from aisans.indexer.query import parse_query, plan_query
+
+class TestParseQuery(unittest.TestCase):
+    def test_syntax(self):
+        cases = {
+            'apples pears': '"apples" AND "pears"',
+            '"apple pie': '"apple pie"',
+            'pyth* -java': '("pyth" *) NOT ("java")',
+            'red apples OR pears': '"red" AND ("apples" OR "pears")',
+            'title:apples OR summary:"a b"': '(title : "apples" OR llm_summary : "a b")',
+            'llm_summary:apples': 'llm_summary : "apples"',
+            'source_engine:crawler': 'source_engine : "crawler"',
+            'foo_bar:baz': '"foo bar" AND "baz"',
+            'foo:bar': '"foo" AND "bar"',
+            'E-Mail Crème': '"e mail" AND "creme"',
+            'NEAR(apple pie, 500)': 'NEAR("apple" "pie", 100)',
+            '*x a*': '"x" AND "a"', # No leading wildcards, no one-letter prefixes
+        }
+        for text, expected in cases.items():
+            self.assertEqual(parse_query(text).to_fts(), expected, text)
+
+    def test_column_filter_before_near_is_noted(self):
+        parsed = parse_query('title:NEAR(apple pie) pears')
+        self.assertEqual(parsed.to_fts(), 'NEAR("apple" "pie", 10) AND "pears"')
+        self.assertIn("column filter title: ignored before NEAR(...)", parsed.notes)
+        self.assertIn("column filter title: ignored before NEAR(...)", plan_query(parsed, lambda word: 1, 10).notes)
+
+    def test_unusable_input_matches_nothing(self):
+        for text in ('', 'OR AND ) ( "', 'NOT pears', '-pears', '***'):
+            self.assertIsNone(parse_query(text).to_fts(), text)
+
+    def test_limits(self):
+        parsed = parse_query(' '.join(f"w{i}" for i in range(100)))
+        self.assertEqual(len(parsed.words()), query.MAX_TERMS)
+        self.assertTrue(parsed.notes)
+        parsed = parse_query(' OR '.join(f"w{i}" for i in range(30)))
+        self.assertEqual(len(parsed.clauses[0].items), query.MAX_OR_TERMS)
+        self.assertIn('truncated', parse_query('x' * 1000).notes[0])
+
+    def test_plan_prunes_and_orders_by_document_frequency(self):
+        doc_freq = {'common': 900, 'rare': 3, 'mid': 50}.get
+        freq = lambda term: doc_freq(term, 0)
+
+        planned = plan_query(parse_query('common mid rare'), freq, 1000)
+        self.assertEqual(planned.to_fts(), '"rare" AND "mid"')
+        self.assertEqual(plan_query(parse_query('common mid rare'), freq, 999).to_fts(),
+                         '"rare" AND "mid" AND "common"') # Small index: keep every word
+        self.assertIsNone(plan_query(parse_query('rare missing'), freq, 1000).to_fts())
+        self.assertEqual(plan_query(parse_query('rare OR missing -absent -mid'), freq, 1000).to_fts(),
+                         '("rare") NOT ("mid")')
+        self.assertEqual(plan_query(parse_query('common'), freq, 1000).to_fts(), '"common"')
+
+class TestIndexerQueries(unittest.TestCase):
+    DB_FILE = os.path.join(os.path.dirname(__file__), 'test_query.db')
+
+    def setUp(self):
+        if os.path.exists(self.DB_FILE):
+            os.remove(self.DB_FILE)
+        self.indexer = Indexer(db_path=self.DB_FILE)
+        self.indexer.add_batch([{
+            'url': f'http://example.com/{i}', 'title': title, 'body': body, 'snippet': 'Snippet',
+            'source_engine': 'crawler', 'crawled_timestamp': '2024-01-01T10:00:00Z', 'llm_summary': None
+        } for i, (title, body) in enumerate([('Apple pie', 'Bake an apple pie with e-mail support.'),
+                                             ('Pears', 'Pears and apples in the orchard.'),
+                                             ('Bananas', 'Yellow bananas.')])])
+
+    def tearDown(self):
+        self.indexer.close()
+        if os.path.exists(self.DB_FILE):
+            os.remove(self.DB_FILE)
+
+    def urls(self, text, **kwargs):
+        return sorted(res['url'] for res in self.indexer.search(text, **kwargs))
+
+    def test_user_syntax_never_reaches_fts5_as_is(self):
+        with patch('builtins.print') as mock_print:
+            self.assertEqual(self.urls('"apple pie'), ['http://example.com/0'])
+            self.assertEqual(self.urls('e-mail'), ['http://example.com/0'])
+            self.assertEqual(self.urls('title:pears OR bananas'), ['http://example.com/1', 'http://example.com/2'])
+            self.assertEqual(self.urls('apple* -pie'), ['http://example.com/1'])
+            self.assertEqual(self.urls('NEAR(bake pie, 2)'), ['http://example.com/0'])
+            self.assertEqual(self.urls('apples AND ) "'), ['http://example.com/1'])
+            self.assertEqual(self.indexer.estimate_hits('apple*'), 2)
+            self.assertEqual(self.indexer.search_page('bananas:')[0][0]['url'], 'http://example.com/2')
+        mock_print.assert_not_called()
+
+        with patch('builtins.print') as mock_print:
+            self.assertEqual(self.indexer.search('apples AND )', raw=True), [])
+        self.assertIn("Error searching index", mock_print.call_args[0][0])
+        self.assertEqual(self.urls('title : pears', raw=True), ['http://example.com/1'])
+
+    def test_unmatchable_query_skips_the_search(self):
+        plan = self.indexer.plan_query('apples zzzunknown')
+        self.assertIsNone(plan.to_fts())
+        self.assertTrue(plan.notes)
+        with patch.object(self.indexer, '_read_rows') as read_rows:
+            self.assertEqual(self.indexer.search('apples zzzunknown'), [])
+            self.assertEqual(self.indexer.estimate_hits('apples zzzunknown'), 0)
+        read_rows.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
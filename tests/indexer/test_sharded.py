@@ -0,0 +1,110 @@
+import unittest
+import os
+import sys
+
+# Add project root to sys.path to allow imports from aisans package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from aisans.indexer.indexer import Indexer
+from aisans.indexer.sharded import ShardedIndexer, shard_paths
+
+class TestShardedIndexer(unittest.TestCase):
+    DB_FILE = os.path.join(os.path.dirname(__file__), 'test_sharded.db')
+    NUM_SHARDS = 3
+
+    def setUp(self):
+        self._remove_shard_files()
+        self.indexer = ShardedIndexer(db_path=self.DB_FILE, num_shards=self.NUM_SHARDS)
+        self.assertIsNotNone(self.indexer.conn, "Failed to initialize shard connections.")
+        self.docs = [{
+            'url': f'http://example.com/page{i}', 'title': f'Page {i}',
+            'body': 'apples ' * (i + 1) + 'and some filler text about orchards.',
+            'snippet': f'Snippet {i}', 'source_engine': 'crawler',
+            'crawled_timestamp': '2024-01-01T10:00:00Z', 'llm_summary': None
+        } for i in range(30)]
+
+    def tearDown(self):
+        self.indexer.close()
+        self._remove_shard_files()
+
+    def _remove_shard_files(self):
+        for path in shard_paths(self.DB_FILE, self.NUM_SHARDS):
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def test_shard_paths(self):
+        self.assertEqual(shard_paths('/tmp/aisans_index.db', 2),
+                         ['/tmp/aisans_index.shard0.db', '/tmp/aisans_index.shard1.db'])
+
+    def test_routing_is_stable_and_spreads_documents(self):
+        self.assertEqual(self.indexer.add_batch(self.docs), len(self.docs))
+        counts = [shard.conn.execute("SELECT COUNT(*) FROM page_meta").fetchone()[0]
+                  for shard in self.indexer.shards]
+        self.assertEqual(sum(counts), len(self.docs))
+        self.assertTrue(all(count > 0 for count in counts), counts)
+
+        for doc in self.docs:
+            shard = self.indexer.shards[self.indexer.shard_for(doc['url'])]
+            self.assertIsNotNone(shard.get_document(doc['url']))
+        # Same routing from a fresh instance (hash() would differ between processes).
+        other = ShardedIndexer(db_path=self.DB_FILE, num_shards=self.NUM_SHARDS)
+        try:
+            self.assertEqual([other.shard_for(d['url']) for d in self.docs],
+                             [self.indexer.shard_for(d['url']) for d in self.docs])
+        finally:
+            other.close()
+
+    def test_search_merges_shards_into_global_top_k(self):
+        self.indexer.add_batch(self.docs)
+        single_path = self.DB_FILE + '.single'
+        single = Indexer(db_path=single_path)
+        try:
+            single.add_batch(self.docs)
+            # The bodies are near-duplicates of each other; compare uncollapsed rankings.
+            expected = {row['url'] for row in single.search('apples', limit=30, collapse=False)}
+        finally:
+            single.close()
+            os.remove(single_path)
+
+        results = self.indexer.search('apples', limit=5, collapse=False)
+        self.assertEqual(len(results), 5)
+        ranks = [row['rank'] for row in results]
+        self.assertEqual(ranks, sorted(ranks))
+        self.assertTrue({row['url'] for row in results} <= expected)
+        self.assertEqual(len(self.indexer.search('apples', limit=30, collapse=False)), 30)
+
+    def test_add_document_replace_and_delete(self):
+        doc = dict(self.docs[0])
+        self.assertTrue(self.indexer.add_document(doc))
+        doc['title'] = 'Updated title'
+        self.assertTrue(self.indexer.add_document(doc))
+        self.assertEqual(self.indexer.get_document(doc['url'])['title'], 'Updated title')
+        self.assertEqual(len(self.indexer.search('updated')), 1)
+
+        self.assertTrue(self.indexer.delete_document(doc['url']))
+        self.assertIsNone(self.indexer.get_document(doc['url']))
+        self.assertFalse(self.indexer.add_document({'title': 'no url'}))
+
+    def test_suggest_sums_counts_across_shards(self):
+        self.indexer.add_batch(self.docs)
+        self.assertEqual(self.indexer.suggest('app'), ['apples'])
+        self.assertEqual(self.indexer.suggest('about orc', k=2), ['about orchards'])
+
+    def test_correct_query_across_shards(self):
+        self.indexer.add_batch(self.docs)
+        self.assertEqual(self.indexer.correct_query('appels orchrads'), 'apples orchards')
+        self.assertIsNone(self.indexer.correct_query('apples'))
+        self.assertEqual(len(self.indexer.search('appels', autocorrect=True)), 10)
+
+    def test_maintain_totals_shard_stats(self):
+        self.indexer.add_batch(self.docs[:10])
+        self.indexer.add_batch(self.docs[10:])
+        stats = self.indexer.maintain(optimize=True)
+        self.assertIsNone(stats['error'])
+        self.assertEqual(len(stats['shards']), self.NUM_SHARDS)
+        self.assertEqual(stats['segments_after'], sum(s['segments_after'] for s in stats['shards']))
+        self.assertLessEqual(stats['segments_after'], self.NUM_SHARDS)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
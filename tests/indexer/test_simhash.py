@@ -0,0 +1,48 @@
+import unittest
+import os
+import random
+import sys
+
+# Add project root to sys.path to allow imports from aisans package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from aisans.indexer import simhash
+
+class TestSimHash(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(7)
+        words = [f"word{i}" for i in range(500)]
+        self.article = ' '.join(rng.choice(words) for _ in range(400))
+        self.other_article = ' '.join(rng.choice(words) for _ in range(400))
+
+    def test_near_duplicates_have_close_fingerprints(self):
+        print_view = "Print this page. " + self.article.upper() + " Copyright 2024."
+        base = simhash.fingerprint(self.article)
+        self.assertLessEqual(simhash.distance(base, simhash.fingerprint(print_view)), simhash.MAX_DISTANCE)
+        self.assertGreater(simhash.distance(base, simhash.fingerprint(self.other_article)), 16)
+        self.assertEqual(base, simhash.fingerprint(self.article))
+        self.assertLess(base, 1 << simhash.FINGERPRINT_BITS)
+
+    def test_short_text_is_not_fingerprinted(self):
+        self.assertIsNone(simhash.fingerprint(None))
+        self.assertIsNone(simhash.fingerprint("Only a few words here."))
+
+    def test_band_keys_share_a_band_within_max_distance(self):
+        value = simhash.fingerprint(self.article)
+        rng = random.Random(3)
+        for _ in range(200):
+            flipped = value
+            for bit in rng.sample(range(simhash.FINGERPRINT_BITS), simhash.MAX_DISTANCE):
+                flipped ^= 1 << bit
+            self.assertTrue(set(simhash.band_keys(value)) & set(simhash.band_keys(flipped)))
+        self.assertEqual(len(set(simhash.band_keys(value))), simhash.BANDS)
+
+    def test_sqlite_round_trip(self):
+        for value in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+            stored = simhash.to_sqlite(value)
+            self.assertTrue(-(1 << 63) <= stored < (1 << 63))
+            self.assertEqual(simhash.from_sqlite(stored), value)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,75 @@
+import unittest
+import os
+import sys
+
+# Add project root to sys.path to allow imports from aisans package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from aisans.indexer.indexer import Indexer
+from aisans.indexer.spelling import SpellChecker, damerau_levenshtein, query_words, rewrite_query
+
+class TestSpellChecker(unittest.TestCase):
+    def test_damerau_levenshtein(self):
+        self.assertEqual(damerau_levenshtein('teh', 'the', 2), 1)
+        self.assertEqual(damerau_levenshtein('apple', 'apples', 2), 1)
+        self.assertEqual(damerau_levenshtein('kitten', 'sitting', 3), 3)
+        self.assertEqual(damerau_levenshtein('kitten', 'sitting', 2), 3) # Over the limit
+        self.assertEqual(damerau_levenshtein('same', 'same', 0), 0)
+
+    def test_candidates_prefer_closest_then_most_common(self):
+        checker = SpellChecker(min_docs=1)
+        for term, docs in [('apple', 5), ('apples', 9), ('ample', 20), ('python', 3), ('orchestration', 4)]:
+            checker._add(term, docs)
+        self.assertEqual(checker.correct('appls'), 'apples')
+        self.assertEqual([term for term, _, _ in checker.candidates('aple')], ['ample', 'apple'])
+        self.assertEqual(checker.correct('pyhton'), 'python') # Transposition
+        self.assertEqual(checker.correct('orchestrasion'), 'orchestration') # Beyond the prefix
+        self.assertIsNone(checker.correct('zzzz'))
+
+    def test_query_words_and_rewrite(self):
+        self.assertEqual(query_words('Pyhton AND title:Crème OR bann* ab 2024 x1y2'), ['pyhton', 'creme'])
+        self.assertEqual(rewrite_query('Pyhton title:aple NOT pyth*', {'pyhton': 'python', 'aple': 'apple'}),
+                         'python title:apple NOT pyth*')
+        self.assertIsNone(rewrite_query('apples', {'pears': 'peas'}))
+
+class TestIndexerSpelling(unittest.TestCase):
+    DB_FILE = os.path.join(os.path.dirname(__file__), 'test_spelling.db')
+
+    def setUp(self):
+        if os.path.exists(self.DB_FILE):
+            os.remove(self.DB_FILE)
+        self.indexer = Indexer(db_path=self.DB_FILE)
+        self.indexer.add_batch([self.doc(i, 'Bananas and apples from the orchard.') for i in range(3)] +
+                               [self.doc(3, 'A single mention of kumquats.')])
+
+    def tearDown(self):
+        self.indexer.close()
+        if os.path.exists(self.DB_FILE):
+            os.remove(self.DB_FILE)
+
+    @staticmethod
+    def doc(i, body):
+        return {'url': f'http://example.com/{i}', 'title': f'Page {i}', 'body': body, 'snippet': 'Snippet',
+                'source_engine': 'crawler', 'crawled_timestamp': '2024-01-01T10:00:00Z', 'llm_summary': None}
+
+    def test_correct_query(self):
+        self.assertEqual(self.indexer.correct_query('Banannas OR orchrad'), 'bananas OR orchard')
+        self.assertIsNone(self.indexer.correct_query('bananas'))
+        self.assertIsNone(self.indexer.correct_query('kumquats')) # Rare but indexed: not a typo
+        self.assertIsNone(self.indexer.correct_query('xylophone'))
+
+        self.assertEqual(self.indexer.search('banannas'), [])
+        self.assertEqual(len(self.indexer.search('banannas', autocorrect=True)), 3)
+        self.assertEqual(len(self.indexer.search_page('banannas', autocorrect=True)[0]), 3)
+        self.assertEqual(len(list(self.indexer.search_iter('banannas', page_size=2, autocorrect=True))), 3)
+        self.assertEqual(len(self.indexer.hybrid_search('banannas', autocorrect=True)), 3)
+
+    def test_new_terms_are_picked_up_incrementally(self):
+        self.assertIsNone(self.indexer.correct_query('pomegranat'))
+        checker = self.indexer._vocabulary_models['spelling'][0]
+        self.indexer.add_batch([self.doc(i, 'Pomegranates everywhere.') for i in range(4, 6)])
+        self.assertEqual(self.indexer.correct_query('pomegranat'), 'pomegranates')
+        self.assertIs(self.indexer._vocabulary_models['spelling'][0], checker) # Not reloaded
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
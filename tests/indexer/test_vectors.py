@@ -0,0 +1,135 @@
+import unittest
+import os
+import sys
+import threading
+from unittest.mock import patch
+
+# Add project root to sys.path to allow imports from aisans package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from aisans.indexer import vectors
+from aisans.indexer.bulk import bulk_build
+from aisans.indexer.indexer import Indexer
+
+class TestVectors(unittest.TestCase):
+    DB_FILE = os.path.join(os.path.dirname(__file__), 'test_vectors.db')
+
+    def setUp(self):
+        self._remove_files()
+        topics = ['apples and pears in the orchard', 'bananas and oranges at the market',
+                  'python programming and software testing', 'mountain hiking trails in winter']
+        self.docs = [{
+            'url': f'http://example.com/page{i}', 'title': f'Page {i}',
+            'body': f'{topics[i % 4]} page {i} with some words about {topics[i % 4].split()[0]}.',
+            'snippet': f'Snippet {i}', 'source_engine': 'crawler',
+            'crawled_timestamp': '2024-01-01T10:00:00Z', 'llm_summary': None
+        } for i in range(12)]
+
+    def tearDown(self):
+        self._remove_files()
+
+    def _remove_files(self):
+        for suffix in ('', '.vectors', '.building', '.building.vectors'):
+            if os.path.exists(self.DB_FILE + suffix):
+                os.remove(self.DB_FILE + suffix)
+
+    @unittest.skipIf(vectors.numpy is None, "numpy is not installed")
+    def test_encode_pages(self):
+        matrix = vectors.encode_pages(['apples and pears', 'Apples and PEARS', 'mountain hiking', None])
+        self.assertEqual(matrix.shape, (4, vectors.DIM))
+        self.assertAlmostEqual(float(matrix[0] @ matrix[0]), 1.0, places=5)
+        self.assertAlmostEqual(float(matrix[0] @ matrix[1]), 1.0, places=5)
+        self.assertLess(abs(float(matrix[0] @ matrix[2])), 0.5)
+        self.assertEqual(float(abs(matrix[3]).sum()), 0.0)
+
+    @unittest.skipIf(vectors.numpy is None, "numpy is not installed")
+    def test_concurrent_writes_keep_every_row(self):
+        store = vectors.VectorStore(self.DB_FILE + '.vectors')
+        row = vectors.numpy.ones((1, vectors.DIM), dtype=vectors.numpy.float32)
+        large_id = 3 * vectors.GROW_ROWS
+        size_read, large_written = threading.Event(), threading.Event()
+        fstat = os.fstat
+
+        def pausing_fstat(fd):
+            result = fstat(fd)
+            if threading.current_thread().name == 'small':
+                size_read.set()
+                # Unlocked, the large write lands here, before this write's smaller truncate.
+                large_written.wait(0.5)
+            return result
+
+        def write_large():
+            size_read.wait(5)
+            store.write([large_id], row)
+            large_written.set()
+
+        with patch.object(vectors.os, 'fstat', pausing_fstat):
+            threads = [threading.Thread(target=store.write, args=([1], row), name='small'),
+                       threading.Thread(target=write_large)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        matrix = store._matrix()
+        self.assertTrue(matrix[1].any())
+        self.assertGreater(len(matrix), large_id)
+        self.assertTrue(matrix[large_id].any())
+        store.close()
+
+    @unittest.skipIf(vectors.numpy is None, "numpy is not installed")
+    def test_hybrid_search_fuses_vector_and_bm25_results(self):
+        with Indexer(db_path=self.DB_FILE, semantic=True) as indexer:
+            indexer.add_batch(self.docs)
+            self.assertTrue(os.path.exists(self.DB_FILE + '.vectors'))
+            # bm25 needs every term; the vector side still finds the closest pages.
+            self.assertEqual(indexer.search("bananas oranges zebra"), [])
+            results = indexer.hybrid_search("bananas oranges zebra", limit=3)
+            self.assertEqual(len(results), 3)
+            self.assertTrue(all('bananas' in indexer.get_document(r['url'])['body'] for r in results))
+            ranks = [r['rank'] for r in results]
+            self.assertEqual(ranks, sorted(ranks))
+
+            both = indexer.hybrid_search("python testing", limit=3)
+            self.assertIn(both[0]['url'], {r['url'] for r in indexer.search("python testing")})
+
+            indexer.delete_document(results[0]['url'])
+            self.assertNotIn(results[0]['url'], [r['url'] for r in indexer.hybrid_search("bananas oranges", limit=12)])
+
+        reader = Indexer.open_readonly(self.DB_FILE)
+        try:
+            self.assertEqual(len(reader.hybrid_search("bananas oranges zebra", limit=2)), 2)
+        finally:
+            reader.close()
+
+    @unittest.skipIf(vectors.numpy is None, "numpy is not installed")
+    def test_rebuild_vectors_and_bulk_build(self):
+        with Indexer(db_path=self.DB_FILE) as indexer:
+            indexer.add_batch(self.docs)
+            self.assertEqual(indexer.rebuild_vectors(), -1) # Not enabled
+        with Indexer(db_path=self.DB_FILE, semantic=True) as indexer:
+            self.assertEqual(indexer.rebuild_vectors(batch_size=5), len(self.docs))
+            self.assertEqual(len(indexer.hybrid_search("mountain zebra", limit=3)), 3)
+
+        stats = bulk_build(iter(self.docs[:4]), self.DB_FILE, semantic=True)
+        self.assertIsNone(stats['error'])
+        with Indexer(db_path=self.DB_FILE) as indexer:
+            self.assertIsNotNone(indexer._vectors)
+            results = indexer.hybrid_search("mountain zebra", limit=10)
+            self.assertEqual(results[0]['url'], self.docs[3]['url'])
+            self.assertLessEqual(len(results), 4)
+        # Without vectors in the build, the old vectors file would be stale.
+        self.assertIsNone(bulk_build(iter(self.docs), self.DB_FILE)['error'])
+        self.assertFalse(os.path.exists(self.DB_FILE + '.vectors'))
+
+    def test_without_numpy_hybrid_search_is_lexical(self):
+        with patch.object(vectors, 'numpy', None), patch('builtins.print') as mock_print:
+            with Indexer(db_path=self.DB_FILE, semantic=True) as indexer:
+                self.assertIsNone(indexer._vectors)
+                indexer.add_batch(self.docs)
+                self.assertEqual([r['url'] for r in indexer.hybrid_search("bananas", limit=5)],
+                                 [r['url'] for r in indexer.search("bananas", limit=5)])
+        self.assertIn("numpy is not installed", mock_print.call_args_list[0][0][0])
+        self.assertFalse(os.path.exists(self.DB_FILE + '.vectors'))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
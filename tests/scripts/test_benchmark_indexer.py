@@ -0,0 +1,44 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add project root to sys.path to allow imports from aisans and scripts packages
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from scripts.benchmark_indexer import Corpus, percentile, run_benchmark
+
+class TestBenchmarkIndexer(unittest.TestCase):
+    def test_corpus_is_reproducible(self):
+        corpus = Corpus(100, seed=7, vocabulary_size=2000)
+        self.assertEqual(list(corpus.documents(0, 20)), list(Corpus(100, seed=7, vocabulary_size=2000).documents(0, 20)))
+        self.assertNotEqual(corpus.document(3)['body'], Corpus(100, seed=8, vocabulary_size=2000).document(3)['body'])
+        self.assertEqual(corpus.document(5)['url'], corpus.document(5, revision=1)['url'])
+        self.assertNotEqual(corpus.document(5)['body'], corpus.document(5, revision=1)['body'])
+        self.assertEqual(corpus.queries(12), corpus.queries(12))
+
+        # Zipf: the most common word dominates.
+        words = ' '.join(doc['body'] for doc in corpus.documents(0, 50)).split()
+        self.assertGreater(words.count(corpus.vocabulary[0]), words.count(corpus.vocabulary[100]) * 5)
+
+    def test_percentile(self):
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(percentile(values, 0.5), 50.0)
+        self.assertEqual(percentile(values, 0.99), 99.0)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_run_benchmark_reports_every_workload(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            report = run_benchmark(Corpus(200, vocabulary_size=2000, body_words=50), db_dir=work_dir,
+                                   single_docs=20, batch_size=50, num_queries=30)
+            self.assertEqual(os.listdir(work_dir), [])
+        workloads = report['workloads']
+        self.assertEqual(set(workloads), {'add_document', 'add_batch', 'upsert', 'search'})
+        self.assertEqual(workloads['add_document']['docs'], 20)
+        self.assertEqual(workloads['upsert']['writes_avoided'], 20) # The unchanged half
+        self.assertLessEqual(workloads['search']['p50_ms'], workloads['search']['p99_ms'])
+        self.assertGreater(report['db_size_bytes'], 0)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -79,6 +79,41 @@ class TestCrawlerConfigLoading(unittest.TestCase):
         self.assertEqual(config["MAX_PAGES"], self.default_config_copy["MAX_PAGES"]) # Check default is kept
         mock_logging.info.assert_called_with(f"Loaded configuration from {CONFIG_FILE_PATH}")
 
+class TestCrawlEngineSelection(unittest.TestCase):
+    @patch('scripts.run_intelligent_crawler.logging')
+    def test_async_engine_falls_back_without_aiohttp(self, mock_logging):
+        config = dict(DEFAULT_CONFIG, CRAWL_ENGINE="async")
+        with patch('aisans.crawler.async_crawler.aiohttp', None):
+            fetcher = run_intelligent_crawler.create_fetch_engine(config)
+        self.assertIsInstance(fetcher, run_intelligent_crawler.Fetcher)
+        fetcher.close()
+        mock_logging.warning.assert_called_with("CRAWL_ENGINE is 'async' but aiohttp is not installed. Falling back to sequential fetching.")
+
+    @patch('aisans.crawler.crawler.Fetcher.fetch', side_effect=lambda url: f"<html>{url}</html>")
+    def test_fetch_pages_skips_visited_and_stops_at_max_pages(self, mock_fetch):
+        urls_to_visit = run_intelligent_crawler.HostScheduler(default_delay=0)
+        for url, depth in [("http://a/1", 0), ("http://a/1", 0), ("http://b/2", 1), ("http://a/3", 1)]:
+            urls_to_visit.add(url, depth)
+        visited_urls = {"http://b/2"}
+        with run_intelligent_crawler.Fetcher() as fetcher:
+            pages = list(run_intelligent_crawler.fetch_pages(fetcher, urls_to_visit, visited_urls, 2))
+        self.assertEqual(pages, [("http://a/1", 0, "<html>http://a/1</html>"), ("http://a/3", 1, "<html>http://a/3</html>")])
+        self.assertEqual(len(urls_to_visit), 0)
+
+    @patch('scripts.run_intelligent_crawler.time.sleep')
+    @patch('aisans.crawler.crawler.Fetcher.fetch', return_value="<html></html>")
+    def test_fetch_pages_waits_for_host_delay(self, mock_fetch, mock_sleep):
+        clock = [0.0]
+        mock_sleep.side_effect = lambda seconds: clock.__setitem__(0, clock[0] + seconds)
+        urls_to_visit = run_intelligent_crawler.HostScheduler(default_delay=5, clock=lambda: clock[0])
+        urls_to_visit.add("http://a/1", 0)
+        urls_to_visit.add("http://a/2", 0)
+        with run_intelligent_crawler.Fetcher() as fetcher:
+            pages = list(run_intelligent_crawler.fetch_pages(fetcher, urls_to_visit, set(), 10))
+        self.assertEqual([url for url, _, _ in pages], ["http://a/1", "http://a/2"])
+        mock_sleep.assert_called_once()
+        mock_sleep.assert_called_once_with(5.0)
+
 class TestIntelligentCrawlerMain(unittest.TestCase):
 
     def setUp(self):
@@ -103,7 +138,8 @@ class TestIntelligentCrawlerMain(unittest.TestCase):
             "METASEARCH_INTERVAL": 1, # Trigger metasearch after 1 page
             "MAX_METASEARCH_RESULTS_PER_ENGINE": 1,
             "METASEARCH_QUERY_USE_LLM_SUMMARY": True,
-            "SEED_FILE_PATH": self.dummy_seeds_file # Point to our dummy seeds
+            "SEED_FILE_PATH": self.dummy_seeds_file, # Point to our dummy seeds
+            "ROBOTS_CACHE_PATH": os.path.join(self.test_dir, "robots_cache.db")
         }
         with open(self.dummy_config_file_path, 'w') as f:
             json.dump(self.base_config_data, f)
@@ -112,7 +148,7 @@ class TestIntelligentCrawlerMain(unittest.TestCase):
         # Note: Patching items from 'scripts.run_intelligent_crawler' if they are imported there directly
         # or from their original modules if run_intelligent_crawler imports them (e.g., 'aisans.crawler.crawler.fetch_url_content')
 
-        self.patch_fetch = patch('aisans.crawler.crawler.fetch_url_content')
+        self.patch_fetch = patch('aisans.crawler.crawler.Fetcher.fetch')
         self.mock_fetch_url_content = self.patch_fetch.start()
 
         self.patch_parse = patch('aisans.crawler.parser.parse_html_content')